@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Measure the cost of building one object from its parsed XML element
+
+Usage : python benchmarks/hydration_benchmark.py [--number 2000]
+
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from lxml import etree
+from lxml.etree import XMLSchemaParseError
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pybonita.parser import BACKENDS, parse_xml, set_backend
+from pybonita.server import BonitaServer
+from pybonita.process import BonitaCase
+from pybonita.user import BonitaUser, BonitaGroup, BonitaRole
+from pybonita.utils import xml_find, xml_find_all, tag_matcher
+
+ROLE_XML = u'<Role><dbid>1</dbid><uuid>role-uuid</uuid><name>user</name><label>User</label>' \
+           u'<description>The users</description></Role>'
+
+GROUP_XML = u'<Group><dbid>2</dbid><uuid>group-uuid</uuid><name>team</name><label>Team</label>' \
+            u'<description>A team</description><parentGroup class="Group"><dbid>3</dbid>' \
+            u'<uuid>platform-uuid</uuid><name>platform</name><label>Platform</label>' \
+            u'<description>The platform</description></parentGroup></Group>'
+
+MEMBERSHIP_XML = u'<Membership><dbid>4</dbid><uuid>membership-uuid-%s</uuid>%s%s</Membership>' % ('%s', GROUP_XML, ROLE_XML)
+
+USER_XML = u'<User><dbid>5</dbid><uuid>user-uuid</uuid><username>jdoe</username><password>secret</password>' \
+           u'<firstName>John</firstName><lastName>Doe</lastName><title>Dr</title><jobTitle>Engineer</jobTitle>' \
+           u'<memberships>%s%s</memberships></User>' % (MEMBERSHIP_XML % 1, MEMBERSHIP_XML % 2)
+
+CASE_XML = u'<processinstance><processuuid><value>process--1.0</value></processuuid>' \
+           u'<instanceuuid><value>process--1.0--1</value></instanceuuid><state>STARTED</state>' \
+           u'<isarchived>false</isarchived><starteddate>1361368042546</starteddate>' \
+           u'<lastupdate>1361368042546</lastupdate><clientvariables>' \
+           u'<entry><string>applicant</string><string>jdoe</string></entry>' \
+           u'<entry><string>comment</string></entry></clientvariables></processinstance>'
+
+OBJECTS = [('BonitaRole', BonitaRole, ROLE_XML, 'role'),
+           ('BonitaGroup', BonitaGroup, GROUP_XML, 'group'),
+           ('BonitaUser', BonitaUser, USER_XML, 'user'),
+           ('BonitaCase', BonitaCase, CASE_XML, 'processinstance')]
+
+# Objects with lazy fields (memberships, parent groups, case variables)
+LAZY_OBJECTS = ['BonitaGroup', 'BonitaUser', 'BonitaCase']
+
+
+def legacy_find(soup, name, raise_exception=True):
+    """ xml_find as it was before the tag matchers : names built and whole subtree searched on each call """
+    if not isinstance(name, (str, unicode)):
+        raise TypeError('name muse be a string or unicode')
+
+    base_name = name
+    capitalize_name = base_name[0].upper() + base_name[1:]
+
+    if isinstance(soup, (etree._Element, etree._ElementTree)):
+        if isinstance(soup, etree._ElementTree):
+            tag = next(soup.iter(base_name, capitalize_name), None)
+        else:
+            tag = next(soup.iterdescendants(base_name, capitalize_name), None)
+    else:
+        raise TypeError('soup must be a bs4.element.Tag or lxml node instance : %s' % (type(soup)))
+
+    if raise_exception and tag is None:
+        raise XMLSchemaParseError('tag %s not found' % (name))
+
+    return tag
+
+
+def build_users(server, number):
+    """ Build number users with the same two memberships, and read their groups """
+    node = xml_find(parse_xml(USER_XML), 'user')
+    users = [BonitaUser._instanciate_from_node(node, server=server, lazy=False) for i in range(number)]
+
+    return len(set(id(group) for user in users for group in user.groups))
+
+
+def measure(statement, number):
+    """ Best cost of a call of statement, in microseconds """
+    return min(timeit.repeat(statement, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='number of calls of each measure')
+    args = parser.parse_args()
+
+    # The library prints some debug messages while building objects
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        results = []
+        for backend in BACKENDS:
+            set_backend(backend)
+            for (label, cls, xml, tag) in OBJECTS:
+                node = xml_find(parse_xml(xml), tag)
+                results.append((backend, label, measure(lambda: cls._instanciate_from_node(node), args.number)))
+                if label in LAZY_OBJECTS:
+                    results.append((backend, label + ' (eager)',
+                                    measure(lambda: cls._instanciate_from_node(node, lazy=False), args.number)))
+
+        shared = BonitaServer.create('localhost', 9090, 'restuser', 'restbpm')
+        not_shared = BonitaServer.create('localhost', 9090, 'restuser', 'restbpm', identity_map=False)
+        sharing = []
+        for (label, server) in [('identity map', shared), ('no identity map', not_shared)]:
+            set_backend('lxml')
+            groups = build_users(server, 1000)
+            sharing.append((label, groups, measure(lambda: build_users(server, 1000), 1) / 1000))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print "Hydration of one object from its parsed element"
+    for (backend, label, cost) in results:
+        print "  %-6s %-20s %8.1f us" % (backend, label, cost)
+
+    print "Hydration of 1000 users with the same memberships (lxml, eager)"
+    for (label, groups, cost) in sharing:
+        print "  %-16s %6d BonitaGroup %8.1f us per user" % (label, groups, cost)
+
+    set_backend('lxml')
+    user = xml_find(parse_xml(USER_XML), 'user')
+    matcher = tag_matcher('jobTitle', recursive=False)
+    print "Lookup of the jobTitle of a user (lxml)"
+    print "  %-40s %8.2f us" % ('former xml_find, subtree searched', measure(lambda: legacy_find(user, 'jobTitle'), args.number * 10))
+    print "  %-40s %8.2f us" % ('xml_find, subtree searched', measure(lambda: xml_find(user, 'jobTitle'), args.number * 10))
+    print "  %-40s %8.2f us" % ('xml_find, children only', measure(lambda: xml_find(user, 'jobTitle', recursive=False), args.number * 10))
+    print "  %-40s %8.2f us" % ('TagMatcher.find, children only', measure(lambda: matcher.find(user), args.number * 10))
+    print "  %-40s %8.2f us" % ('membership uuids, subtree searched', measure(lambda: xml_find_all(user, 'uuid'), args.number * 10))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Measure the memory held by a directory of users, as entities or as compact records
+
+Usage : python benchmarks/memory_benchmark.py [--users 20000] [--groups 200]
+
+Each representation is measured in its own process, from the resident memory
+before and after building the users (Linux only : read from /proc/self/statm).
+
+"""
+import argparse
+import gc
+import io
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pybonita.parser import iter_children
+from pybonita.record import UserRecord
+from pybonita.server import BonitaServer
+from pybonita.user import BonitaUser
+
+ROLE_XML = u'<Role><dbid>1</dbid><uuid>role-%d</uuid><name>role%d</name><label>Role %d</label>' \
+           u'<description>The role %d</description></Role>'
+
+GROUP_XML = u'<Group><dbid>2</dbid><uuid>group-%d</uuid><name>team%d</name><label>Team %d</label>' \
+            u'<description>The team %d</description><parentGroup class="Group"><dbid>3</dbid>' \
+            u'<uuid>platform-uuid</uuid><name>platform</name><label>Platform</label>' \
+            u'<description>The platform</description></parentGroup></Group>'
+
+USER_XML = u'<User><dbid>5</dbid><uuid>user-%d</uuid><username>user%d</username><password>secret</password>' \
+           u'<firstName>John</firstName><lastName>Doe %d</lastName><title>Dr</title><jobTitle>Engineer</jobTitle>' \
+           u'<memberships>%s</memberships></User>'
+
+MEMBERSHIP_XML = u'<Membership><dbid>4</dbid><uuid>membership-%d-%d</uuid>%s%s</Membership>'
+
+# How users are built from their XML element, with the BonitaServer handle to use
+REPRESENTATIONS = {
+    'entities': lambda node, server: BonitaUser._instanciate_from_node(node, server=server),
+    'entities (eager)': lambda node, server: BonitaUser._instanciate_from_node(node, server=server, lazy=False),
+    'records': lambda node, server: UserRecord._instanciate_from_node(node, server=server),
+}
+
+
+def build_users_xml(users, groups):
+    """ XML of a set of users, each one member of 3 groups out of groups with one of 3 roles """
+    items = []
+    for user in range(users):
+        memberships = []
+        for index in range(3):
+            (group, role) = ((user + index * 7) % groups, index)
+            memberships.append(MEMBERSHIP_XML % (group, role, GROUP_XML % ((group,) * 4), ROLE_XML % ((role,) * 4)))
+        items.append(USER_XML % (user, user, user, u''.join(memberships)))
+
+    return (u'<set>%s</set>' % u''.join(items)).encode('utf-8')
+
+
+def resident_memory():
+    """ Resident memory of the process, in bytes """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+def measure(representation, users, groups):
+    """ Memory held by the users built with the representation, in bytes """
+    xml = build_users_xml(users, groups)
+    server = BonitaServer.create('localhost', 9090, 'restuser', 'restbpm')
+    build = REPRESENTATIONS[representation]
+
+    gc.collect()
+    before = resident_memory()
+    directory = [build(node, server) for node in iter_children(io.BytesIO(xml), 'user')]
+    gc.collect()
+    after = resident_memory()
+
+    assert len(directory) == users
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000, help='number of users of the directory')
+    parser.add_argument('--groups', type=int, default=200, help='number of distinct groups')
+    parser.add_argument('--representation', choices=sorted(REPRESENTATIONS.keys()), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.representation is not None:
+        print measure(args.representation, args.users, args.groups)
+        return
+
+    print "Memory held by %d users, members of 3 groups out of %d" % (args.users, args.groups)
+    for representation in sorted(REPRESENTATIONS.keys()):
+        output = subprocess.check_output([sys.executable, __file__, '--users', str(args.users),
+                                          '--groups', str(args.groups), '--representation', representation])
+        held = int(output.strip())
+        print "  %-18s %8.1f MB %8.0f bytes per user" % (representation, held / 1e6, float(held) / args.users)
+
+
+if __name__ == '__main__':
+    main()
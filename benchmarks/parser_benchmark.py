@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Compare the XML parser backends on the response of /identityAPI/getUsers
+
+Usage : python benchmarks/parser_benchmark.py [--users 5000] [--repeat 3]
+
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pybonita.parser import BACKENDS, parse_xml, set_backend
+from pybonita.user import BonitaUser
+from pybonita.utils import xml_find, xml_find_all, xml_tostring
+
+USER_XML = u'<User><dbid>%(index)s</dbid><uuid>uuid-%(index)s</uuid><username>user%(index)s</username>' \
+           u'<password>secret</password><firstName>First %(index)s</firstName><lastName>Last</lastName>' \
+           u'<title>Dr</title><jobTitle>Engineer</jobTitle><memberships/></User>'
+
+
+def build_users_xml(count):
+    """ Build a getUsers response with count users """
+    users = u''.join(USER_XML % {'index': index} for index in range(count))
+    return u'<?xml version="1.0" encoding="UTF-8"?><set>%s</set>' % users
+
+
+def parse_users(xml):
+    """ Same work as BonitaUser.find_all, without the HTTP request """
+    soup = parse_xml(xml)
+    return [BonitaUser._instanciate_from_xml(xml_tostring(tag)) for tag in xml_find_all(xml_find(soup, 'set'), 'user')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000, help='number of users in the response')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best one is kept')
+    args = parser.parse_args()
+
+    xml = build_users_xml(args.users)
+    print "%s users, %.1f MB of XML" % (args.users, len(xml) / 1024.0 / 1024.0)
+
+    timings = {}
+    for backend in BACKENDS:
+        set_backend(backend)
+        runs = []
+        for run in range(args.repeat):
+            start = time.time()
+            users = parse_users(xml)
+            runs.append(time.time() - start)
+        assert len(users) == args.users
+        timings[backend] = min(runs)
+        print "%-6s %8.3f s  %8.0f users/s" % (backend, timings[backend], args.users / timings[backend])
+
+    print "lxml is %.1f times faster than bs4" % (timings['bs4'] / timings['lxml'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+import socket
+import threading
+from multiprocessing.connection import Listener, Client
+
+from pybonita import logger
+from .cache import TTLCache
+
+__all__ = ['CacheBackend', 'MemoryBackend', 'SocketBackend', 'CacheDaemon']
+
+
+def _check_authkey(address, authkey):
+    """ Entities are exchanged pickled with the daemon : anyone able to send
+    some could run code in the daemon and its clients. Unix sockets are
+    guarded by the permissions of their path, TCP ports by the authkey only.
+
+    :raise ValueError: if address is a (host, port) TCP address and authkey is not given
+
+    """
+    if isinstance(address, tuple) and not authkey:
+        raise ValueError(u"an authkey is required to reach the cache daemon through TCP")
+
+
+class CacheBackend(object):
+    """ Storage of the cached lookups shared by several LookupCache, of
+    several processes (see pybonita.cache.LookupCache).
+
+    Values are serialized entities (str), stored by region and key (str),
+    each one for its own ttl. A backend must never make a lookup fail :
+    an unavailable backend answers None, as for a missing value.
+
+    """
+
+    def get(self, region, key):
+        """ Return the value of key in the region, or None if not held or expired """
+        raise NotImplementedError
+
+    def put(self, region, key, value, ttl):
+        """ Hold the value of key in the region for ttl seconds """
+        raise NotImplementedError
+
+    def delete(self, region, key):
+        """ Forget the value of key in the region.
+        Backends which can't forget a single value clear the whole region instead.
+
+        """
+        self.clear(region)
+
+    def clear(self, region):
+        """ Forget the values of the region """
+        raise NotImplementedError
+
+    def stats(self):
+        """ Counters of the backend
+
+        :return: dict
+
+        """
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """ CacheBackend holding the values in memory, in a TTLCache for each region.
+    It backs the CacheDaemon, and can be shared by the server handles of a process.
+
+    """
+
+    def __init__(self, max_size=None):
+        """ Build up a new MemoryBackend
+
+        :param max_size: number of values held by each region (default : TTLCache.DEFAULT_MAX_SIZE)
+        :type max_size: int
+
+        """
+        self.max_size = max_size
+        self._regions = {}
+        self._lock = threading.Lock()
+
+    def _get_region(self, region):
+        with self._lock:
+            cache = self._regions.get(region)
+            if cache is None:
+                cache = self._regions[region] = TTLCache(self.max_size)
+            return cache
+
+    def get(self, region, key):
+        return self._get_region(region).get(key)
+
+    def put(self, region, key, value, ttl):
+        self._get_region(region).put(key, value, ttl)
+
+    def delete(self, region, key):
+        self._get_region(region).invalidate(key)
+
+    def clear(self, region):
+        self._get_region(region).clear()
+
+    def stats(self):
+        with self._lock:
+            regions = dict(self._regions)
+
+        return dict((region, cache.stats()) for (region, cache) in regions.items())
+
+
+class SocketBackend(CacheBackend):
+    """ CacheBackend client of a CacheDaemon, through a local socket.
+
+    Each thread uses its own connexion to the daemon. When the daemon can't
+    be reached, lookups go on without it (counted in errors), and the
+    connexion is opened again on the next call.
+
+    """
+
+    def __init__(self, address, authkey=None):
+        """ Build up a new SocketBackend
+
+        :param address: address of the daemon : path of a Unix socket, or (host, port)
+        :type address: str or tuple
+        :param authkey: secret shared with the daemon (default : no authentication, for a Unix socket only)
+        :type authkey: str
+        :raise ValueError: if address is a TCP address and authkey is not given
+
+        """
+        _check_authkey(address, authkey)
+
+        self.address = address
+        self.authkey = authkey
+        self.errors = 0
+        self._local = threading.local()
+
+    def _call(self, *request):
+        """ Send a request to the daemon and return its answer, or None if it can't be reached """
+        connection = getattr(self._local, 'connection', None)
+        try:
+            if connection is None:
+                connection = self._local.connection = Client(self.address, authkey=self.authkey)
+            connection.send(request)
+            return connection.recv()
+        except Exception as exc:
+            self.errors += 1
+            self._local.connection = None
+            if connection is not None:
+                connection.close()
+            logger.warning("cache daemon %s not reachable : %s" % (self.address, exc))
+            return None
+
+    def get(self, region, key):
+        return self._call('get', region, key)
+
+    def put(self, region, key, value, ttl):
+        self._call('put', region, key, value, ttl)
+
+    def delete(self, region, key):
+        self._call('delete', region, key)
+
+    def clear(self, region):
+        self._call('clear', region)
+
+    def stats(self):
+        stats = self._call('stats') or {}
+        stats['errors'] = self.errors
+        return stats
+
+
+class CacheDaemon(object):
+    """ Serve a MemoryBackend to the SocketBackend of several processes, such as
+    the pre-forked workers of a service, so that they share one cache.
+
+    The daemon runs in a thread of the process which starts it, for example
+    the master process of the workers, or a process dedicated to it.
+    Entities are exchanged pickled : only let trusted processes connect,
+    through a Unix socket or with an authkey, which a TCP address requires.
+
+    Example
+.. code ::
+
+    daemon = CacheDaemon('/var/run/myservice/bonita-cache.sock', authkey='secret')
+    daemon.start()
+
+    # In each worker
+    backend = SocketBackend('/var/run/myservice/bonita-cache.sock', authkey='secret')
+    BonitaServer.use('localhost', 9090, 'restuser', 'restbpm', cache=LookupCache(backend=backend))
+
+    """
+
+    def __init__(self, address=None, authkey=None, max_size=None):
+        """ Build up a new CacheDaemon
+
+        :param address: address to listen to : path of a Unix socket, or (host, port)
+            (default : a new Unix socket, see the address attribute)
+        :type address: str or tuple
+        :param authkey: secret the clients must know (default : no authentication, for a Unix socket only)
+        :type authkey: str
+        :param max_size: number of values held by each region (default : TTLCache.DEFAULT_MAX_SIZE)
+        :type max_size: int
+        :raise ValueError: if address is a TCP address and authkey is not given
+
+        """
+        _check_authkey(address, authkey)
+
+        self.backend = MemoryBackend(max_size)
+        self.authkey = authkey
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self._thread = None
+        self._stopped = False
+        # Connexion and thread serving each client
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """ Serve the clients in a background thread """
+        self._thread = threading.Thread(target=self.serve_forever, name='pybonita-cache-daemon')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def serve_forever(self):
+        """ Serve the clients until stop is called, each one in its own thread """
+        while not self._stopped:
+            try:
+                connection = self._listener.accept()
+            except Exception as exc:
+                if self._stopped:
+                    break
+                logger.warning("cache daemon %s : connexion refused : %s" % (self.address, exc))
+                continue
+
+            if self._stopped:
+                connection.close()
+                break
+
+            thread = threading.Thread(target=self._serve, args=(connection,), name='pybonita-cache-client')
+            thread.daemon = True
+            with self._lock:
+                self._clients[connection] = thread
+            thread.start()
+
+    def _serve(self, connection):
+        """ Answer the requests of a client until it disconnects """
+        try:
+            while True:
+                request = connection.recv()
+                command = request[0]
+                if command == 'get':
+                    connection.send(self.backend.get(*request[1:]))
+                elif command == 'put':
+                    connection.send(self.backend.put(*request[1:]))
+                elif command == 'delete':
+                    connection.send(self.backend.delete(*request[1:]))
+                elif command == 'clear':
+                    connection.send(self.backend.clear(*request[1:]))
+                elif command == 'stats':
+                    connection.send(self.backend.stats())
+                else:
+                    connection.send(None)
+        except (EOFError, IOError):
+            pass
+        finally:
+            with self._lock:
+                self._clients.pop(connection, None)
+            connection.close()
+
+    def stop(self):
+        """ Stop serving the clients and close the socket """
+        self._stopped = True
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        try:
+            # Wake up the accept of serve_forever, through a bare socket : serve_forever
+            # may be already gone, and nobody would answer the handshake of a Client
+            waker = socket.socket(family, socket.SOCK_STREAM)
+            waker.connect(self.address)
+            waker.close()
+        except socket.error:
+            pass
+        self._listener.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        # Wake up the threads waiting for their client, they must not outlive the daemon
+        with self._lock:
+            clients = self._clients.items()
+        for (connection, thread) in clients:
+            try:
+                socket.fromfd(connection.fileno(), family, socket.SOCK_STREAM).shutdown(socket.SHUT_RDWR)
+            except (IOError, socket.error):
+                pass
+            thread.join()
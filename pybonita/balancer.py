@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+
+from pybonita import logger
+from .breaker import CircuitBreaker
+from .throttle import UNLIMITED
+
+__all__ = ['BonitaEndpoint', 'RoundRobinBalancer', 'LeastOutstandingBalancer',
+           'LatencyWeightedBalancer', 'build_balancer', 'parse_endpoints']
+
+
+class BonitaEndpoint(object):
+    """ A Bonita REST API node, with the statistics used to balance requests """
+
+    # Weight of the last measure in the latency moving average
+    LATENCY_SMOOTHING = 0.3
+
+    def __init__(self, host, port):
+        """ Build up a new BonitaEndpoint
+
+        :param host: Bonita REST API node host
+        :type host: str
+        :param port: Bonita REST API node port
+        :type port: int
+
+        """
+        if type(host) != str:
+            raise TypeError(u"host must be a string")
+        if type(port) != int:
+            raise TypeError(u"port must be an integer")
+
+        self.host = host
+        self.port = port
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejected_until = None
+        self.breaker = CircuitBreaker(str(self))
+        self.throttle = UNLIMITED
+        # Charset of the responses, learnt from the first one
+        self.encoding = None
+
+    def __str__(self):
+        return "%s:%s" % (self.host, self.port)
+
+    def _get_base_url(self):
+        return 'http://%s:%s/bonita-server-rest/API' % (self.host, self.port)
+
+    base_url = property(_get_base_url, None, None, u"URL prefix of the Bonita REST API on this node")
+
+    def is_available(self, now=None):
+        """ Is this endpoint allowed to receive requests (ie. not ejected, and its circuit breaker not open) ? """
+        now = now if now is not None else time.time()
+
+        if self.breaker.is_open(now):
+            return False
+        if self.ejected_until is None:
+            return True
+
+        return now >= self.ejected_until
+
+    def _record_latency(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = self.LATENCY_SMOOTHING * latency + (1 - self.LATENCY_SMOOTHING) * self.latency
+
+
+def parse_endpoints(host, port):
+    """ Build the list of BonitaEndpoint from the host and port given to BonitaServer.use
+
+    :param host: a host, or a list of hosts. Each host of the list can be a str,
+        a "host:port" str or a (host, port) tuple
+    :type host: str or list
+    :param port: default port, used for hosts given without port
+    :type port: int
+    :return: list of BonitaEndpoint
+    :raise TypeError: if host or port are not properly typed
+    :raise ValueError: if the list of hosts is empty
+
+    """
+    hosts = host if isinstance(host, (list, tuple)) else [host]
+
+    if len(hosts) == 0:
+        raise ValueError(u"at least one host is required")
+
+    endpoints = []
+    for entry in hosts:
+        if isinstance(entry, tuple):
+            (entry_host, entry_port) = entry
+        elif type(entry) == str and ':' in entry:
+            (entry_host, entry_port) = entry.rsplit(':', 1)
+            entry_port = int(entry_port)
+        else:
+            (entry_host, entry_port) = (entry, port)
+
+        endpoints.append(BonitaEndpoint(entry_host, entry_port))
+
+    return endpoints
+
+
+class Balancer(object):
+    """ Base class to spread requests across several BonitaEndpoint.
+
+    An endpoint failing to answer max_failures times in a row is ejected for
+    ejection_time seconds. It is re-admitted afterward, and ejected again
+    on its next failure.
+    An endpoint whose circuit breaker is open is not available either.
+    If no endpoint is available, the one to be re-admitted first is used.
+
+    Subclasses implement _choose to select an endpoint among the available ones.
+
+    """
+
+    DEFAULT_MAX_FAILURES = 3
+    DEFAULT_EJECTION_TIME = 30.0
+
+    def __init__(self, endpoints, max_failures=None, ejection_time=None):
+        """ Build up a new Balancer
+
+        :param endpoints: endpoints to balance requests to
+        :type endpoints: list of BonitaEndpoint
+        :param max_failures: consecutive failures before ejecting an endpoint (default : DEFAULT_MAX_FAILURES)
+        :type max_failures: int
+        :param ejection_time: seconds an endpoint stays ejected (default : DEFAULT_EJECTION_TIME)
+        :type ejection_time: float
+
+        """
+        if len(endpoints) == 0:
+            raise ValueError(u"at least one endpoint is required")
+
+        self.endpoints = list(endpoints)
+        self.max_failures = max_failures if max_failures is not None else self.DEFAULT_MAX_FAILURES
+        self.ejection_time = ejection_time if ejection_time is not None else self.DEFAULT_EJECTION_TIME
+        self._lock = threading.Lock()
+
+    def select(self, exclude=None):
+        """ Select the endpoint the next request is sent to
+
+        :param exclude: endpoints not to select, for example those whose circuit breaker refused the request
+        :type exclude: list of BonitaEndpoint
+        :return: BonitaEndpoint, or None if all the endpoints are excluded
+
+        """
+        with self._lock:
+            now = time.time()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in (exclude or [])]
+            if len(candidates) == 0:
+                return None
+
+            available = [endpoint for endpoint in candidates if endpoint.is_available(now)]
+            if len(available) == 0:
+                endpoint = min(candidates, key=lambda endpoint: endpoint.ejected_until)
+                logger.warning("all Bonita endpoints are ejected, falling back to %s" % endpoint)
+                return endpoint
+
+            return self._choose(available)
+
+    def acquire(self, endpoint):
+        """ Mark a request as sent to the endpoint """
+        with self._lock:
+            endpoint.outstanding += 1
+
+    def release(self, endpoint, latency, success):
+        """ Mark a request sent to the endpoint as done
+
+        :param endpoint: endpoint the request was sent to
+        :type endpoint: BonitaEndpoint
+        :param latency: duration of the request, in seconds
+        :type latency: float
+        :param success: did the endpoint answer ?
+        :type success: bool
+
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+
+            if success:
+                endpoint._record_latency(latency)
+                endpoint.failures = 0
+                endpoint.ejected_until = None
+            else:
+                endpoint.failures += 1
+                if endpoint.failures >= self.max_failures:
+                    endpoint.ejected_until = time.time() + self.ejection_time
+                    logger.warning("Bonita endpoint %s ejected for %s seconds" % (endpoint, self.ejection_time))
+
+    def _choose(self, endpoints):
+        raise NotImplementedError
+
+
+class RoundRobinBalancer(Balancer):
+    """ Send requests to each available endpoint in turn """
+
+    def __init__(self, endpoints, max_failures=None, ejection_time=None):
+        super(RoundRobinBalancer, self).__init__(endpoints, max_failures, ejection_time)
+        self._next = 0
+
+    def _choose(self, endpoints):
+        endpoint = endpoints[self._next % len(endpoints)]
+        self._next += 1
+        return endpoint
+
+
+class LeastOutstandingBalancer(Balancer):
+    """ Send requests to the available endpoint with the fewest requests in flight """
+
+    def _choose(self, endpoints):
+        return min(endpoints, key=lambda endpoint: endpoint.outstanding)
+
+
+class LatencyWeightedBalancer(Balancer):
+    """ Send requests to available endpoints at random, weighted by the inverse of their latency.
+    Endpoints without any latency measure yet get the weight of the fastest one.
+
+    """
+
+    def __init__(self, endpoints, max_failures=None, ejection_time=None):
+        super(LatencyWeightedBalancer, self).__init__(endpoints, max_failures, ejection_time)
+        self._random = random.random
+
+    def _choose(self, endpoints):
+        latencies = [endpoint.latency for endpoint in endpoints if endpoint.latency]
+        best = min(latencies) if len(latencies) > 0 else 1.0
+
+        weights = [1.0 / (endpoint.latency or best) for endpoint in endpoints]
+
+        threshold = self._random() * sum(weights)
+        for (endpoint, weight) in zip(endpoints, weights):
+            threshold -= weight
+            if threshold < 0:
+                return endpoint
+
+        return endpoints[-1]
+
+
+BALANCERS = {'round_robin': RoundRobinBalancer,
+             'least_outstanding': LeastOutstandingBalancer,
+             'latency_weighted': LatencyWeightedBalancer}
+
+
+def build_balancer(endpoints, policy='round_robin', max_failures=None, ejection_time=None):
+    """ Build a balancer for the endpoints with the given policy
+
+    :param endpoints: endpoints to balance requests to
+    :type endpoints: list of BonitaEndpoint
+    :param policy: one of 'round_robin', 'least_outstanding' or 'latency_weighted'
+    :type policy: str
+    :raise ValueError: if the policy is unknown
+
+    """
+    if policy not in BALANCERS:
+        raise ValueError(u"unknown balancing policy %s, expected one of %s" % (policy, sorted(BALANCERS.keys())))
+
+    return BALANCERS[policy](endpoints, max_failures, ejection_time)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from collections import deque
+
+from pybonita import logger
+
+__all__ = ['CircuitBreaker']
+
+
+class CircuitBreaker(object):
+    """ Stop sending requests to a Bonita endpoint which keeps failing.
+
+    The breaker is CLOSED while the endpoint works : requests are sent and
+    their outcome recorded over a window of the last window_size requests.
+    Once at least min_calls requests have been recorded and the share of
+    failures reaches failure_rate, the breaker OPENs : requests fail at once
+    without being sent. After cooldown seconds the breaker is HALF_OPEN and
+    lets half_open_probes requests through : it CLOSEs again once all of them
+    succeeded and OPENs again on the first failure.
+
+    Listeners added with add_listener are called on each state transition
+    with the breaker, the old state and the new state.
+
+    """
+
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    DEFAULT_FAILURE_RATE = 0.5
+    DEFAULT_WINDOW_SIZE = 20
+    DEFAULT_MIN_CALLS = 10
+    DEFAULT_COOLDOWN = 30.0
+    DEFAULT_HALF_OPEN_PROBES = 1
+
+    def __init__(self, name, failure_rate=None, window_size=None, min_calls=None, cooldown=None,
+                 half_open_probes=None):
+        """ Build up a new CircuitBreaker
+
+        :param name: name of the protected endpoint, used in logs
+        :type name: str
+        :param failure_rate: share of failed requests opening the breaker (default : DEFAULT_FAILURE_RATE)
+        :type failure_rate: float
+        :param window_size: number of last requests the failure rate is computed on (default : DEFAULT_WINDOW_SIZE)
+        :type window_size: int
+        :param min_calls: minimum number of recorded requests before opening (default : DEFAULT_MIN_CALLS)
+        :type min_calls: int
+        :param cooldown: seconds the breaker stays open (default : DEFAULT_COOLDOWN)
+        :type cooldown: float
+        :param half_open_probes: requests let through while half open (default : DEFAULT_HALF_OPEN_PROBES)
+        :type half_open_probes: int
+
+        """
+        self.name = name
+        self.failure_rate = failure_rate if failure_rate is not None else self.DEFAULT_FAILURE_RATE
+        self.window_size = window_size if window_size is not None else self.DEFAULT_WINDOW_SIZE
+        self.min_calls = min_calls if min_calls is not None else self.DEFAULT_MIN_CALLS
+        self.cooldown = cooldown if cooldown is not None else self.DEFAULT_COOLDOWN
+        self.half_open_probes = half_open_probes if half_open_probes is not None else self.DEFAULT_HALF_OPEN_PROBES
+
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._outcomes = deque(maxlen=self.window_size)
+        self._probes = 0
+        # Half open probes which succeeded
+        self._successes = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return "CircuitBreaker %s %s" % (self.name, self.state)
+
+    def add_listener(self, listener):
+        """ Add a function called on each state transition as listener(breaker, old_state, new_state) """
+        self._listeners.append(listener)
+
+    def is_open(self, now=None):
+        """ Is the breaker open and still cooling down ? """
+        now = now if now is not None else time.time()
+        return self.state == self.OPEN and now - self.opened_at < self.cooldown
+
+    def allow_request(self):
+        """ Can a request be sent through the breaker ?
+        A half open probe is reserved when True is returned.
+
+        :return: bool
+
+        """
+        transitions = []
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.is_open():
+                    return False
+                transitions.append(self._transition(self.HALF_OPEN))
+
+            if self.state == self.HALF_OPEN:
+                allowed = self._probes < self.half_open_probes
+                if allowed:
+                    self._probes += 1
+            else:
+                allowed = True
+
+        self._notify(transitions)
+        return allowed
+
+    def record_success(self):
+        """ Record a request answered by the endpoint """
+        transitions = []
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._successes += 1
+                if self._successes >= self.half_open_probes:
+                    transitions.append(self._transition(self.CLOSED))
+            else:
+                self._outcomes.append(True)
+
+        self._notify(transitions)
+
+    def record_failure(self):
+        """ Record a request the endpoint failed to answer """
+        transitions = []
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                transitions.append(self._transition(self.OPEN))
+            elif self.state == self.CLOSED:
+                self._outcomes.append(False)
+                failures = self._outcomes.count(False)
+                if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                    transitions.append(self._transition(self.OPEN))
+
+        self._notify(transitions)
+
+    def _transition(self, state):
+        # Must be called with the lock held
+        old_state = self.state
+        self.state = state
+        self._probes = 0
+        self._successes = 0
+
+        if state == self.OPEN:
+            self.opened_at = time.time()
+        elif state == self.CLOSED:
+            self._outcomes.clear()
+            self.opened_at = None
+
+        return (old_state, state)
+
+    def _notify(self, transitions):
+        # Listeners are called without the lock held, so they can use the breaker
+        for (old_state, new_state) in transitions:
+            logger.warning("circuit breaker %s : %s -> %s" % (self.name, old_state, new_state))
+            for listener in self._listeners:
+                listener(self, old_state, new_state)
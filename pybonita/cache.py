@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+import cPickle
+import functools
+import inspect
+import io
+import threading
+import time
+from collections import OrderedDict
+
+__all__ = ['TTLCache', 'LookupCache', 'cached_lookup', 'build_cache']
+
+# Returned by TTLCache.get for the keys it does not hold
+_MISSING = object()
+
+
+def _dumps(entity, shared=None):
+    """ Serialize an entity for a CacheBackend, without its server handle.
+    When a list is given as shared, the shared entities embedded by entity
+    (see BonitaObject.SHARED) are not serialized : they are appended to the
+    list, to be given back to _loads.
+
+    """
+    from .object import BonitaObject
+    from .server import BonitaServer
+
+    indexes = {}
+
+    def persistent_id(obj):
+        if isinstance(obj, BonitaServer._BonitaServerImpl):
+            return 'server'
+        if shared is not None and obj is not entity and isinstance(obj, BonitaObject) and obj.SHARED:
+            if id(obj) not in indexes:
+                indexes[id(obj)] = len(shared)
+                shared.append(obj)
+            return indexes[id(obj)]
+        return None
+
+    output = io.BytesIO()
+    pickler = cPickle.Pickler(output, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(entity)
+
+    return output.getvalue()
+
+
+def _loads(value, server, shared=None):
+    """ Build back an entity serialized by _dumps, bound to the server handle server,
+    and embedding the shared entities given to _dumps
+
+    """
+    unpickler = cPickle.Unpickler(io.BytesIO(value))
+    unpickler.persistent_load = lambda persistent_id: server if persistent_id == 'server' else shared[persistent_id]
+
+    return unpickler.load()
+
+
+class _Copy(object):
+    """ Entity which is not shared (see BonitaObject.SHARED), held serialized by a
+    region of the LookupCache : each hit builds a copy of its own
+
+    """
+
+    __slots__ = ('value', 'shared', 'uuid')
+
+    def __init__(self, entity):
+        self.shared = []
+        self.value = _dumps(entity, self.shared)
+        self.uuid = entity.uuid
+
+    def load(self, server):
+        return _loads(self.value, server, self.shared)
+
+
+def _hold(entity):
+    """ Value held by a region for an entity """
+    if entity is None or getattr(entity, 'SHARED', True):
+        return entity
+
+    return _Copy(entity)
+
+
+class TTLCache(object):
+    """ Bounded cache of values expiring ttl seconds after they are put.
+
+    When max_size values are held, putting a new one evicts the least
+    recently used. Hits and misses are counted.
+
+    """
+
+    # Default number of values held
+    DEFAULT_MAX_SIZE = 1000
+    # Default seconds a value is kept
+    DEFAULT_TTL = 300.0
+
+    def __init__(self, max_size=None, ttl=None):
+        """ Build up a new TTLCache
+
+        :param max_size: number of values held (default : DEFAULT_MAX_SIZE)
+        :type max_size: int
+        :param ttl: seconds a value is kept (default : DEFAULT_TTL)
+        :type ttl: float
+        :raise ValueError: if max_size or ttl is not positive
+
+        """
+        self.max_size = max_size if max_size is not None else TTLCache.DEFAULT_MAX_SIZE
+        self.ttl = float(ttl) if ttl is not None else TTLCache.DEFAULT_TTL
+
+        if self.max_size < 1:
+            raise ValueError(u"max_size must be positive")
+        if self.ttl <= 0:
+            raise ValueError(u"ttl must be positive")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (expiry time, value), least recently used first
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self._clock = time.time
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+    def get(self, key, default=None):
+        """ Return the value of key, or default if not held or expired """
+        with self._lock:
+            entry = self._values.pop(key, None)
+            if entry is None or entry[0] <= self._clock():
+                self.misses += 1
+                return default
+
+            # Most recently used last
+            self._values[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, ttl=None):
+        """ Hold the value of key for ttl seconds (default : the ttl of the cache) """
+        with self._lock:
+            self._values.pop(key, None)
+            while len(self._values) >= self.max_size:
+                self._values.popitem(last=False)
+                self.evictions += 1
+            self._values[key] = (self._clock() + (ttl if ttl is not None else self.ttl), value)
+
+    def invalidate(self, key):
+        """ Forget the value of key """
+        with self._lock:
+            self._values.pop(key, None)
+
+    def invalidate_if(self, predicate):
+        """ Forget the values for which predicate is true
+
+        :return: list -- the keys of these values
+
+        """
+        with self._lock:
+            keys = [key for (key, (expiry, value)) in self._values.items() if predicate(value)]
+            for key in keys:
+                del self._values[key]
+
+        return keys
+
+    def clear(self):
+        """ Forget all the values """
+        with self._lock:
+            self._values.clear()
+
+    def stats(self):
+        """ Counters of the cache
+
+        :return: dict -- hits, misses, evictions and size
+
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._values)}
+
+
+class LookupCache(object):
+    """ Read-through cache of the lookups of Bonita entities by a server handle.
+
+    Lookups (get_by_uuid, get_by_name, get_by_path...) decorated by
+    cached_lookup are answered from the cache region of their entity when
+    possible, and from the Bonita server otherwise. Each region is a
+    TTLCache, with its own ttl and max_size. Lookups of entities which do not
+    exist are cached too, for the shorter negative_ttl of the region, in a
+    second TTLCache : probing for the same missing entity again does not
+    reach the server.
+
+    Saving or deleting an entity through the server handle forgets the
+    lookups of its region which found it, and those by its keys which found
+    nothing (see BonitaObject.CACHE_KEYS) : creating an entity which was
+    looked up in vain makes it visible at once. The regions of the entities
+    embedding it (DEPENDENT_REGIONS) are cleared. Changes made by other
+    clients are only seen once the cached lookups expire.
+
+    Cached entities are shared by all the callers, as the entities shared by
+    the identity map : don't modify them without saving them. Entities which
+    are not shared (see BonitaObject.SHARED), such as users, are held
+    serialized instead : each hit returns a copy, and the changes made to it
+    are not seen by the other callers.
+
+    A CacheBackend (see pybonita.backend) can share the cached lookups with
+    the LookupCache of other processes : lookups missing from the regions are
+    looked for in the backend before reaching the Bonita server, entities
+    being exchanged pickled. Invalidated lookups are forgotten by the backend
+    too.
+
+    """
+
+    # Default params of the TTLCache of each region, regions not listed are not cached
+    DEFAULT_REGIONS = {
+        'role': {'ttl': 600.0},
+        'group': {'ttl': 600.0},
+        'membership': {'ttl': 300.0},
+        'user': {'ttl': 60.0},
+        'process': {'ttl': 600.0},
+    }
+
+    # Default seconds the lookups of entities which do not exist are kept
+    DEFAULT_NEGATIVE_TTL = 30.0
+
+    # Regions of the entities embedding the entities of a region
+    DEPENDENT_REGIONS = {
+        'role': ['membership', 'user'],
+        'group': ['membership', 'user'],
+        'membership': ['user'],
+    }
+
+    def __init__(self, regions=None, backend=None):
+        """ Build up a new LookupCache
+
+        :param regions: params of each region, merged with DEFAULT_REGIONS : ttl and
+            max_size of its TTLCache, and negative_ttl of the lookups of entities which
+            do not exist (default : DEFAULT_NEGATIVE_TTL, None to not cache them), for example
+            {'role': {'ttl': 3600, 'max_size': 100, 'negative_ttl': 5}}. A region given None
+            is not cached.
+        :type regions: dict
+        :param backend: backend sharing the cached lookups with other processes (default : none)
+        :type backend: pybonita.backend.CacheBackend
+        :raise ValueError: if the params of a region are invalid
+
+        """
+        self.backend = backend
+
+        params = dict(LookupCache.DEFAULT_REGIONS)
+        params.update(regions or {})
+
+        self.regions = {}
+        self.negative_regions = {}
+        for (region, region_params) in params.items():
+            if region_params is None:
+                continue
+
+            region_params = dict(region_params)
+            negative_ttl = region_params.pop('negative_ttl', LookupCache.DEFAULT_NEGATIVE_TTL)
+            self.regions[region] = TTLCache(**region_params)
+            if negative_ttl is not None:
+                self.negative_regions[region] = TTLCache(region_params.get('max_size'), negative_ttl)
+
+    def get_or_load(self, region, key, load, server=None):
+        """ Return the entity of the region cached for key, or load it
+
+        :param region: name of the region, for example 'role'
+        :type region: str
+        :param key: key of the lookup
+        :type key: tuple
+        :param load: function retrieving the entity from the Bonita server, or None if it does not exist
+        :type load: function
+        :param server: server handle the entities of the backend are bound to (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :return: the entity, or None
+
+        """
+        cache = self.regions.get(region)
+        if cache is None:
+            return load()
+
+        entity = cache.get(key, _MISSING)
+        if isinstance(entity, _Copy):
+            return entity.load(server)
+        if entity is not _MISSING:
+            return entity
+
+        negative_cache = self.negative_regions.get(region)
+        if negative_cache is not None and negative_cache.get(key, _MISSING) is not _MISSING:
+            return None
+
+        value = self.backend.get(region, repr(key)) if self.backend is not None else None
+        if value is not None:
+            entity = _loads(value, server)
+            if entity is not None:
+                entity = entity._map(server)
+        else:
+            entity = load()
+
+        if entity is not None:
+            cache.put(key, _hold(entity))
+        elif negative_cache is not None:
+            negative_cache.put(key, None)
+
+        if value is None and self.backend is not None and (entity is not None or negative_cache is not None):
+            self.backend.put(region, repr(key), _dumps(entity),
+                             cache.ttl if entity is not None else negative_cache.ttl)
+
+        return entity
+
+    def invalidate(self, region, keys=None, uuid=None):
+        """ Forget the lookups of an entity of a region, or all the lookups of the region
+        if neither keys nor uuid is given. The regions depending on it are cleared.
+
+        :param region: name of the region, for example 'user'
+        :type region: str
+        :param keys: keys of the lookups of the entity, found or not
+        :type keys: list of tuple
+        :param uuid: uuid of the entity, whose found lookups are all forgotten, whatever their key
+        :type uuid: unicode
+
+        """
+        if keys is None and uuid is None:
+            names = [region]
+        else:
+            names = []
+            self._invalidate_entity(region, list(keys or []), uuid)
+
+        for name in names + LookupCache.DEPENDENT_REGIONS.get(region, []):
+            for caches in (self.regions, self.negative_regions):
+                cache = caches.get(name)
+                if cache is not None:
+                    cache.clear()
+            if self.backend is not None and name in self.regions:
+                self.backend.clear(name)
+
+    def _invalidate_entity(self, region, keys, uuid):
+        cache = self.regions.get(region)
+        if cache is None:
+            return
+
+        if uuid is not None:
+            keys += cache.invalidate_if(lambda entity: getattr(entity, 'uuid', None) == uuid)
+        for key in keys:
+            cache.invalidate(key)
+            if region in self.negative_regions:
+                self.negative_regions[region].invalidate(key)
+            if self.backend is not None:
+                self.backend.delete(region, repr(key))
+
+    def clear(self):
+        """ Forget all the entities """
+        for cache in self.regions.values() + self.negative_regions.values():
+            cache.clear()
+        if self.backend is not None:
+            for region in self.regions:
+                self.backend.clear(region)
+
+    def stats(self):
+        """ Counters of each region
+
+        :return: dict -- TTLCache.stats of each region, by region name, with
+            the stats of its lookups of entities which do not exist as 'negative',
+            and the stats of the backend as 'backend'
+
+        """
+        stats = {}
+        for (region, cache) in self.regions.items():
+            stats[region] = cache.stats()
+            if region in self.negative_regions:
+                stats[region]['negative'] = self.negative_regions[region].stats()
+        if self.backend is not None:
+            stats['backend'] = self.backend.stats()
+
+        return stats
+
+
+def build_cache(cache):
+    """ Build the LookupCache of a server handle
+
+    :param cache: True for the default LookupCache, params of its regions
+        (see LookupCache), a LookupCache, or None / False for no cache
+    :type cache: bool, dict or LookupCache
+    :return: LookupCache or None
+    :raise TypeError: if cache is of none of these types
+
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return LookupCache()
+    if isinstance(cache, dict):
+        return LookupCache(cache)
+    if isinstance(cache, LookupCache):
+        return cache
+
+    raise TypeError(u"cache must be a bool, a dict or a LookupCache")
+
+
+def cached_lookup(key=None):
+    """ Decorate a lookup classmethod of a BonitaObject subclass, so that it
+    reads through the LookupCache of the server handle, in the CACHE_REGION
+    of the class. The lookup must take a server parameter.
+
+    Example
+.. code ::
+
+    class BonitaRole(BonitaObject):
+        CACHE_REGION = 'role'
+
+        @classmethod
+        @cached_lookup()
+        def get_by_name(cls, name, server=None):
+            ...
+
+    :param key: function building the cache key from the arguments of the
+        lookup, server excluded (default : the arguments themselves)
+    :type key: function
+
+    """
+    def decorate(function):
+        names = inspect.getargspec(function).args[1:]
+        position = names.index('server')
+        names = names[:position]
+
+        @functools.wraps(function)
+        def lookup(cls, *args, **kwargs):
+            server = kwargs['server'] if 'server' in kwargs else (args[position] if len(args) > position else None)
+            cache = cls._resolve_server(server).cache
+            if cache is None:
+                return function(cls, *args, **kwargs)
+
+            try:
+                values = args[:position] + tuple(kwargs[name] for name in names[len(args):])
+            except KeyError:
+                # Let the lookup complain about its missing arguments
+                return function(cls, *args, **kwargs)
+
+            lookup_key = (function.__name__,) + (key(*values) if key is not None else values)
+
+            return cache.get_or_load(cls.CACHE_REGION, lookup_key, lambda: function(cls, *args, **kwargs), server)
+
+        return lookup
+
+    return decorate
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+
+__all__ = ['SingleFlight']
+
+
+class _Call(object):
+    """ A call in flight, waited for by every thread asking for the same key """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+        # Threads waiting for the call
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """ Coalesce identical concurrent calls into a single one.
+
+    The first thread calling do with a key runs the function. Threads calling
+    do with the same key while it runs do not call the function : they wait
+    for it and get the same result, or the same exception. Once the call is
+    done, the key is forgotten and the next call runs the function again :
+    nothing is cached.
+
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        """ Call function, unless a call with the same key is already in flight
+
+        :param key: identifies identical calls, must be hashable
+        :return: the result of the call
+        :raise: the exception raised by the call
+
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = function(*args, **kwargs)
+            except BaseException:
+                # KeyboardInterrupt, SystemExit or GreenletExit too : the waiters must not get None
+                call.exc_info = sys.exc_info()
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.exc_info is not None:
+            raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+
+        return call.result
+
+    def in_flight(self):
+        """ Number of distinct calls in flight """
+        with self._lock:
+            return len(self._calls)
+
+    def waiting(self):
+        """ Number of threads waiting for a call in flight """
+        with self._lock:
+            return sum(call.waiters for call in self._calls.values())
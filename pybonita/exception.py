@@ -3,8 +3,10 @@
 from lxml.etree import XMLSchemaParseError
 
 __all__ = ['BonitaException','BonitaServerNotInitializedError',
-    'ServerNotReachableError','UnexpectedResponseError','BonitaHTTPError',
-    'BonitaXMLError']
+    'ServerNotReachableError','CircuitOpenError','UnexpectedResponseError',
+    'BonitaHTTPError','BonitaNotFoundError','UserNotFoundError','GroupNotFoundError',
+    'RoleNotFoundError','MembershipNotFoundError','ProcessNotFoundError',
+    'InstanceNotFoundError','BonitaXMLError','build_http_error']
 
 
 class BonitaException(Exception):
@@ -26,6 +28,10 @@ class ServerNotReachableError(BonitaException):
     """ Bonita server is not reachable """
     _base_message = 'unable to reach Bonita server'
 
+class CircuitOpenError(ServerNotReachableError):
+    """ Bonita server is failing, requests are not sent until its circuit breaker closes """
+    _base_message = 'circuit breaker open, request not sent to Bonita server'
+
 class UnexpectedResponseError(BonitaException):
     """ Response from Bonita server is unexpected """
     _base_message = 'unexpected server response'
@@ -51,6 +57,64 @@ class BonitaHTTPError(BonitaException):
         
         super(BonitaHTTPError,self).__init__(err_info)
 
+class BonitaNotFoundError(BonitaHTTPError):
+    """ The Bonita entity asked for does not exist (a *NotFoundException from Bonita server) """
+    _base_message = 'Bonita entity not found'
+
+class UserNotFoundError(BonitaNotFoundError):
+    """ The user does not exist """
+    _base_message = 'user not found'
+
+class GroupNotFoundError(BonitaNotFoundError):
+    """ The group does not exist """
+    _base_message = 'group not found'
+
+class RoleNotFoundError(BonitaNotFoundError):
+    """ The role does not exist """
+    _base_message = 'role not found'
+
+class MembershipNotFoundError(BonitaNotFoundError):
+    """ The membership does not exist """
+    _base_message = 'membership not found'
+
+class ProcessNotFoundError(BonitaNotFoundError):
+    """ The process does not exist """
+    _base_message = 'process not found'
+
+class InstanceNotFoundError(BonitaNotFoundError):
+    """ The case (process instance) does not exist """
+    _base_message = 'case not found'
+
+# BonitaHTTPError subclass raised for each Java exception class name (without its package)
+NOT_FOUND_ERRORS = {
+    'UserNotFoundException': UserNotFoundError,
+    'GroupNotFoundException': GroupNotFoundError,
+    'RoleNotFoundException': RoleNotFoundError,
+    'MembershipNotFoundException': MembershipNotFoundError,
+    'ProcessNotFoundException': ProcessNotFoundError,
+    'InstanceNotFoundException': InstanceNotFoundError,
+}
+
+def build_http_error(bonita_exception='',code='',message=''):
+    """ Build the BonitaHTTPError for an error returned by Bonita server :
+    a BonitaNotFoundError subclass if the entity asked for does not exist.
+
+    :param bonita_exception: Java exception class name, with its package
+    :type bonita_exception: str
+    :param code: real HTTP error code
+    :type code: int
+    :param message: message describing the problem
+    :type message: unicode
+    :return: BonitaHTTPError
+
+    """
+    name = bonita_exception.rsplit('.',1)[-1]
+    error_class = NOT_FOUND_ERRORS.get(name)
+    if error_class is None:
+        error_class = BonitaNotFoundError if name.endswith('NotFoundException') else BonitaHTTPError
+
+    return error_class(bonita_exception=bonita_exception,code=code,message=message)
+
 class BonitaXMLError(BonitaException,XMLSchemaParseError):
     """ XML does not seem to correspond to Bonita REST (!!) API """
     _base_message = 'XML not what Bonita states'
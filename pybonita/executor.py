@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+__all__ = ['BonitaExecutor', 'gather']
+
+
+class BonitaExecutor(object):
+    """ Runs pybonita calls concurrently in a bounded pool of worker threads.
+
+    Calls submitted to the executor are queued and run as soon as a worker is
+    free, so any number of calls can be in flight while only `workers` threads
+    are ever used.
+
+    """
+
+    DEFAULT_WORKERS = 16
+
+    def __init__(self, workers=None):
+        """ Build up a new BonitaExecutor
+
+        :param workers: number of worker threads (default : DEFAULT_WORKERS)
+        :type workers: int
+        :raise TypeError: if workers is not a positive integer
+
+        """
+        workers = workers if workers is not None else self.DEFAULT_WORKERS
+        if type(workers) != int or workers < 1:
+            raise TypeError(u"workers must be a positive integer")
+
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _get_pool(self):
+        # The pool is only started upon first use
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers)
+            return self._pool
+
+    def _run(self, function, args, kwargs):
+        self._local.is_worker = True
+        return function(*args, **kwargs)
+
+    def in_worker(self):
+        """ Is the current thread one of the executor workers ? """
+        return getattr(self._local, 'is_worker', False)
+
+    def submit(self, function, *args, **kwargs):
+        """ Schedule a call of function with the given arguments
+
+        :return: result of the call, to be retrieved with its get method
+        :rtype: multiprocessing.pool.AsyncResult
+
+        """
+        return self._get_pool().apply_async(self._run, (function, args, kwargs))
+
+    def map(self, function, iterable):
+        """ Call function on each item of iterable concurrently and wait for all the results.
+
+        When called from a worker of this executor, calls are run in the
+        current thread, so that a worker never waits for other workers.
+
+        :return: list of the results, in the order of iterable
+
+        """
+        if self.in_worker():
+            return [function(item) for item in iterable]
+
+        return gather([self.submit(function, item) for item in iterable])
+
+    def close(self):
+        """ Stop the worker threads once the scheduled calls are done """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+
+def gather(results, timeout=None):
+    """ Wait for the results of several submitted calls
+
+    :param results: results returned by BonitaExecutor.submit or the *_async methods
+    :type results: list of multiprocessing.pool.AsyncResult
+    :param timeout: seconds to wait for each result (default : wait forever)
+    :type timeout: float
+    :return: list of the call results, in the order of results
+    :raise: the exception raised by a failed call
+
+    """
+    return [result.get(timeout) for result in results]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import threading
+import weakref
+
+__all__ = ['IdentityMap']
+
+
+class IdentityMap(object):
+    """ Share a single object for each Bonita entity retrieved through a server handle.
+
+    Objects are kept by class and uuid. Building an object whose uuid is
+    already mapped reuses the mapped object instead of allocating a new one :
+    the thousands of memberships of a directory then share the few groups
+    and roles which exist, and comparing them is meaningful.
+
+    Objects are weakly referenced : an object nobody uses anymore is freed,
+    and built again on its next retrieval. A mapped object is refreshed with
+    the data of the later retrievals, but its nested entities (see
+    BonitaObject._get_mapped).
+
+    """
+
+    def __init__(self):
+        self._objects = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._objects)
+
+    def get(self, cls, uuid):
+        """ Return the object of class cls with the uuid, or None if not mapped
+
+        :param cls: class of the object
+        :type cls: BonitaObject subclass
+        :param uuid: uuid of the object
+        :type uuid: unicode
+        :return: BonitaObject or None
+
+        """
+        if uuid is None:
+            return None
+
+        with self._lock:
+            return self._objects.get((cls, uuid))
+
+    def add(self, bonita_object):
+        """ Map an object by its class and uuid.
+        If an object with the same class and uuid has been mapped meanwhile, it
+        is kept and returned instead : always use the returned object.
+
+        :param bonita_object: the object to map, objects without uuid are not mapped
+        :type bonita_object: BonitaObject
+        :return: BonitaObject -- the mapped object
+
+        """
+        if bonita_object.uuid is None:
+            return bonita_object
+
+        key = (bonita_object.__class__, bonita_object.uuid)
+        with self._lock:
+            mapped = self._objects.get(key)
+            if mapped is None:
+                self._objects[key] = mapped = bonita_object
+
+        return mapped
+
+    def clear(self):
+        """ Forget all the mapped objects """
+        with self._lock:
+            self._objects.clear()
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+from bs4.element import Tag
+from lxml import etree
+from lxml.etree import XMLSchemaParseError
+
+from .parser import parse_element
+from .utils import tag_matcher, xml_find_all, xml_string, xml_text, xml_tostring
+
+__all__ = ['Field', 'EntityField', 'Mapping',
+           'to_string', 'to_text', 'to_timestamp', 'to_boolean', 'to_dict']
+
+
+def to_string(node):
+    """ Value of a tag holding a single string, None otherwise (see xml_string) """
+    return xml_string(node)
+
+
+def to_text(node):
+    """ All the text inside a tag (see xml_text) """
+    return xml_text(node)
+
+
+def to_timestamp(node):
+    """ Date of a tag holding a Bonita timestamp, in milliseconds since epoch
+
+    :return: datetime.datetime
+    :raise ValueError: if the tag does not hold a number
+
+    """
+    return datetime.fromtimestamp(float(xml_text(node)) / 1000.0)
+
+
+def to_boolean(node):
+    """ Value of a tag holding a Bonita boolean : anything but false is True """
+    return xml_text(node) != u'false'
+
+
+def to_dict(node):
+    """ Dictionnary of a tag holding a Java map : entry tags with a key string
+    and an optional value string (the value is None when missing).
+
+    :return: dict
+
+    """
+    values = {}
+    for entry in xml_find_all(node, 'entry', recursive=False):
+        strings = xml_find_all(entry, 'string', recursive=False)
+        values[xml_text(strings[0])] = xml_text(strings[1]) if len(strings) == 2 else None
+
+    return values
+
+
+class Field(object):
+    """ A property of a Bonita entity, read from its XML element.
+
+    The path of the field is a tag name, or a list of tag names separated by
+    / : each step is looked for among the children of the previous one, in a
+    first-letter case insensitive manner (see xml_find).
+
+    A lazy field is expensive to build and seldom used : it can be left out
+    when the entity is read, and read later on first access (see
+    Mapping.read_lazy).
+
+    """
+
+    def __init__(self, path, attribute=None, converter=None, required=True, many=False, lazy=False):
+        """ Build up a new Field
+
+        :param path: tag names, from the element of the entity, separated by /
+        :type path: str
+        :param attribute: key of the value read by Mapping.read (default : the last tag name of path)
+        :type attribute: str
+        :param converter: function building the value from the tag (default : to_string)
+        :type converter: function
+        :param required: should Mapping.read raise an exception if the tag is not found ?
+        :type required: bool (default : True)
+        :param many: is the value the list of all the tags found, instead of the first one ?
+        :type many: bool (default : False)
+        :param lazy: can the field be read on first access only ?
+        :type lazy: bool (default : False)
+        :raise TypeError: if path is not a string
+
+        """
+        if not isinstance(path, (str, unicode)):
+            raise TypeError(u"path must be a string or unicode")
+
+        self.path = path
+        steps = path.split('/')
+        self.attribute = attribute if attribute is not None else steps[-1]
+        self.converter = converter if converter is not None else to_string
+        self.required = required
+        self.many = many
+        self.lazy = lazy
+
+        self.head = tag_matcher(steps[0], recursive=False)
+        self.tail = [tag_matcher(step, recursive=False) for step in steps[1:]]
+
+    def convert(self, node, server=None):
+        """ Build the value of the field from its tag """
+        return self.converter(node)
+
+
+class EntityField(Field):
+    """ A property of a Bonita entity holding another Bonita entity """
+
+    def __init__(self, path, entity, attribute=None, required=True, many=False, lazy=False):
+        """ Build up a new EntityField
+
+        :param entity: function returning the BonitaObject subclass to build, so
+            that entities defined later in their module can be referenced
+        :type entity: function
+        :see: Field for the other parameters
+
+        """
+        super(EntityField, self).__init__(path, attribute=attribute, required=required, many=many, lazy=lazy)
+        self.entity = entity
+
+    def convert(self, node, server=None):
+        """ Build the entity from its tag, bound to the same server handle """
+        return self.entity()._instanciate_from_node(node, server=server)
+
+
+class Mapping(object):
+    """ Read the fields of a Bonita entity from its XML element.
+
+    A Mapping is built once per entity class, from the list of its fields. It
+    prepares the dispatch of the tag names to the fields, so that reading an
+    element takes a single pass over its children instead of one search per
+    field.
+
+    Example
+.. code ::
+
+    class BonitaRole(BonitaObject):
+        MAPPING = Mapping([Field('uuid'), Field('name'), Field('dbid', required=False)])
+
+    fields = BonitaRole.MAPPING.read(role_soup)  # {'uuid': u'...', 'name': u'...'}
+
+    """
+
+    def __init__(self, fields):
+        """ Build up a new Mapping
+
+        :param fields: fields of the entity
+        :type fields: list of Field
+
+        """
+        self.fields = list(fields)
+        self._eager_fields = [field for field in self.fields if not field.lazy]
+        self._lazy_fields = [field for field in self.fields if field.lazy]
+
+        self._fields_by_tag = {}
+        for field in self.fields:
+            for name in field.head.names:
+                self._fields_by_tag.setdefault(name, []).append(field)
+
+    def _heads(self, node):
+        # Tags matching the first step of the path of each field, in document order
+        fields_by_tag = self._fields_by_tag
+        heads = {}
+
+        if type(node) is etree._Element:
+            for child in node:
+                for field in fields_by_tag.get(child.tag, ()):
+                    heads.setdefault(field, []).append(child)
+        elif isinstance(node, Tag):
+            for child in node.children:
+                if isinstance(child, Tag):
+                    for field in fields_by_tag.get(child.name, ()):
+                        heads.setdefault(field, []).append(child)
+        else:
+            heads = dict((field, field.head.find_all(node)) for field in self.fields)
+
+        return heads
+
+    def read(self, node, server=None, eager=True, entities=True):
+        """ Read the fields from the XML element of an entity.
+        Fields not required and not found are left out of the result.
+
+        :param node: the element of the entity, as built by pybonita.parser.parse_xml
+        :type node: lxml.etree._Element or bs4.element.Tag
+        :param server: server handle the entity is retrieved from, given to the nested entities
+        :type server: BonitaServer
+        :param eager: read the lazy fields too ? If not, they are left out of the result
+        :type eager: bool (default : True)
+        :param entities: read the fields holding entities (see EntityField) too ? If not, they are left out of the result
+        :type entities: bool (default : True)
+        :return: dict -- values of the fields, by attribute
+        :raise XMLSchemaParseError: if the tag of a required field is not found
+
+        """
+        fields = self.fields if eager else self._eager_fields
+        if not entities:
+            fields = [field for field in fields if not isinstance(field, EntityField)]
+
+        return self._read(node, server, fields)
+
+    def read_lazy(self, node, server=None):
+        """ Read the lazy fields only, see read
+
+        :param node: the element of the entity, or the XML of its lazy fields returned by detach_lazy
+        :type node: lxml.etree._Element, bs4.element.Tag or str
+
+        """
+        if isinstance(node, basestring):
+            node = parse_element(node)
+
+        return self._read(node, server, self._lazy_fields)
+
+    def detach_lazy(self, node):
+        """ Serialize the children of the XML element of an entity its lazy fields
+        are read from, to read them later with read_lazy.
+
+        Keeping the element itself would keep its whole document alive, down to
+        the tags already read : the lazy fields are parsed again on first
+        access instead.
+
+        :param node: the element of the entity, as built by pybonita.parser.parse_xml
+        :type node: lxml.etree._Element or bs4.element.Tag
+        :return: str -- UTF-8 XML element named after node, holding these children only
+
+        """
+        heads = self._heads(node)
+
+        children = []
+        for field in self._lazy_fields:
+            for child in heads.get(field, []):
+                if not any(child is other for other in children):
+                    children.append(child)
+
+        name = node.tag if isinstance(node, etree._Element) else node.name
+        xml = u'<%s>%s</%s>' % (name, u''.join(xml_tostring(child) for child in children), name)
+
+        return xml.encode('utf-8')
+
+    def _read(self, node, server, fields):
+        heads = self._heads(node)
+
+        values = {}
+        for field in fields:
+            nodes = heads.get(field, [])
+            for matcher in field.tail:
+                nodes = [child for parent in nodes for child in matcher.find_all(parent)]
+
+            if field.many:
+                values[field.attribute] = [field.convert(tag, server) for tag in nodes]
+            elif len(nodes) > 0:
+                values[field.attribute] = field.convert(nodes[0], server)
+            elif field.required:
+                raise XMLSchemaParseError('tag %s not found' % (field.path))
+
+        return values
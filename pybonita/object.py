@@ -1,21 +1,181 @@
 # -*- coding: utf-8 -*-
-from bs4 import BeautifulSoup
-
+from pybonita.parser import parse_xml
 from pybonita.server import BonitaServer
+from pybonita.utils import tag_matcher, xml_find_all, xml_string, xml_text
+
+__all__ = ['BonitaObject', 'async_method']
+
+
+class async_method(object):
+    """ Declare the asynchronous variant of a BonitaObject method or classmethod.
+
+    The variant takes the same arguments as the method, schedules the call on
+    the executor of the server handle and immediately returns its result, to
+    be retrieved with its get method (see pybonita.executor.gather).
+
+    Example
+.. code ::
+
+    class BonitaRole(BonitaObject):
+        get_async = async_method('get')
+
+    results = [BonitaRole.get_async(name=name) for name in ['user', 'admin']]
+    roles = gather(results)
+
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        target = instance if instance is not None else owner
+
+        def run(*args, **kwargs):
+            method = getattr(target, self.name)
+
+            if instance is not None:
+                server = instance._get_server(kwargs.get('server'))
+            else:
+                server = BonitaObject._resolve_server(kwargs.get('server'))
 
-__all__ = ['BonitaObject']
+            return server.executor.submit(method, *args, **kwargs)
+
+        run.__name__ = self.name + '_async'
+        run.__doc__ = u"Asynchronous variant of %s.%s" % (owner.__name__, self.name)
+
+        return run
 
 
 class BonitaObject(object):
     """ All Bonita's entities inherit from BonitaObject """
 
+    # Server handle the object is bound to, None stands for the BonitaServer singleton
+    _server = None
+
+    # XML the lazy fields of the object are still to be read from (see pybonita.mapping.Mapping.detach_lazy)
+    _lazy_node = None
+
+    # Region of the LookupCache of the server handle holding the lookups of the class (see pybonita.cache)
+    CACHE_REGION = None
+
+    # Cached lookups of the class taking a single attribute of the object, as (lookup name, attribute) :
+    # they are forgotten when the object is saved or deleted (see _invalidate_cache)
+    CACHE_KEYS = []
+
+    # Should the objects be shared by uuid through the identity map and the LookupCache of the
+    # server handle ? Objects which are not get a copy of their own from the LookupCache.
+    SHARED = True
+
     def __init__(self, uuid):
         self.uuid = uuid
 
     def __str__(self):
         return "%s %s" % (self.__class__, self.uuid)
 
-    def save(self, user=None, variables=None):
+    @staticmethod
+    def _resolve_server(server=None):
+        """ Return the given server handle, or the BonitaServer singleton if None """
+        return server if server is not None else BonitaServer.get_instance()
+
+    def _bind_server(self, server):
+        """ Bind the object to a server handle.
+        Binding does not mark the object as modified.
+
+        """
+        object.__setattr__(self, '_server', server)
+
+    def _get_server(self, server=None):
+        """ Return the server handle to use for this object.
+        If a server is given, the object is bound to it.
+
+        """
+        if server is not None:
+            self._bind_server(server)
+
+        return self._resolve_server(self._server)
+
+    @classmethod
+    def _get_mapped(cls, node, server=None):
+        """ Return the object already built through the server handle for the
+        uuid of the XML element node, or None (see pybonita.identity.IdentityMap).
+
+        The fields of the object are refreshed from node, discarding its local
+        changes, but the fields holding other entities : these are shared, and
+        refreshed by their own retrievals.
+
+        """
+        identity_map = cls._resolve_server(server).identity_map
+        if identity_map is None:
+            return None
+
+        tag = tag_matcher('uuid', recursive=False).find(node, raise_exception=False)
+        if tag is None:
+            return None
+
+        mapped = identity_map.get(cls, xml_string(tag))
+        if mapped is not None:
+            for (attribute, value) in cls.MAPPING.read(node, server=server, eager=False, entities=False).items():
+                setattr(mapped, attribute, value)
+
+        return mapped
+
+    def _map(self, server=None):
+        """ Share the object through the server handle, by its uuid.
+
+        :return: BonitaObject -- the shared object, which is not self if an
+            object with the same uuid has been shared meanwhile
+
+        """
+        identity_map = self._resolve_server(server).identity_map
+        if identity_map is None or not self.SHARED:
+            return self
+
+        return identity_map.add(self)
+
+    def _init_lazy_fields(self, node, fields, lazy):
+        """ Set the lazy fields read from node, or keep their XML to read them on first access.
+        As binding, this does not mark the object as modified.
+
+        :param node: the XML element of the object
+        :type node: lxml.etree._Element or bs4.element.Tag
+        :param fields: the fields read from node by the MAPPING of the class
+        :type fields: dict
+        :param lazy: were the lazy fields left out of fields ?
+        :type lazy: bool
+
+        """
+        if lazy:
+            object.__setattr__(self, '_lazy_node', self.MAPPING.detach_lazy(node))
+        else:
+            object.__setattr__(self, '_lazy_node', None)
+            self._set_lazy_fields(fields)
+
+    def _load_lazy_fields(self):
+        """ Read the lazy fields, if not yet done. Accessors of the lazy fields call it first. """
+        node = self._lazy_node
+        if node is not None:
+            self._set_lazy_fields(self.MAPPING.read_lazy(node, server=self._server))
+            object.__setattr__(self, '_lazy_node', None)
+
+    def _set_lazy_fields(self, fields):
+        """ Set the lazy fields of the object, read by its MAPPING.
+        You must define this method when the MAPPING of a class has lazy fields.
+
+        """
+        raise NotImplementedError
+
+    def _invalidate_cache(self):
+        """ Forget the lookups of the object cached by the server handle the object is bound to,
+        once the object is modified on the Bonita server : those which found it, and those by its
+        CACHE_KEYS which found nothing.
+
+        """
+        cache = self._resolve_server(self._server).cache
+        if cache is not None and self.CACHE_REGION is not None:
+            keys = [(name, getattr(self, attribute, None)) for (name, attribute) in self.CACHE_KEYS]
+            cache.invalidate(self.CACHE_REGION, keys=keys, uuid=getattr(self, 'uuid', None))
+
+    def save(self, user=None, variables=None, server=None):
         """ Save a BonitaObject : sends data to create a resource on the Bonita server.
 
         """
@@ -24,16 +184,19 @@ class BonitaObject(object):
         (url,data) = self._generate_save_url(variables)
 
         # Call the BonitaServer
-        xml = BonitaServer.get_instance().sendRESTRequest(url=url, user=user, data=data)
+        try:
+            xml = self._get_server(server).sendRESTRequest(url=url, user=user, data=data)
+        finally:
+            self._invalidate_cache()
 
         # Extract UUID of newly created object
-        soup = BeautifulSoup(xml,'xml')
-        instances = soup.findAll("uuid")
+        soup = parse_xml(xml)
+        instances = xml_find_all(soup, 'uuid')
         if len(instances) != 1:
             raise Exception #fixme: raise clear Exception
-        self.uuid = instances[0].text
+        self.uuid = xml_text(instances[0])
 
-    def delete(self, user=None):
+    def delete(self, user=None, server=None):
         """ Delete a BonitaObject : remove it from the Bonita server
 
         """
@@ -41,7 +204,10 @@ class BonitaObject(object):
         (url,data) = self._generate_delete_url()
 
         # Call the BonitaServer
-        xml = BonitaServer.get_instance().sendRESTRequest(url = url, user=user, data=data)
+        try:
+            xml = self._get_server(server).sendRESTRequest(url = url, user=user, data=data)
+        finally:
+            self._invalidate_cache()
 
         #TODO Test return code for completion
 
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import re
+import threading
+
+from bs4 import BeautifulSoup
+from lxml import etree
+from lxml.etree import XMLSchemaParseError
+
+from .utils import xml_find_all
+
+__all__ = ['parse_xml', 'parse_element', 'iter_children', 'parse_error_body', 'get_backend', 'set_backend', 'BACKENDS']
+
+# lxml.etree builds the XML tree much faster, BeautifulSoup is kept as a fallback
+BACKENDS = ['lxml', 'bs4']
+
+_backend = 'lxml'
+
+_local = threading.local()
+
+# lxml refuses unicode strings starting with an encoding declaration
+_XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+# Error bodies of Bonita server : the root element is named after the Java exception
+_ERROR_EXCEPTION = re.compile(r'^\s*(?:<\?xml[^>]*\?>\s*)?(?:<!--.*?-->\s*)*<([^\s/>]+)', re.DOTALL)
+_ERROR_CODE = re.compile(r'<errorCode>\s*(-?\d+)\s*</errorCode>')
+_ERROR_MESSAGE = re.compile(r'<detailMessage>(.*?)</detailMessage>', re.DOTALL)
+
+# Markup of the text of an element : CDATA sections, character references and predefined entities
+_XML_TEXT_MARKUP = re.compile(r'<!\[CDATA\[(.*?)\]\]>|&#(\d+);|&#[xX]([0-9a-fA-F]+);|&(lt|gt|amp|quot|apos);', re.DOTALL)
+
+_XML_ENTITIES = {'lt': u'<', 'gt': u'>', 'amp': u'&', 'quot': u'"', 'apos': u"'"}
+
+
+def _replace_text_markup(match):
+    (cdata, decimal, hexadecimal, entity) = match.groups()
+    if cdata is not None:
+        return cdata
+    if entity is not None:
+        return _XML_ENTITIES[entity]
+
+    try:
+        # Characters beyond the BMP too, on narrow builds of Python
+        return ('\\U%08x' % int(decimal or hexadecimal, 10 if decimal else 16)).decode('unicode-escape')
+    except UnicodeDecodeError:
+        return match.group(0)
+
+
+def _unescape_text(text):
+    """ Text of an element from its XML, as a tree parser would read it """
+    return _XML_TEXT_MARKUP.sub(_replace_text_markup, text)
+
+
+def get_backend():
+    """ Name of the backend used by parse_xml """
+    return _backend
+
+
+def set_backend(name):
+    """ Choose the backend used by parse_xml
+
+    :param name: one of BACKENDS
+    :type name: str
+    :raise ValueError: if the backend is unknown
+
+    """
+    global _backend
+
+    if name not in BACKENDS:
+        raise ValueError(u"unknown XML parser backend %s, expected one of %s" % (name, BACKENDS))
+
+    _backend = name
+
+
+def _get_lxml_parser():
+    # lxml parsers must not be shared between threads
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        # Be as lenient as BeautifulSoup with broken XML
+        parser = _local.parser = etree.XMLParser(recover=True, resolve_entities=False, huge_tree=True)
+    return parser
+
+
+def parse_xml(xml):
+    """ Parse a Bonita XML document with the current backend.
+
+    The returned document is meant to be browsed with pybonita.utils
+    xml_find, xml_find_all, xml_string, xml_text and xml_tostring, which
+    work the same with both backends.
+
+    :param xml: the XML document, or a file-like object to read it from
+    :type xml: unicode, str or file
+    :return: lxml.etree._ElementTree or bs4.BeautifulSoup
+    :raise XMLSchemaParseError: if no XML element can be read (lxml backend only)
+
+    """
+    if _backend == 'bs4':
+        return BeautifulSoup(xml, 'xml')
+
+    parser = _get_lxml_parser()
+    try:
+        if isinstance(xml, unicode):
+            root = etree.fromstring(_XML_DECLARATION.sub(u'', xml, count=1), parser)
+        elif isinstance(xml, str):
+            root = etree.fromstring(xml, parser)
+        else:
+            root = etree.parse(xml, parser).getroot()
+    except etree.XMLSyntaxError as exc:
+        raise XMLSchemaParseError('invalid XML : %s' % exc)
+
+    if root is None:
+        raise XMLSchemaParseError('no XML element found')
+
+    return root.getroottree()
+
+
+def parse_element(xml):
+    """ Parse a Bonita XML document with the current backend, see parse_xml
+
+    :return: lxml.etree._Element or bs4.element.Tag -- the root element of the document
+
+    """
+    document = parse_xml(xml)
+    if isinstance(document, etree._ElementTree):
+        return document.getroot()
+
+    return document.find(True, recursive=False)
+
+
+def parse_error_body(body):
+    """ Decode the XML body of an error returned by Bonita server.
+
+    Bonita answers errors with a document whose root element is named after
+    the Java exception, holding the real HTTP code in errorCode and the
+    message in detailMessage. They are read with precompiled regular
+    expressions instead of building a tree : "not found" errors are the
+    usual answer to lookups of entities which do not exist.
+
+    :param body: the error body
+    :type body: unicode or str
+    :return: tuple -- (Java exception class name, code, message), code
+        defaults to 500 and message to '', or None if body holds no XML element
+
+    """
+    match = _ERROR_EXCEPTION.match(body)
+    if match is None:
+        return None
+
+    code = _ERROR_CODE.search(body, match.end())
+    message = _ERROR_MESSAGE.search(body, match.end())
+
+    return (match.group(1),
+            int(code.group(1)) if code is not None else 500,
+            _unescape_text(message.group(1)) if message is not None else u'')
+
+
+def iter_children(stream, name):
+    """ Parse a Bonita XML list (a set or a list element) incrementally and
+    yield its items one at a time.
+
+    With the lxml backend, the items are detached from the document once the
+    consumer asks for the next one : only the items the consumer still
+    references are held in memory (objects built from them can keep reading
+    them on first access). The bs4 backend parses the whole document first.
+    The stream is closed once consumed, or when the generator is closed.
+
+    :param stream: file-like object to read the XML document from, the encoding
+        attribute of the stream (if any) overriding the one declared by the document
+    :type stream: file
+    :param name: tag name of the items, first-letter case insensitive as in xml_find
+    :type name: str
+    :return: generator of lxml.etree._Element or bs4.element.Tag
+    :raise XMLSchemaParseError: if the XML is invalid
+
+    """
+    tags = (name, name[0].upper() + name[1:])
+    encoding = getattr(stream, 'encoding', None)
+
+    try:
+        if _backend == 'bs4':
+            soup = BeautifulSoup(stream, 'xml', from_encoding=encoding)
+            for element in xml_find_all(soup, name):
+                if element.parent is not None and element.parent.parent is soup:
+                    yield element
+            return
+
+        events = etree.iterparse(stream, events=('end',), tag=tags, recover=True,
+                                 resolve_entities=False, huge_tree=True, encoding=encoding)
+        try:
+            for (event, element) in events:
+                parent = element.getparent()
+                # Only the items of the list, not the elements they hold with the same name
+                if parent is None or parent.getparent() is not None:
+                    continue
+
+                yield element
+
+                # Detach the item, and whatever came before it, from the root : they
+                # are freed as soon as the consumer does not reference them anymore
+                while element.getprevious() is not None:
+                    del parent[0]
+                parent.remove(element)
+        except etree.XMLSyntaxError as exc:
+            raise XMLSchemaParseError('invalid XML : %s' % exc)
+    finally:
+        stream.close()
@@ -3,21 +3,30 @@
 import os.path
 import base64
 
-from datetime import datetime
 from xml.dom.minidom import parseString
 
-from bs4 import BeautifulSoup
-
 from pybonita import logger
-from pybonita.exception import BonitaHTTPError, XMLSchemaParseError
-from pybonita.object import BonitaObject
-from pybonita.server import BonitaServer
-from pybonita.utils import dictToMapString, xml_find
+from pybonita.cache import cached_lookup
+from pybonita.exception import ProcessNotFoundError, XMLSchemaParseError
+from pybonita.mapping import Mapping, Field, to_text, to_boolean, to_timestamp, to_dict
+from pybonita.object import BonitaObject, async_method
+from pybonita.parser import parse_xml, iter_children
+from pybonita.record import ProcessRecord, CaseRecord
+from pybonita.utils import dictToMapString, xml_find, xml_find_all
 
 __all__ = ['BonitaCase', 'BonitaProcess']
 
 class BonitaProcess(BonitaObject):
 
+    # Region of the LookupCache holding the lookups of processes
+    CACHE_REGION = 'process'
+
+    # Cached lookups of a process, see BonitaObject._invalidate_cache
+    CACHE_KEYS = [('get', 'uuid')]
+
+    # How a BonitaProcess is read from its ProcessDefinition element
+    MAPPING = Mapping([Field('uuid'), Field('name'), Field('version')])
+
     def __init__(self, uuid):
         logger.debug("Instanciating BonitaProcess with uuid : %s" % uuid)
 
@@ -27,64 +36,131 @@ class BonitaProcess(BonitaObject):
         self._version = None
 
     @classmethod
-    def get(cls, uuid):
+    @cached_lookup()
+    def get(cls, uuid, server=None):
         """ Retrieve a process from its uuid
 
         :param uuid: uuid of the process to retrieve
         :type uuid: str
-        :returns: BonitaProcess -- the retrieved process.
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :returns: BonitaProcess -- the retrieved process, or None if not found
 
         """
+        # Definitions never change : a registered one is used as is
+        registry = cls._resolve_server(server).process_registry
+        process = registry.get(uuid) if registry is not None else None
+        if process is not None:
+            return process
+
         url = "/queryDefinitionAPI/getProcess/%s" % uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError:
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except ProcessNotFoundError:
             return None
 
-        return BonitaProcess._instanciate_from_xml(xml)
+        return BonitaProcess._instanciate_from_xml(xml, server=server)
+
+    get_async = async_method('get')
 
     @classmethod
-    def get_processes(cls, process_id):
-        """ Get all processes version for a given process id
+    def get_processes(cls, process_id, server=None, compact=False):
+        """ Get all processes version for a given process id.
+        The versions are kept by the process registry of the server handle
+        for a while (see pybonita.registry.ProcessRegistry).
 
         :param process_id: process id
         :type process_id: str
-        :returns: BonitaProcess list
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :param compact: retrieve compact, read-only processes (see pybonita.record) ?
+        :type compact: bool (default : False)
+        :returns: BonitaProcess list, or ProcessRecord list if compact
 
         """
+        registry = cls._resolve_server(server).process_registry
+        if compact or registry is None:
+            return cls._load_processes(process_id, server, compact)
+
+        return registry.get_processes(process_id, lambda: cls._load_processes(process_id, server))
+
+    get_processes_async = async_method('get_processes')
+
+    @classmethod
+    def _load_processes(cls, process_id, server=None, compact=False):
+        """ Retrieve all processes version for a given process id from the Bonita server """
         url = "/queryDefinitionAPI/getProcessesByProcessId/%s" % process_id
 
-        xml = BonitaServer.get_instance().sendRESTRequest(url=url)
+        xml = cls._resolve_server(server).sendRESTRequest(url=url)
 
-        soup = BeautifulSoup(xml.encode('iso-8859-1'),'xml')
+        soup = parse_xml(xml)
+        entity = ProcessRecord if compact else BonitaProcess
 
         processes = []
-        for definition in soup.set.findAll('ProcessDefinition'):
-            processes.append(BonitaProcess._instanciate_from_xml(unicode(definition)))
+        for definition in xml_find_all(xml_find(soup, 'set'), 'ProcessDefinition', recursive=False):
+            processes.append(entity._instanciate_from_node(definition, server=server))
 
         return processes
 
     @classmethod
-    def _instanciate_from_xml(cls, xml):
+    def _instanciate_from_xml(cls, xml, server=None):
         """ Instanciate a BonitaProcess object from its xml definition """
         if not isinstance(xml,(str,unicode)):
                     raise TypeError('xml must be a string or unicode not %s' % (type(xml)))
 
-        soup = BeautifulSoup(xml,'xml')
+        soup = parse_xml(xml)
 
+        return cls._instanciate_from_node(xml_find(soup,'ProcessDefinition'), server=server)
+
+    @classmethod
+    def _instanciate_from_node(cls, process_soup, server=None):
+        """ Instanciate a BonitaProcess object from its already parsed ProcessDefinition element """
         try:
-            process_soup = xml_find(soup,'ProcessDefinition')
-            uuid = xml_find(process_soup,'uuid').string
-            
-            process = BonitaProcess(uuid)
+            fields = cls.MAPPING.read(process_soup, server=server)
+
+            process = BonitaProcess(fields['uuid'])
+            process._bind_server(server)
 
-            process._name = xml_find(process_soup,'name').string
-            process._version = xml_find(process_soup,'version').string
+            process._name = fields['name']
+            process._version = fields['version']
         except XMLSchemaParseError as exc:
             raise
 
-        return process
+        return process._map(server)
+
+    @classmethod
+    def _get_referenced(cls, uuid, server=None):
+        """ Return the process of a case, only known by its uuid : the one
+        registered by the server handle if any, a new one otherwise.
+
+        """
+        def build():
+            process = BonitaProcess(uuid)
+            process._bind_server(server)
+            return process
+
+        registry = cls._resolve_server(server).process_registry
+        if registry is None:
+            return build()
+
+        return registry.get_or_build(uuid, build)
+
+    def _map(self, server=None):
+        """ Share the process through the process registry of the server handle,
+        or through its identity map if it has no registry (see BonitaObject._map)
+
+        """
+        registry = self._resolve_server(server).process_registry
+        if registry is None:
+            return super(BonitaProcess, self)._map(server)
+
+        return registry.add(self)
+
+    def _set_definition(self, process):
+        """ Complete a process only known by its uuid with its retrieved definition """
+        self._name = process._name
+        self._version = process._version
 
     def _get_name(self):
         return self._name
@@ -96,69 +172,134 @@ class BonitaProcess(BonitaObject):
 
     version = property(_get_version, None, None, u"version of the process")
 
-    def get_cases(self):
+    def get_cases(self, server=None, compact=False):
         """ Get all existing cases from the process
 
-        :returns: BonitaCase list
+        :param server: server handle to use (default : the one the process is bound to)
+        :type server: BonitaServer
+        :param compact: retrieve compact, read-only cases (see pybonita.record) ?
+        :type compact: bool (default : False)
+        :returns: BonitaCase list, or CaseRecord list if compact
 
         """
-        url = "/queryRuntimeAPI/getProcessInstances/%s" % self.uuid
+        return list(self.iter_cases(server=server, compact=compact))
 
-        xml = BonitaServer.get_instance().sendRESTRequest(url=url)
+    get_cases_async = async_method('get_cases')
 
-        soup = BeautifulSoup(xml.encode('iso-8859-1'),'xml')
+    def iter_cases(self, server=None, compact=False):
+        """ Get all existing cases from the process one at a time.
+        The response is parsed while the cases are consumed, so that memory
+        stays flat whatever the number of cases.
 
-        cases = []
-        for instance in soup.set.findAll('processinstance'):
-            cases.append(BonitaCase._instanciate_from_xml(unicode(instance)))
+        :param server: server handle to use (default : the one the process is bound to)
+        :type server: BonitaServer
+        :param compact: retrieve compact, read-only cases (see pybonita.record) ?
+        :type compact: bool (default : False)
+        :returns: generator of BonitaCase, or of CaseRecord if compact
 
-        return cases
+        """
+        url = "/queryRuntimeAPI/getProcessInstances/%s" % self.uuid
+
+        server = self._get_server(server)
+        # The list of cases can be huge : let the parser read it from the connexion
+        stream = server.sendRESTRequest(url=url, stream=True)
+        entity = CaseRecord if compact else BonitaCase
+
+        for instance in iter_children(stream, 'processinstance'):
+            yield entity._instanciate_from_node(instance, server=server)
 
 
 class BonitaCase(BonitaObject):
 
+    # How a BonitaCase is read from its processinstance element, variables on first access
+    MAPPING = Mapping([Field('processuuid', converter=to_text), Field('instanceuuid', converter=to_text),
+                       Field('clientvariables', attribute='variables', converter=to_dict, lazy=True),
+                       Field('state', converter=to_text),
+                       Field('isarchived', attribute='is_archived', converter=to_boolean),
+                       Field('starteddate', attribute='started_date', converter=to_timestamp),
+                       Field('lastupdate', attribute='last_update', converter=to_timestamp)])
+
     @classmethod
-    def get(cls, uuid):
+    def get(cls, uuid, server=None):
         """ Retrieve a case from its uuid
 
         :param uuid: uuid of the case to retrieve
         :type uuid: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
         :returns: BonitaCase -- the retrieved case
 
         """
         url = "/queryRuntimeAPI/getProcessInstance/%s" % uuid
 
-        xml = BonitaServer.get_instance().sendRESTRequest(url=url)
+        xml = cls._resolve_server(server).sendRESTRequest(url=url)
 
-        return BonitaCase._instanciate_from_xml(xml)
+        return BonitaCase._instanciate_from_xml(xml, server=server)
+
+    get_async = async_method('get')
 
     @classmethod
-    def get_cases(cls, process_id):
+    def get_cases(cls, process_id, server=None, compact=False):
         """ Retrieve all cases for the processes associated to the given
         process_id
 
+        Cases of the several process versions are retrieved concurrently.
+
         :param process_id: process id
         :type process_id: str
-        :returns: BonitaCase list
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :param compact: retrieve compact, read-only cases (see pybonita.record) ?
+        :type compact: bool (default : False)
+        :returns: BonitaCase list, or CaseRecord list if compact
         """
 
-        processes = BonitaProcess.get_processes(process_id)
+        processes = BonitaProcess.get_processes(process_id, server=server)
 
+        executor = cls._resolve_server(server).executor
         cases = []
-        for process in processes:
-            cases.extend(process.get_cases())
+        for process_cases in executor.map(lambda process: process.get_cases(compact=compact), processes):
+            cases.extend(process_cases)
 
         return cases
 
+    get_cases_async = async_method('get_cases')
+
+    @classmethod
+    def iter_cases(cls, process_id, server=None, compact=False):
+        """ Retrieve all cases for the processes associated to the given
+        process_id one at a time, process version after process version.
+
+        :param process_id: process id
+        :type process_id: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :param compact: retrieve compact, read-only cases (see pybonita.record) ?
+        :type compact: bool (default : False)
+        :returns: generator of BonitaCase, or of CaseRecord if compact
+
+        """
+        for process in BonitaProcess.get_processes(process_id, server=server):
+            for case in process.iter_cases(compact=compact):
+                yield case
+
     @classmethod
-    def _instanciate_from_xml(cls, xml):
+    def _instanciate_from_xml(cls, xml, server=None):
         """ Instanciate a BonitaCase object from its xml definition """
-        soup = BeautifulSoup(xml.encode('iso-8859-1'),'xml')
-        process = BonitaProcess(soup.processinstance.processuuid.text)
-        uuid = soup.processinstance.instanceuuid.text
+        return cls._instanciate_from_node(xml_find(parse_xml(xml), 'processinstance'), server=server)
 
-        case = BonitaCase(process, uuid=uuid)
-        case.refresh(xml)
+    @classmethod
+    def _instanciate_from_node(cls, instance, server=None, lazy=True):
+        """ Instanciate a BonitaCase object from its already parsed processinstance element.
+        Unless lazy is False, the variables are read on first access.
+
+        """
+        fields = cls.MAPPING.read(instance, server=server, eager=not lazy)
+
+        process = BonitaProcess._get_referenced(fields['processuuid'], server=server)
+
+        case = BonitaCase(process, uuid=fields['instanceuuid'])
+        case._refresh_from_fields(instance, fields, lazy)
 
         return case
 
@@ -177,15 +318,19 @@ class BonitaCase(BonitaObject):
         self.uuid = uuid
         self._process = process
         self._variables = variables
+        # A case is bound to the same server handle as its process
+        self._bind_server(getattr(process, '_server', None))
         self._state = None
         self._is_archived = None
         self._started_date = None
 
-    def start(self, user=None):
+    def start(self, user=None, server=None):
         """ Start the case
 
         :param user: case actor used to start the case
         :type user: str
+        :param server: server handle to start the case on (default : the one the case is bound to)
+        :type server: BonitaServer
 
         """
 
@@ -194,13 +339,13 @@ class BonitaCase(BonitaObject):
 
         data = dict()
 
-        if self._variables == None:
+        if self.variables == None:
             url = "/runtimeAPI/instantiateProcess/%s" % self._process.uuid
         else:
             url = "/runtimeAPI/instantiateProcessWithVariables/%s" % self._process.uuid
-            data['variables'] = dictToMapString(self._variables)
+            data['variables'] = dictToMapString(self.variables)
 
-        xml = BonitaServer.get_instance().sendRESTRequest(url=url, user=user, data=data)
+        xml = self._get_server(server).sendRESTRequest(url=url, user=user, data=data)
 
         dom = parseString(xml)
         process_instances = dom.getElementsByTagName("ProcessInstanceUUID")
@@ -216,8 +361,15 @@ class BonitaCase(BonitaObject):
 
         self.refresh()
 
-    def save(self):
-        """ Save case modified variables values """
+    start_async = async_method('start')
+
+    def save(self, server=None):
+        """ Save case modified variables values
+
+        :param server: server handle to use (default : the one the case is bound to)
+        :type server: BonitaServer
+
+        """
 
         if self.state == None:
             raise Exception("The Bonita case is not started")
@@ -229,32 +381,41 @@ class BonitaCase(BonitaObject):
             data["variableId"] = key
             data["variableValue"] = value
 
-            BonitaServer.get_instance().sendRESTRequest(url=url, data=data)
+            self._get_server(server).sendRESTRequest(url=url, data=data)
+
+    save_async = async_method('save')
 
+    def refresh(self, xml=None, server=None):
+        """ Refresh current instance with data from the BonitaServer
 
-    def refresh(self, xml=None):
-        """ Refresh current instance with data from the BonitaServer """
+        :param xml: XML description of the case, retrieved from the server if not given
+        :type xml: unicode
+        :param server: server handle to use (default : the one the case is bound to)
+        :type server: BonitaServer
+
+        """
 
         if xml == None:
             url = "/queryRuntimeAPI/getProcessInstance/%s" % self.uuid
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
+            xml = self._get_server(server).sendRESTRequest(url=url)
 
-        soup = BeautifulSoup(xml.encode('iso-8859-1'),'xml')
+        instance = xml_find(parse_xml(xml), 'processinstance')
+        self._refresh_from_fields(instance, self.MAPPING.read(instance, eager=False), True)
 
-        variables = {}
-        for variable in soup.processinstance.clientvariables.findAll('entry'):
-            strings = variable.findAll('string')
-            if len(strings) == 2:
-                variables[strings[0].text] = strings[1].text
-            else:
-                variables[strings[0].text] = None
+    refresh_async = async_method('refresh')
 
-        self._variables = variables
+    def _refresh_from_fields(self, instance, fields, lazy):
+        """ Refresh current instance from the fields read by MAPPING from its processinstance element """
+        self._state = fields['state']
+        self._is_archived = fields['is_archived']
+        self._started_date = fields['started_date']
+        self._last_update = fields['last_update']
+
+        self._init_lazy_fields(instance, fields, lazy)
 
-        self._state = soup.processinstance.state.text
-        self._is_archived = False if soup.processinstance.isarchived.text == "false" else True
-        self._started_date = datetime.fromtimestamp(float(soup.processinstance.starteddate.text) / 1000.0)
-        self._last_update = datetime.fromtimestamp(float(soup.processinstance.lastupdate.text) / 1000.0)
+    def _set_lazy_fields(self, fields):
+        """ Set the variables read by MAPPING """
+        self._variables = fields['variables']
 
     def add_attachment(self, name, descriptor=None, filename=None, filepath=None, description=None, user=None):
         """ Add an attachment to the current case instance
@@ -302,7 +463,7 @@ class BonitaCase(BonitaObject):
         data['fileName'] = filename
 
         url = "/runtimeAPI/addAttachment/%s/%s" % (self.uuid, name)
-        BonitaServer.get_instance().sendRESTRequest(url=url, data=data, user=user)
+        self._get_server().sendRESTRequest(url=url, data=data, user=user)
 
     # def get_attachment(self, name):
     #
@@ -332,6 +493,7 @@ class BonitaCase(BonitaObject):
     process = property(_get_process, _set_process, None, u"BonitaProcess running the case")
 
     def _get_variables(self):
+        self._load_lazy_fields()
         return self._variables
 
     def _set_variables(self, value):
@@ -339,7 +501,9 @@ class BonitaCase(BonitaObject):
         if value != None and type(value) != dict:
             raise TypeError("variables must be a dictionnary")
 
-        self._variables = variables
+        # The variables read on first access must not override the given ones
+        self._load_lazy_fields()
+        self._variables = value
 
     variables = property(_get_variables, _set_variables, None, u"variables of the case")
 
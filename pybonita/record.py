@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from .mapping import Mapping, Field, EntityField, to_text, to_boolean, to_timestamp, to_dict
+from .object import BonitaObject
+from .utils import tag_matcher, xml_string
+
+__all__ = ['Record', 'RoleRecord', 'GroupRecord', 'MembershipRecord', 'UserRecord',
+           'ProcessRecord', 'CaseRecord']
+
+
+class Record(object):
+    """ Compact, read-only representation of a Bonita entity, for bulk query results.
+
+    A record only holds the values of the fields of its entity, in slots : no
+    per-instance dictionnary, no tracking of modifications, no XML kept to
+    read fields on first access. Records can't be saved, deleted nor
+    refreshed : retrieve the entity itself to do so.
+
+    Subclasses define their fields in __slots__ and the MAPPING reading them,
+    whose attributes are the slots. Records of the entities shared by many
+    others (SHARED) are shared by uuid through the identity map of the
+    server handle, as the entities are.
+
+    """
+
+    __slots__ = ('__weakref__',)
+
+    # Should records be shared by uuid through the identity map of the server handle ?
+    SHARED = False
+
+    def __init__(self, **fields):
+        """ Build up a new Record
+
+        :param fields: value of each slot, missing ones are None
+        :raise TypeError: if a field is not a slot of the record
+
+        """
+        for name in fields:
+            if name not in self.__slots__:
+                raise TypeError(u"%s has no field %s" % (self.__class__.__name__, name))
+
+        for name in self.__slots__:
+            value = fields.get(name)
+            # Lists of entities are kept in (smaller) tuples
+            object.__setattr__(self, name, tuple(value) if isinstance(value, list) else value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(u"%s is read only" % (self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError(u"%s is read only" % (self.__class__.__name__))
+
+    def __str__(self):
+        return "%s %s" % (self.__class__, getattr(self, 'uuid', None))
+
+    @classmethod
+    def _instanciate_from_node(cls, node, server=None):
+        """ Instanciate a record from the already parsed XML element of its entity
+
+        :param node: the element of the entity, as found in a document built by pybonita.parser.parse_xml
+        :type node: lxml.etree._Element or bs4.element.Tag
+        :param server: server handle the entity is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :return: Record
+        :raise lxml.etree.XMLSchemaParseError: given element does not belong to
+            Bonita XML schema for the entity
+
+        """
+        identity_map = BonitaObject._resolve_server(server).identity_map if cls.SHARED else None
+        if identity_map is None:
+            return cls(**cls.MAPPING.read(node, server=server))
+
+        tag = tag_matcher('uuid', recursive=False).find(node, raise_exception=False)
+        record = identity_map.get(cls, xml_string(tag)) if tag is not None else None
+        if record is None:
+            record = identity_map.add(cls(**cls.MAPPING.read(node, server=server)))
+
+        return record
+
+
+class RoleRecord(Record):
+    """ Compact, read-only BonitaRole """
+
+    __slots__ = ('uuid', 'dbid', 'name', 'label', 'description')
+
+    SHARED = True
+
+    MAPPING = Mapping([Field('uuid'), Field('dbid', required=False), Field('name'), Field('label'),
+                       Field('description')])
+
+
+class GroupRecord(Record):
+    """ Compact, read-only BonitaGroup, parent included """
+
+    __slots__ = ('uuid', 'dbid', 'name', 'label', 'description', 'parent')
+
+    SHARED = True
+
+    MAPPING = Mapping([Field('uuid'), Field('dbid', required=False), Field('name'), Field('label'),
+                       Field('description'),
+                       EntityField('parentGroup', lambda: GroupRecord, attribute='parent', required=False)])
+
+
+class MembershipRecord(Record):
+    """ Compact, read-only BonitaMembership """
+
+    __slots__ = ('uuid', 'dbid', 'role', 'group')
+
+    SHARED = True
+
+    MAPPING = Mapping([Field('uuid'), Field('dbid', required=False),
+                       EntityField('role', lambda: RoleRecord), EntityField('group', lambda: GroupRecord)])
+
+
+class UserRecord(Record):
+    """ Compact, read-only BonitaUser. Contact infos are not part of it. """
+
+    __slots__ = ('uuid', 'username', 'password', 'firstName', 'lastName', 'title', 'jobTitle', 'memberships')
+
+    MAPPING = Mapping([Field('uuid'), Field('username'), Field('password'),
+                       Field('firstName', required=False), Field('lastName', required=False),
+                       Field('title', required=False), Field('jobTitle', required=False),
+                       EntityField('memberships/membership', lambda: MembershipRecord, attribute='memberships',
+                                   many=True)])
+
+    def _get_roles(self):
+        """ Unique roles of the memberships
+
+        :return: list(RoleRecord)
+
+        """
+        return list(set(membership.role for membership in self.memberships))
+
+    roles = property(_get_roles, None, None)
+
+    def _get_groups(self):
+        """ Unique groups of the memberships
+
+        :return: list(GroupRecord)
+
+        """
+        return list(set(membership.group for membership in self.memberships))
+
+    groups = property(_get_groups, None, None)
+
+
+class ProcessRecord(Record):
+    """ Compact, read-only BonitaProcess """
+
+    __slots__ = ('uuid', 'name', 'version')
+
+    MAPPING = Mapping([Field('uuid'), Field('name'), Field('version')])
+
+
+class CaseRecord(Record):
+    """ Compact, read-only BonitaCase. Its process is given by its uuid only. """
+
+    __slots__ = ('uuid', 'process_uuid', 'variables', 'state', 'is_archived', 'started_date', 'last_update')
+
+    MAPPING = Mapping([Field('instanceuuid', attribute='uuid', converter=to_text),
+                       Field('processuuid', attribute='process_uuid', converter=to_text),
+                       Field('clientvariables', attribute='variables', converter=to_dict),
+                       Field('state', converter=to_text),
+                       Field('isarchived', attribute='is_archived', converter=to_boolean),
+                       Field('starteddate', attribute='started_date', converter=to_timestamp),
+                       Field('lastupdate', attribute='last_update', converter=to_timestamp)])
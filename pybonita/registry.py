@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from .cache import TTLCache
+
+__all__ = ['ProcessRegistry', 'build_registry']
+
+
+class ProcessRegistry(object):
+    """ Share a single BonitaProcess for each process definition retrieved
+    through a server handle, by uuid and by (name, version).
+
+    A deployed process definition never changes for a given version : once
+    registered, a definition is kept and reused as is, without reaching the
+    Bonita server again. The cases hydrated from the same process all share
+    its registered object.
+
+    The versions of a process id (see BonitaProcess.get_processes) are kept
+    for versions_ttl seconds only, so that newly deployed versions are seen.
+
+    Cases may reference a process not retrieved yet : it is registered with
+    its uuid only, and completed with its name and version once its
+    definition is retrieved.
+
+    """
+
+    # Default seconds the versions of a process id are kept
+    DEFAULT_VERSIONS_TTL = 60.0
+
+    def __init__(self, versions_ttl=None, max_size=None):
+        """ Build up a new ProcessRegistry
+
+        :param versions_ttl: seconds the versions of a process id are kept (default : DEFAULT_VERSIONS_TTL)
+        :type versions_ttl: float
+        :param max_size: number of process ids whose versions are kept (default : TTLCache.DEFAULT_MAX_SIZE)
+        :type max_size: int
+        :raise ValueError: if versions_ttl or max_size is not positive
+
+        """
+        self.versions_ttl = versions_ttl if versions_ttl is not None else ProcessRegistry.DEFAULT_VERSIONS_TTL
+        # uuid -> BonitaProcess, for the retrieved definitions
+        self._processes = {}
+        # (name, version) -> BonitaProcess
+        self._by_name = {}
+        # uuid -> BonitaProcess, for the processes only known by the uuid of their cases
+        self._stubs = {}
+        # process id -> list of BonitaProcess
+        self._versions = TTLCache(max_size, self.versions_ttl)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._processes)
+
+    def get(self, uuid):
+        """ Return the registered definition of the process with the uuid, or None if not retrieved yet
+
+        :param uuid: uuid of the process
+        :type uuid: unicode
+        :return: BonitaProcess or None
+
+        """
+        with self._lock:
+            return self._processes.get(uuid)
+
+    def get_by_name(self, name, version):
+        """ Return the registered definition of the process with the name and version, or None if not retrieved yet
+
+        :param name: name of the process
+        :type name: unicode
+        :param version: version of the process
+        :type version: unicode
+        :return: BonitaProcess or None
+
+        """
+        with self._lock:
+            return self._by_name.get((name, version))
+
+    def add(self, process):
+        """ Register the definition of a process.
+        If a definition with the same uuid is already registered, it is kept
+        and returned instead : always use the returned process.
+
+        :param process: the retrieved process, processes without uuid are not registered
+        :type process: BonitaProcess
+        :return: BonitaProcess -- the registered process
+
+        """
+        if process.uuid is None:
+            return process
+
+        with self._lock:
+            registered = self._processes.get(process.uuid)
+            if registered is not None:
+                return registered
+
+            registered = self._stubs.pop(process.uuid, None)
+            if registered is not None:
+                registered._set_definition(process)
+            else:
+                registered = process
+
+            self._processes[registered.uuid] = registered
+            self._by_name[(registered.name, registered.version)] = registered
+
+        return registered
+
+    def get_or_build(self, uuid, build):
+        """ Return the process with the uuid, registered or only referenced by cases,
+        or register the process built by build if none.
+
+        :param uuid: uuid of the process
+        :type uuid: unicode
+        :param build: function building the process from its uuid only
+        :type build: function
+        :return: BonitaProcess
+
+        """
+        with self._lock:
+            process = self._processes.get(uuid) or self._stubs.get(uuid)
+            if process is None:
+                process = self._stubs[uuid] = build()
+
+        return process
+
+    def get_processes(self, process_id, load):
+        """ Return the versions of a process id, or load and register them
+
+        :param process_id: process id
+        :type process_id: unicode
+        :param load: function retrieving the BonitaProcess list of the process id from the Bonita server
+        :type load: function
+        :return: BonitaProcess list
+
+        """
+        processes = self._versions.get(process_id)
+        if processes is None:
+            processes = [self.add(process) for process in load()]
+            self._versions.put(process_id, processes)
+
+        return list(processes)
+
+    def clear(self):
+        """ Forget all the registered processes """
+        with self._lock:
+            self._processes.clear()
+            self._by_name.clear()
+            self._stubs.clear()
+        self._versions.clear()
+
+
+def build_registry(process_registry):
+    """ Build the ProcessRegistry of a server handle
+
+    :param process_registry: True for the default ProcessRegistry, a ProcessRegistry, or False for no registry
+    :type process_registry: bool or ProcessRegistry
+    :return: ProcessRegistry or None
+    :raise TypeError: if process_registry is of none of these types
+
+    """
+    if process_registry is None or process_registry is False:
+        return None
+    if process_registry is True:
+        return ProcessRegistry()
+    if isinstance(process_registry, ProcessRegistry):
+        return process_registry
+
+    raise TypeError(u"process_registry must be a bool or a ProcessRegistry")
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+
+__all__ = ['RetryPolicy', 'RetryBudget', 'is_idempotent']
+
+# REST API methods which only read data, and so can safely be sent again
+IDEMPOTENT_URL_PREFIXES = ('/queryRuntimeAPI/', '/queryDefinitionAPI/', '/identityAPI/get')
+
+
+def is_idempotent(url):
+    """ Is the REST API method at url a read only one, which can be sent again ? """
+    return url.startswith(IDEMPOTENT_URL_PREFIXES)
+
+
+class RetryBudget(object):
+    """ Bound the number of retries to a share of the requests sent.
+
+    Each request sent deposits ratio token in the budget, each retry withdraws
+    one. The budget is also refilled with min_per_second tokens per second, so
+    that a low traffic can still be retried. When the Bonita server is down,
+    retries quickly drain the budget and requests fail at once instead of
+    multiplying the load on the server.
+
+    """
+
+    DEFAULT_RATIO = 0.2
+    DEFAULT_MIN_PER_SECOND = 1.0
+    DEFAULT_MAX_TOKENS = 10.0
+
+    def __init__(self, ratio=None, min_per_second=None, max_tokens=None):
+        """ Build up a new RetryBudget
+
+        :param ratio: share of the requests which can be retried (default : DEFAULT_RATIO)
+        :type ratio: float
+        :param min_per_second: retries allowed per second whatever the traffic (default : DEFAULT_MIN_PER_SECOND)
+        :type min_per_second: float
+        :param max_tokens: maximum number of retries kept in reserve (default : DEFAULT_MAX_TOKENS)
+        :type max_tokens: float
+
+        """
+        self.ratio = ratio if ratio is not None else self.DEFAULT_RATIO
+        self.min_per_second = min_per_second if min_per_second is not None else self.DEFAULT_MIN_PER_SECOND
+        self.max_tokens = max_tokens if max_tokens is not None else self.DEFAULT_MAX_TOKENS
+        self.tokens = self.max_tokens
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._last_refill) * self.min_per_second)
+        self._last_refill = now
+
+    def deposit(self):
+        """ Record a request sent """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """ Try to spend a retry
+
+        :return: bool -- True if the retry is allowed
+
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class RetryPolicy(object):
+    """ Retry idempotent requests which failed to reach the Bonita server.
+
+    Retries are delayed with an exponential backoff and full jitter : the n-th
+    retry waits a random time between 0 and min(backoff_max, backoff_base * 2 ** n)
+    seconds. They are bounded by max_retries for each request, and by the
+    RetryBudget shared by all the requests.
+
+    """
+
+    DEFAULT_MAX_RETRIES = 3
+    DEFAULT_BACKOFF_BASE = 0.1
+    DEFAULT_BACKOFF_MAX = 5.0
+
+    def __init__(self, max_retries=None, backoff_base=None, backoff_max=None, budget=None):
+        """ Build up a new RetryPolicy
+
+        :param max_retries: maximum number of retries of a request (default : DEFAULT_MAX_RETRIES)
+        :type max_retries: int
+        :param backoff_base: delay of the first retry, in seconds (default : DEFAULT_BACKOFF_BASE)
+        :type backoff_base: float
+        :param backoff_max: maximum delay of a retry, in seconds (default : DEFAULT_BACKOFF_MAX)
+        :type backoff_max: float
+        :param budget: budget shared by all the requests (default : a new RetryBudget)
+        :type budget: RetryBudget
+
+        """
+        self.max_retries = max_retries if max_retries is not None else self.DEFAULT_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else self.DEFAULT_BACKOFF_BASE
+        self.backoff_max = backoff_max if backoff_max is not None else self.DEFAULT_BACKOFF_MAX
+        self.budget = budget if budget is not None else RetryBudget()
+        self._sleep = time.sleep
+        self._random = random.uniform
+
+    def should_retry(self, url, retries):
+        """ Can a failed request be sent again ?
+
+        :param url: URL of the REST API method
+        :type url: str
+        :param retries: number of retries already done for this request
+        :type retries: int
+        :return: bool
+
+        """
+        if not is_idempotent(url) or retries >= self.max_retries:
+            return False
+
+        return self.budget.withdraw()
+
+    def backoff(self, retries):
+        """ Wait before the next retry
+
+        :param retries: number of retries already done for this request
+        :type retries: int
+
+        """
+        delay = self._random(0, min(self.backoff_max, self.backoff_base * (2 ** retries)))
+        self._sleep(delay)
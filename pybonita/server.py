@@ -1,16 +1,156 @@
 # -*- coding: utf-8 -*-
-from bs4 import BeautifulSoup, UnicodeDammit
+import codecs
+import re
+import threading
+import time
+
+from bs4 import UnicodeDammit
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from requests.exceptions import ConnectionError, Timeout, HTTPError
 
 from pybonita import logger
+from .balancer import build_balancer, parse_endpoints
+from .breaker import CircuitBreaker
+from .cache import build_cache
+from .coalescer import SingleFlight
+from .executor import BonitaExecutor
+from .identity import IdentityMap
+from .parser import parse_error_body
+from .registry import build_registry
+from .retry import RetryPolicy, is_idempotent
+from .throttle import Throttle, UNLIMITED, api_family
 from .exception import BonitaServerNotInitializedError,ServerNotReachableError,\
-    UnexpectedResponseError, BonitaHTTPError
+    UnexpectedResponseError, CircuitOpenError, build_http_error
 
 __all__ = ['BonitaServer']
 
+# Encoding declared by the XML declaration of a document
+_XML_DECLARED_ENCODING = re.compile(r'^\s*<\?xml[^>]*\sencoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+# Charsets whose strict decoding fails on a body encoded with another one
+_STRICT_ENCODINGS = ['ascii', 'utf-8']
+
+
+def _codec_name(name):
+    """ Normalized name of a charset, or None if None or unknown """
+    try:
+        return codecs.lookup(name).name if name is not None else None
+    except LookupError:
+        return None
+
+
+def _declared_encoding(content):
+    """ Charset stated by the XML declaration starting content, or None """
+    declared = _XML_DECLARED_ENCODING.match(content)
+    return declared.group(1) if declared is not None else None
+
+
+def _is_trusted(encoding, declared, charsets):
+    """ Can the charset a response body was decoded with be kept on its endpoint ?
+
+    Nearly any body decodes as Windows-1252 or ISO-8859-1 : kept on the
+    endpoint, a charset reached by guessing would never be found wrong again.
+    Only the charsets of the server handle, the one the XML declaration
+    states and the strict ones are kept.
+
+    """
+    trusted = [_codec_name(name) for name in list(charsets) + [declared] + _STRICT_ENCODINGS]
+    return encoding is not None and _codec_name(encoding) in trusted
+
+
+class _DecodedStream(object):
+    """ File-like object reading a streamed response body, decoded as _decode
+    does, and handing it to the parser UTF-8 encoded (see the encoding attribute).
+
+    The body is decoded chunk by chunk with the charset kept on the endpoint,
+    else the charsets of the server handle, the charset the XML declaration
+    states, UTF-8 and finally Windows-1252 / ISO-8859-1. The next charset is
+    tried from the chunk failing to decode : an ASCII start of the body is
+    read the same in all of them. The chunks already handed to the parser
+    are not decoded again though : a body whose non-ASCII characters
+    precede the failing chunk ends up read with two charsets.
+
+    The charset the body was read with is kept on the endpoint once the body
+    is consumed, unless it was reached by falling back to a single-byte
+    charset (see _is_trusted).
+
+    """
+
+    # Encoding of the bytes given to the parser
+    encoding = 'utf-8'
+
+    # Bytes read from the response at once
+    CHUNK_SIZE = 65536
+
+    def __init__(self, raw, endpoint, charsets):
+        self._raw = raw
+        self._endpoint = endpoint
+        self._charsets = list(charsets)
+        self._encodings = None
+        self._declared = None
+        # Charset the body is being decoded with
+        self.current_encoding = None
+        self._decoder = None
+        self._buffer = ''
+        self._done = False
+
+    def _start(self, chunk):
+        """ List the charsets to try, the declared one being read from the first chunk """
+        self._declared = _declared_encoding(chunk)
+        names = [self._endpoint.encoding] + self._charsets + [self._declared, 'utf-8', 'windows-1252', 'iso-8859-1']
+
+        self._encodings = []
+        for name in names:
+            name = _codec_name(name)
+            if name is not None and name not in self._encodings:
+                self._encodings.append(name)
+
+        self._next_decoder()
+
+    def _next_decoder(self):
+        self.current_encoding = self._encodings.pop(0)
+        self._decoder = codecs.getincrementaldecoder(self.current_encoding)()
+
+    def _decode(self, chunk, final=False):
+        if self._decoder is None:
+            self._start(chunk)
+
+        while True:
+            try:
+                return self._decoder.decode(chunk, final)
+            except UnicodeDecodeError:
+                if len(self._encodings) == 0:
+                    raise
+                logger.info("streamed response of %s is not %s encoded" % (self._endpoint, self.current_encoding))
+                # Bytes of an incomplete character kept by the failing decoder
+                chunk = self._decoder.getstate()[0] + chunk
+                self._next_decoder()
+
+    def read(self, size=-1):
+        while not self._done and (size < 0 or len(self._buffer) < size):
+            chunk = self._raw.read(self.CHUNK_SIZE)
+            if not chunk:
+                self._done = True
+                chunk = self._decode('', final=True)
+                if self._decoder is not None and _is_trusted(self.current_encoding, self._declared, self._charsets):
+                    self._endpoint.encoding = self.current_encoding
+            else:
+                chunk = self._decode(chunk)
+            self._buffer += chunk.encode('utf-8')
+
+        if size < 0 or size >= len(self._buffer):
+            (data, self._buffer) = (self._buffer, '')
+        else:
+            (data, self._buffer) = (self._buffer[:size], self._buffer[size:])
+
+        return data
+
+    def close(self):
+        self._raw.close()
+
 
 class _MetaBonitaServer(type):
 
@@ -28,10 +168,35 @@ class BonitaServer:
     To get the unique BonitaServer instance please use the static get_instance
     method.
 
+    Independent server handles, to talk to several Bonita servers from the
+    same process, can be built with the static create method.
+
+    Server handles are thread-safe : once configured, a handle can be shared
+    by all the threads of a process. The singleton is lazily created under a
+    lock, the data given to sendRESTRequest is never modified, and the HTTP
+    session is either shared by all threads (session_scope='shared', the
+    connexion pool is thread-safe) or built for each thread
+    (session_scope='thread').
+
     """
 
     __metaclass__ = _MetaBonitaServer
 
+    # Default number of per-host connection pools kept by the HTTP session
+    DEFAULT_POOL_CONNECTIONS = 10
+    # Default number of keep-alive connections kept in each per-host pool
+    DEFAULT_POOL_MAXSIZE = 10
+    # Available HTTP session scopes
+    SESSION_SCOPES = ['shared', 'thread']
+    # Default seconds to wait for a connexion to the Bonita server
+    DEFAULT_CONNECT_TIMEOUT = 10.0
+    # Default seconds to wait for the Bonita server to answer
+    DEFAULT_READ_TIMEOUT = 60.0
+    # HTTP status codes of a gateway unable to reach the Bonita server
+    UNREACHABLE_STATUS_CODES = [502, 503, 504]
+
+    _instance_lock = threading.Lock()
+
     class _BonitaServerImpl(object):
 
         def __init__(self):
@@ -41,9 +206,358 @@ class BonitaServer:
             self._login = None
             self._password = None
             self._charsets= []
+            self._session = None
+            self._session_options = {}
+            self._session_scope = 'shared'
+            self._thread_sessions = []
+            self._local = threading.local()
+            self._lock = threading.RLock()
+            self._balancer = None
+            self._executor = None
+            self.connect_timeout = BonitaServer.DEFAULT_CONNECT_TIMEOUT
+            self.read_timeout = BonitaServer.DEFAULT_READ_TIMEOUT
+            self.retry_policy = RetryPolicy()
+            self.coalesce_reads = True
+            self._single_flight = SingleFlight()
+            self._api_throttles = {}
+            self.identity_map = IdentityMap()
+            self.cache = None
+            self.process_registry = build_registry(True)
             self._ready = False
 
-        def sendRESTRequest(self, url, user=None, data=dict()):
+        def _setup_session(self, pool_connections=None, pool_maxsize=None, pool_block=False,
+                           session_scope='shared'):
+            """ Setup the long-lived HTTP sessions used to reach the Bonita server
+
+            A session keeps connections alive between requests and holds the
+            credentials, so they are not rebuilt on each call.
+            Any previously built session is closed.
+
+            :param pool_connections: number of per-host connection pools to cache
+            :type pool_connections: int
+            :param pool_maxsize: maximum number of connections kept in each per-host pool
+            :type pool_maxsize: int
+            :param pool_block: should a request wait for a free connection when the pool is full ?
+            :type pool_block: bool (default : False)
+            :param session_scope: 'shared' to use one session for all threads,
+                'thread' to build a session for each thread (default : 'shared')
+            :type session_scope: str
+            :raise ValueError: if the session scope is unknown
+
+            """
+            if pool_connections is None:
+                pool_connections = BonitaServer.DEFAULT_POOL_CONNECTIONS
+            if pool_maxsize is None:
+                pool_maxsize = BonitaServer.DEFAULT_POOL_MAXSIZE
+
+            if type(pool_connections) != int or pool_connections < 1:
+                raise TypeError(u"pool_connections must be a positive integer")
+            if type(pool_maxsize) != int or pool_maxsize < 1:
+                raise TypeError(u"pool_maxsize must be a positive integer")
+            if session_scope not in BonitaServer.SESSION_SCOPES:
+                raise ValueError(u"session_scope must be one of %s" % BonitaServer.SESSION_SCOPES)
+
+            with self._lock:
+                self.close()
+
+                self._session_options = {'pool_connections': pool_connections,
+                                         'pool_maxsize': pool_maxsize,
+                                         'pool_block': pool_block}
+                self._session_scope = session_scope
+
+                if session_scope == 'shared':
+                    self._session = self._build_session()
+
+        def _build_session(self):
+            """ Build a new HTTP session with the current credentials and pool options """
+            session = requests.Session()
+            session.auth = HTTPBasicAuth(self.login, self.password)
+            # Large XML responses are much smaller once compressed
+            session.headers.update({'content-type': 'application/x-www-form-urlencoded',
+                                    'accept-encoding': 'gzip, deflate'})
+
+            adapter = HTTPAdapter(pool_connections=self._session_options.get('pool_connections', BonitaServer.DEFAULT_POOL_CONNECTIONS),
+                                  pool_maxsize=self._session_options.get('pool_maxsize', BonitaServer.DEFAULT_POOL_MAXSIZE),
+                                  pool_block=self._session_options.get('pool_block', False))
+            session.mount('http://', adapter)
+
+            return session
+
+        def _get_session(self):
+            """ Return the HTTP session the current thread must use, building it if needed """
+            if self._session_scope == 'thread':
+                session = getattr(self._local, 'session', None)
+                if session is None:
+                    session = self._build_session()
+                    self._local.session = session
+                    with self._lock:
+                        self._thread_sessions.append(session)
+                return session
+
+            if self._session is None:
+                with self._lock:
+                    if self._session is None:
+                        self._session = self._build_session()
+
+            return self._session
+
+        def configure(self, host, port, login, password, charsets=None, pool_connections=None,
+                      pool_maxsize=None, pool_block=False, session_scope='shared',
+                      balancing='round_robin', max_failures=None, ejection_time=None,
+                      async_workers=None, connect_timeout=None, read_timeout=None,
+                      retry_policy=None, circuit_breaker=None, on_breaker_state_change=None,
+                      coalesce_reads=True, endpoint_limits=None, api_limits=None, identity_map=True,
+                      cache=None, process_registry=True):
+            """ Set the connexion params of this server handle
+
+            Requests are sent through a persistent HTTP session : connections are
+            kept alive and reused by subsequent calls.
+
+            Several Bonita REST API nodes can be given as a list of hosts. Requests
+            are then spread across them with the balancing policy, and nodes failing
+            to answer are ejected for a while.
+
+            :param host: Bonita REST API server host, or list of hosts. Each host
+                of the list can be a str, a "host:port" str or a (host, port) tuple
+            :type host: str or list
+            :param port: Bonita REST API server port, used for hosts given without port
+            :type port: int
+            :param login: Bonita REST request credential login
+            :type login: str
+            :param password: Bonita REST request credential password
+            :type password: str
+            :param charsets: List of charsets the Bonita Server could use to encode (to unicode)
+            :type charsets: list of str
+            :param pool_connections: number of per-host connection pools to cache (default : DEFAULT_POOL_CONNECTIONS)
+            :type pool_connections: int
+            :param pool_maxsize: maximum number of connections kept alive for each host (default : DEFAULT_POOL_MAXSIZE)
+            :type pool_maxsize: int
+            :param pool_block: should a request wait for a free connection when the pool of a host is full ? (default : False)
+            :type pool_block: bool
+            :param session_scope: 'shared' to use one HTTP session for all threads,
+                'thread' to build a session for each thread (default : 'shared')
+            :type session_scope: str
+            :param balancing: policy to spread requests across hosts : 'round_robin',
+                'least_outstanding' or 'latency_weighted' (default : 'round_robin')
+            :type balancing: str
+            :param max_failures: consecutive failures before ejecting a host (default : Balancer.DEFAULT_MAX_FAILURES)
+            :type max_failures: int
+            :param ejection_time: seconds an ejected host stays out of the balancing (default : Balancer.DEFAULT_EJECTION_TIME)
+            :type ejection_time: float
+            :param async_workers: number of threads running the asynchronous calls (default : BonitaExecutor.DEFAULT_WORKERS)
+            :type async_workers: int
+            :param connect_timeout: seconds to wait for a connexion to the server (default : DEFAULT_CONNECT_TIMEOUT)
+            :type connect_timeout: float
+            :param read_timeout: seconds to wait for the server to answer (default : DEFAULT_READ_TIMEOUT)
+            :type read_timeout: float
+            :param retry_policy: how read only requests failing to reach the server are retried (default : RetryPolicy())
+            :type retry_policy: pybonita.retry.RetryPolicy
+            :param circuit_breaker: params of the circuit breaker of each host, as
+                accepted by pybonita.breaker.CircuitBreaker (default : CircuitBreaker defaults)
+            :type circuit_breaker: dict
+            :param on_breaker_state_change: function called on each circuit breaker
+                transition, as on_breaker_state_change(breaker, old_state, new_state)
+            :type on_breaker_state_change: function
+            :param coalesce_reads: should identical read only requests sent concurrently
+                share a single HTTP request ? (default : True)
+            :type coalesce_reads: bool
+            :param endpoint_limits: limits of the requests sent to each host, as accepted by
+                pybonita.throttle.Throttle : rate, burst and max_concurrency (default : unlimited)
+            :type endpoint_limits: dict
+            :param api_limits: limits of the requests sent to each REST API, by API name,
+                for example {'identityAPI': {'rate': 20, 'max_concurrency': 4}} (default : unlimited)
+            :type api_limits: dict
+            :param identity_map: should the entities retrieved through this handle be shared
+                by uuid (see pybonita.identity.IdentityMap) ? (default : True)
+            :type identity_map: bool
+            :param cache: read-through cache of the lookups of roles, groups, memberships and users :
+                True for the default pybonita.cache.LookupCache, params of its regions
+                (for example {'role': {'ttl': 3600}}), a LookupCache, or None (default : no cache)
+            :type cache: bool, dict or pybonita.cache.LookupCache
+            :param process_registry: should the process definitions retrieved through this handle be
+                kept and shared by every case of the process (see pybonita.registry.ProcessRegistry) ?
+                True for the default ProcessRegistry, a ProcessRegistry, or False (default : True)
+            :type process_registry: bool or pybonita.registry.ProcessRegistry
+            :raise ValueError: if the balancing policy or the session scope is unknown
+
+            """
+            endpoints = parse_endpoints(host, port)
+
+            self.host = endpoints[0].host
+            self.port = endpoints[0].port
+            self.login = login
+            self.password = password
+            self.charsets = list(charsets) if charsets is not None else []
+            self.connect_timeout = connect_timeout if connect_timeout is not None else BonitaServer.DEFAULT_CONNECT_TIMEOUT
+            self.read_timeout = read_timeout if read_timeout is not None else BonitaServer.DEFAULT_READ_TIMEOUT
+            self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+            self.coalesce_reads = coalesce_reads
+            # Entities of the previous server must not be shared with the new one
+            self.identity_map = IdentityMap() if identity_map else None
+            self.cache = build_cache(cache)
+            self.process_registry = build_registry(process_registry)
+
+            # Keep one connection pool for each host
+            if pool_connections is None:
+                pool_connections = max(BonitaServer.DEFAULT_POOL_CONNECTIONS, len(endpoints))
+
+            for endpoint in endpoints:
+                endpoint.breaker = CircuitBreaker(str(endpoint), **(circuit_breaker or {}))
+                if endpoint_limits:
+                    endpoint.throttle = Throttle(**endpoint_limits)
+
+            self._api_throttles = dict((api, Throttle(**limits)) for (api, limits) in (api_limits or {}).items())
+
+            self._balancer = build_balancer(endpoints, balancing, max_failures, ejection_time)
+
+            if on_breaker_state_change is not None:
+                self.add_breaker_listener(on_breaker_state_change)
+            self._setup_session(pool_connections, pool_maxsize, pool_block, session_scope)
+
+            if self._executor is not None:
+                self._executor.close()
+            self._executor = BonitaExecutor(async_workers)
+            self._ready = True
+
+        def _get_balancer(self):
+            """ Return the balancer spreading requests across the Bonita REST API nodes.
+            If no list of hosts has been configured, the requests all go to host:port.
+
+            """
+            if self._balancer is None:
+                with self._lock:
+                    if self._balancer is None:
+                        self._balancer = build_balancer(parse_endpoints(self.host, self.port))
+
+            return self._balancer
+
+        def close(self):
+            """ Close the HTTP sessions and all their pooled connections """
+            with self._lock:
+                if self._session is not None:
+                    self._session.close()
+                    self._session = None
+
+                for session in self._thread_sessions:
+                    session.close()
+                self._thread_sessions = []
+                self._local = threading.local()
+
+        def add_breaker_listener(self, listener):
+            """ Add a function called on each transition of the circuit breaker of any host,
+            as listener(breaker, old_state, new_state)
+
+            """
+            for endpoint in self._get_balancer().endpoints:
+                endpoint.breaker.add_listener(listener)
+
+        def _get_executor(self):
+            if self._executor is None:
+                with self._lock:
+                    if self._executor is None:
+                        self._executor = BonitaExecutor()
+
+            return self._executor
+
+        executor = property(_get_executor, None, None, u"BonitaExecutor running the asynchronous calls")
+
+        def sendRESTRequestAsync(self, url, user=None, data=None, timeout=None):
+            """ Send a REST request without waiting for the response
+
+            :return: result of the request, to be retrieved with its get method
+            :rtype: multiprocessing.pool.AsyncResult
+
+            """
+            return self.executor.submit(self.sendRESTRequest, url=url, user=user, data=data, timeout=timeout)
+
+        def _get_timeout(self, timeout=None):
+            """ Return the (connect, read) timeout of a request, defaulting to the server ones """
+            if timeout is None:
+                return (self.connect_timeout, self.read_timeout)
+
+            return timeout
+
+        def _send(self, session, url, data, timeout, stream=False):
+            """ Send a request once, to the endpoint selected by the balancer.
+            When the circuit breaker of the selected endpoint refuses the request,
+            for example a half open one whose probes are all in flight, another
+            endpoint is selected.
+
+            :return: tuple -- the BonitaEndpoint the request was sent to and the requests.Response
+            :raise CircuitOpenError: if the circuit breakers of all the endpoints refuse the request
+            :raise ServerNotReachableError: if the endpoint can't be reached in time
+
+            """
+            balancer = self._get_balancer()
+            refused = []
+            while True:
+                endpoint = balancer.select(exclude=refused)
+                if endpoint is None:
+                    raise CircuitOpenError(", ".join(str(endpoint) for endpoint in refused))
+                if endpoint.breaker.allow_request():
+                    break
+                refused.append(endpoint)
+
+            full_url = endpoint.base_url + url
+
+            balancer.acquire(endpoint)
+            start = None
+            answered = False
+            try:
+                try:
+                    # Wait for the limits of the REST API, then of the endpoint, always in this order
+                    with self._api_throttles.get(api_family(url), UNLIMITED), endpoint.throttle:
+                        start = time.time()
+                        response = session.post(full_url, data=data, timeout=timeout, stream=stream)
+                    answered = True
+                except (ConnectionError, Timeout) as exc:
+                    raise ServerNotReachableError(u"%s : %s" % (endpoint, exc))
+                except HTTPError:
+                    raise UnexpectedResponseError
+            finally:
+                latency = time.time() - start if start is not None else 0.0
+                balancer.release(endpoint, latency, answered)
+
+                if answered and response.status_code not in BonitaServer.UNREACHABLE_STATUS_CODES:
+                    endpoint.breaker.record_success()
+                else:
+                    endpoint.breaker.record_failure()
+
+            return (endpoint, response)
+
+        def sendRESTRequest(self, url, user=None, data=None, timeout=None, stream=False):
+            """ Send a REST request to the Bonita server
+
+            This method is thread-safe, the given data is never modified.
+
+            Read only requests (see pybonita.retry.is_idempotent) failing to
+            reach the server are retried according to the retry policy.
+
+            Identical read only requests (same url, data and user) sent while one
+            of them is in flight are not sent again : they wait for the request
+            in flight and share its response (see coalesce_reads).
+
+            In stream mode, the response body is not read : a file-like object
+            is returned instead, from which the parser reads the body incrementally,
+            uncompressed and UTF-8 encoded (as stated by its encoding attribute). It must be read to the end or closed
+            to give the connexion back to the pool. Streamed requests are never
+            coalesced.
+
+            :param url: URL of the REST API method, relative to the API root
+            :type url: str
+            :param user: Bonita user the request is sent on behalf of (default : john)
+            :type user: str
+            :param data: params of the request
+            :type data: dict
+            :param timeout: seconds to wait for the server, or a (connect, read) tuple
+                (default : (connect_timeout, read_timeout))
+            :type timeout: float or tuple
+            :param stream: return the body as a stream of bytes (default : False)
+            :type stream: bool
+            :return: unicode -- the response body, or a file-like object in stream mode
+            :raise ServerNotReachableError: if the server can't be reached in time
+
+            """
 
             if self._ready == False:
                 raise BonitaServerNotInitializedError
@@ -54,18 +568,46 @@ class BonitaServer:
                 data = dict()
             elif type(data) != dict:
                 raise TypeError
+            else:
+                # Work on a copy : the caller's dict may be shared with other threads
+                data = dict(data)
 
             data['options'] = u"user:%s" % user
 
-            headers = {'content-type': 'application/x-www-form-urlencoded'}
-            full_url = 'http://%s:%s/bonita-server-rest/API%s' % (self.host, self.port, url)
-
-            try:
-                response = requests.post(full_url, data=data, headers=headers, auth=HTTPBasicAuth(self.login, self.password))
-            except ConnectionError, Timeout:
-                raise ServerNotReachableError
-            except HTTPError:
-                raise UnexpectedResponseError
+            if self.coalesce_reads and is_idempotent(url) and not stream:
+                # Data values can be lists, which are not hashable
+                key = (url, repr(sorted(data.items())), timeout)
+                return self._single_flight.do(key, self._request, url, data, timeout)
+
+            return self._request(url, data, timeout, stream)
+
+        def _request(self, url, data, timeout, stream=False):
+            session = self._get_session()
+            timeout = self._get_timeout(timeout)
+            retry_policy = self.retry_policy
+
+            retry_policy.budget.deposit()
+            retries = 0
+            while True:
+                try:
+                    (endpoint, response) = self._send(session, url, data, timeout, stream)
+                except CircuitOpenError:
+                    # Fail fast, the server is known to be failing
+                    raise
+                except ServerNotReachableError:
+                    if not retry_policy.should_retry(url, retries):
+                        raise
+                else:
+                    if response.status_code not in BonitaServer.UNREACHABLE_STATUS_CODES:
+                        break
+                    # Give the connexion of a streamed response back to the pool
+                    response.close()
+                    if not retry_policy.should_retry(url, retries):
+                        raise ServerNotReachableError(u"HTTP %s" % response.status_code)
+
+                logger.info("retrying request to %s" % url)
+                retry_policy.backoff(retries)
+                retries += 1
 
             if response.status_code != requests.codes.ok:
                 # Bonita Server always return a 500 (yes, i'm not joking. What are RFC made for ?!)
@@ -73,24 +615,51 @@ class BonitaServer:
                 # - <errorCode></errorCode> : the real error code, for example 404
                 # - <detailMessage></detailMessage> : message describing the problem
                 if response.status_code == 500:
-                    import re
-                    soup = BeautifulSoup(response.text,'xml')
-                    bonita_exception = soup.find(name=re.compile("exception")).name
-                    message = soup.detailmessage.string if soup.detailmessage is not None else ''
-                    code = int(soup.errorCode.text) if soup.errorCode != None else 500
-                    if code != None or message != None:
-                        raise BonitaHTTPError(bonita_exception=bonita_exception,code=code,message=message)
-                    else:
+                    error = parse_error_body(response.text)
+                    if error is None:
                         raise UnexpectedResponseError
-
-            # Convert response to unicode, using UnicodeDammit
-            # Try to extract content-type from XML
-            # No way ! Bonita does not return even a proper content-type, only text/*
-            # Try to guess what is the charset
-            dammit = UnicodeDammit(response.text,self.charsets)
-            unicode_response = dammit.unicode_markup
-
-            return unicode_response
+                    (bonita_exception, code, message) = error
+                    raise build_http_error(bonita_exception=bonita_exception,code=code,message=message)
+
+            if stream:
+                # Let the parser read the body, uncompressed and decoded on the fly
+                response.raw.decode_content = True
+                return _DecodedStream(response.raw, endpoint, self.charsets)
+
+            return self._decode(endpoint, response.content)
+
+        def _decode(self, endpoint, content):
+            """ Convert a response body to unicode
+
+            Bonita does not return even a proper content-type, only text/*, so the
+            charset of the first response of an endpoint is guessed with UnicodeDammit,
+            trying the charsets of this server handle, the charset the XML
+            declaration states and UTF-8 first. It is then kept on the endpoint and
+            used straight away for the next responses : the guess is only made again
+            if one of them fails to decode. A charset guessed beyond these (such as
+            Windows-1252) is not kept, as nearly no response fails to decode with it.
+
+            :param endpoint: endpoint which sent the response
+            :type endpoint: BonitaEndpoint
+            :param content: response body
+            :type content: str
+            :return: unicode
+
+            """
+            encoding = endpoint.encoding
+            if encoding is not None:
+                try:
+                    return content.decode(encoding)
+                except UnicodeDecodeError:
+                    logger.info("responses of %s are no longer %s encoded" % (endpoint, encoding))
+
+            declared = _declared_encoding(content)
+            dammit = UnicodeDammit(content, self.charsets + [declared, 'utf-8'])
+            if not dammit.contains_replacement_characters and \
+                    _is_trusted(dammit.original_encoding, declared, self.charsets):
+                endpoint.encoding = dammit.original_encoding
+
+            return dammit.unicode_markup
 
         def _get_host(self):
             return self._host
@@ -100,6 +669,7 @@ class BonitaServer:
                 raise TypeError(u"host must be a string")
 
             self._host = value
+            self._balancer = None
 
         host = property(_get_host, _set_host, None, u"Bonita REST API server host")
 
@@ -111,6 +681,7 @@ class BonitaServer:
                 raise TypeError(u"port must be an integer")
 
             self._port = value
+            self._balancer = None
 
         port = property(_get_port, _set_port, None, u"Bonita REST API server port")
 
@@ -149,35 +720,39 @@ class BonitaServer:
         try:
             return cls._instance
         except AttributeError:
-            cls._instance = cls._BonitaServerImpl()
+            with cls._instance_lock:
+                if not hasattr(cls, '_instance'):
+                    cls._instance = cls._BonitaServerImpl()
             return cls._instance
 
     @classmethod
-    def use(cls, host, port, login, password,charsets=[]):
+    def use(cls, host, port, login, password, charsets=None, **options):
         """ Set the connexion params to the BonitaServer
 
-        Returns the unique BonitaServer instance
+        Returns the unique BonitaServer instance, which is the default server
+        handle used by all BonitaObject.
 
-        :param host: Bonita REST API server host
-        :type host: str
-        :param port: Bonita REST API server port
-        :type port: int
-        :param login: Bonita REST request credential login
-        :type login: str
-        :param password: Bonita REST request credential password
-        :type password: str
-        :param charsets: List of charsets the Bonita Server could use to encode (to unicode)
-        :type charsets: list of str
+        See :meth:`_BonitaServerImpl.configure` for the params and options.
 
         """
-
         server = cls.get_instance()
-        server.host = host
-        server.port = port
-        server.login = login
-        server.password = password
-        server.charsets = charsets
-        server._ready = True
+        server.configure(host, port, login, password, charsets, **options)
+
+        return server
+
+    @classmethod
+    def create(cls, host, port, login, password, charsets=None, **options):
+        """ Create a new server handle, independent from the BonitaServer singleton
+
+        Each handle has its own connexion pool and credentials. A handle can be
+        given to BonitaObject methods through their `server` param, objects
+        retrieved with a handle keep using it afterward.
+
+        See :meth:`_BonitaServerImpl.configure` for the params and options.
+
+        """
+        server = cls._BonitaServerImpl()
+        server.configure(host, port, login, password, charsets, **options)
 
         return server
 
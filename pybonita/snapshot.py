@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+import time
+
+from pybonita import logger
+from .identity import IdentityMap
+from .object import BonitaObject
+from .parser import parse_element, iter_children
+from .user import BonitaUser, BonitaGroup, BonitaRole, BonitaMembership
+from .utils import xml_find, xml_find_all, xml_string, xml_tostring
+
+__all__ = ['DirectorySnapshot']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS users (uuid TEXT PRIMARY KEY, username TEXT, xml TEXT);
+CREATE TABLE IF NOT EXISTS groups (uuid TEXT PRIMARY KEY, path TEXT, xml TEXT);
+CREATE TABLE IF NOT EXISTS roles (uuid TEXT PRIMARY KEY, name TEXT, xml TEXT);
+CREATE TABLE IF NOT EXISTS memberships (uuid TEXT PRIMARY KEY, role_uuid TEXT, group_uuid TEXT, xml TEXT);
+CREATE TABLE IF NOT EXISTS user_memberships (user_uuid TEXT, membership_uuid TEXT);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS groups_path ON groups (path);
+CREATE INDEX IF NOT EXISTS roles_name ON roles (name);
+CREATE INDEX IF NOT EXISTS memberships_role_group ON memberships (role_uuid, group_uuid);
+CREATE INDEX IF NOT EXISTS user_memberships_membership ON user_memberships (membership_uuid);
+"""
+
+
+def _group_path(group_tag):
+    """ Path of a group, such as /platform/team, from its XML element and its parentGroup ones """
+    names = []
+    while group_tag is not None:
+        names.insert(0, xml_string(xml_find(group_tag, 'name', recursive=False)))
+        group_tag = xml_find(group_tag, 'parentGroup', raise_exception=False, recursive=False)
+
+    return u'/' + u'/'.join(names)
+
+
+class _SnapshotHandle(object):
+    """ The server handle of a snapshot, with an identity map of its own.
+
+    Entities read from the snapshot may be hours old : sharing them through
+    the identity map of the handle would hand them to its live retrievals
+    too. Everything else is delegated to the handle.
+
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.identity_map = IdentityMap()
+
+    def __getattr__(self, name):
+        return getattr(BonitaObject._resolve_server(self.server), name)
+
+
+class DirectorySnapshot(object):
+    """ Local copy of the Bonita identity directory (users, groups, roles and
+    memberships) kept in a SQLite database.
+
+    The snapshot is taken with refresh, all at once, from the list of all
+    users and their memberships : groups and roles without any member are
+    not part of it. Once taken, the snapshot survives restarts : a service
+    can answer identity queries straight from disk, without reaching the
+    Bonita server, and refresh the snapshot in the background (see start).
+
+    Entities are built from the stored XML as if retrieved from the server
+    handle of the snapshot : they are bound to it, but shared through an
+    identity map of the snapshot, so that the live retrievals through the
+    handle never get them back. The time of the snapshot is given by
+    snapshot_time.
+
+    Example
+.. code ::
+
+    snapshot = DirectorySnapshot('/var/cache/myservice/bonita.db')
+    snapshot.start(interval=3600)
+
+    user = snapshot.get_user(username=u'jdoe')
+    members = snapshot.find_users(group=snapshot.get_group(path=u'/platform/team'))
+
+    """
+
+    # Default seconds between two refreshes of the snapshot in the background
+    DEFAULT_REFRESH_INTERVAL = 3600.0
+
+    def __init__(self, path, server=None):
+        """ Build up a new DirectorySnapshot
+
+        :param path: path of the SQLite database, created if needed
+        :type path: str
+        :param server: server handle the directory is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
+
+        """
+        self.path = path
+        self.server = server
+        # Handle the entities of the snapshot are bound to
+        self._handle = _SnapshotHandle(server)
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        connection = self._get_connection()
+        connection.executescript(_SCHEMA)
+        connection.commit()
+
+    def _get_connection(self):
+        """ Return the SQLite connection of the current thread, opening it if needed """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path)
+            # Let the readers go on while a refresh is written
+            connection.execute('PRAGMA journal_mode=WAL')
+
+        return connection
+
+    def _query(self, sql, params=()):
+        return self._get_connection().execute(sql, params).fetchall()
+
+    def _get_snapshot_time(self):
+        rows = self._query("SELECT value FROM snapshot WHERE key = 'time'")
+        return float(rows[0][0]) if rows else None
+
+    snapshot_time = property(_get_snapshot_time, None, None,
+                             u"Time the snapshot was taken, in seconds since the epoch, or None if never taken")
+
+    def refresh(self):
+        """ Take a new snapshot of the directory from the Bonita server.
+        The previous snapshot is replaced at once when the new one is complete,
+        and kept if the directory can't be retrieved.
+
+        :return: int -- number of users of the snapshot
+
+        """
+        with self._refresh_lock:
+            snapshot_time = time.time()
+            url = "/identityAPI/getUsers"
+            stream = BonitaObject._resolve_server(self.server).sendRESTRequest(url=url, stream=True)
+
+            connection = self._get_connection()
+            users = 0
+            with connection:
+                for table in ['users', 'groups', 'roles', 'memberships', 'user_memberships']:
+                    connection.execute("DELETE FROM %s" % table)
+
+                for user_tag in iter_children(stream, 'user'):
+                    self._write_user(connection, user_tag)
+                    users += 1
+
+                connection.execute("INSERT OR REPLACE INTO snapshot VALUES ('time', ?)", (repr(snapshot_time),))
+
+            return users
+
+    def _write_user(self, connection, user_tag):
+        """ Write a user of the directory, with its memberships, their groups and roles """
+        user_uuid = xml_string(xml_find(user_tag, 'uuid', recursive=False))
+        connection.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?)",
+                           (user_uuid, xml_string(xml_find(user_tag, 'username', recursive=False)),
+                            xml_tostring(user_tag)))
+
+        membership_tags = [membership_tag
+                           for memberships_tag in xml_find_all(user_tag, 'memberships', recursive=False)
+                           for membership_tag in xml_find_all(memberships_tag, 'membership', recursive=False)]
+        for membership_tag in membership_tags:
+            role_tag = xml_find(membership_tag, 'role', recursive=False)
+            group_tag = xml_find(membership_tag, 'group', recursive=False)
+            membership_uuid = xml_string(xml_find(membership_tag, 'uuid', recursive=False))
+            role_uuid = xml_string(xml_find(role_tag, 'uuid', recursive=False))
+
+            connection.execute("INSERT OR REPLACE INTO roles VALUES (?, ?, ?)",
+                               (role_uuid, xml_string(xml_find(role_tag, 'name', recursive=False)),
+                                xml_tostring(role_tag)))
+            connection.execute("INSERT OR REPLACE INTO memberships VALUES (?, ?, ?, ?)",
+                               (membership_uuid, role_uuid, xml_string(xml_find(group_tag, 'uuid', recursive=False)),
+                                xml_tostring(membership_tag)))
+            connection.execute("INSERT INTO user_memberships VALUES (?, ?)", (user_uuid, membership_uuid))
+
+            # The group and its parents
+            while group_tag is not None:
+                connection.execute("INSERT OR REPLACE INTO groups VALUES (?, ?, ?)",
+                                   (xml_string(xml_find(group_tag, 'uuid', recursive=False)),
+                                    _group_path(group_tag), xml_tostring(group_tag)))
+                group_tag = xml_find(group_tag, 'parentGroup', raise_exception=False, recursive=False)
+
+    def _build(self, cls, rows):
+        """ Build the entities of class cls from the XML of the rows """
+        return [cls._instanciate_from_node(parse_element(xml), server=self._handle)
+                for (xml,) in rows]
+
+    def _get(self, cls, table, columns, kwargs):
+        """ Retrieve an entity of class cls by one of the columns of its table
+
+        :raise TypeError: if called with an unknown param
+
+        """
+        for (param, column) in columns:
+            if param in kwargs:
+                entities = self._build(cls, self._query("SELECT xml FROM %s WHERE %s = ?" % (table, column),
+                                                        (kwargs[param],)))
+                return entities[0] if entities else None
+
+        raise TypeError('called get with unknown param : %s' % (kwargs.keys()))
+
+    def get_user(self, **kwargs):
+        """ Retrieve a User of the snapshot by username or uuid
+
+        :raise TypeError: if called with unknown parameter
+        :return: BonitaUser instance or None if not found
+
+        """
+        return self._get(BonitaUser, 'users', [('username', 'username'), ('uuid', 'uuid')], kwargs)
+
+    def get_group(self, **kwargs):
+        """ Retrieve a Group of the snapshot by path (such as /platform/team) or uuid
+
+        :raise TypeError: if called with unknown parameter
+        :return: BonitaGroup instance or None if not found
+
+        """
+        if 'path' in kwargs and not kwargs['path'].startswith('/'):
+            kwargs['path'] = u'/' + kwargs['path']
+
+        return self._get(BonitaGroup, 'groups', [('path', 'path'), ('uuid', 'uuid')], kwargs)
+
+    def get_role(self, **kwargs):
+        """ Retrieve a Role of the snapshot by name or uuid
+
+        :raise TypeError: if called with unknown parameter
+        :return: BonitaRole instance or None if not found
+
+        """
+        return self._get(BonitaRole, 'roles', [('name', 'name'), ('uuid', 'uuid')], kwargs)
+
+    def get_membership(self, **kwargs):
+        """ Retrieve a Membership of the snapshot by uuid, or by role_uuid and group_uuid
+
+        :raise TypeError: if called with unknown parameter
+        :return: BonitaMembership instance or None if not found
+
+        """
+        if 'role_uuid' in kwargs and 'group_uuid' in kwargs:
+            entities = self._build(BonitaMembership,
+                                   self._query("SELECT xml FROM memberships WHERE role_uuid = ? AND group_uuid = ?",
+                                               (kwargs['role_uuid'], kwargs['group_uuid'])))
+            return entities[0] if entities else None
+
+        return self._get(BonitaMembership, 'memberships', [('uuid', 'uuid')], kwargs)
+
+    def find_users(self, role=None, group=None):
+        """ Retrieve the Users of the snapshot, all or those bound to a role and/or a group
+
+        :param role: role the users are bound to
+        :type role: BonitaRole
+        :param group: group the users are bound to
+        :type group: BonitaGroup
+        :return: list of BonitaUser
+
+        """
+        if role is not None and not isinstance(role, BonitaRole):
+            raise TypeError('role must be a BonitaRole instance')
+        if group is not None and not isinstance(group, BonitaGroup):
+            raise TypeError('group must be a BonitaGroup instance')
+
+        if role is None and group is None:
+            return self._build(BonitaUser, self._query("SELECT xml FROM users ORDER BY username"))
+
+        conditions = []
+        params = []
+        if role is not None:
+            conditions.append("memberships.role_uuid = ?")
+            params.append(role.uuid)
+        if group is not None:
+            conditions.append("memberships.group_uuid = ?")
+            params.append(group.uuid)
+
+        sql = "SELECT DISTINCT users.xml, users.username FROM users " \
+              "JOIN user_memberships ON user_memberships.user_uuid = users.uuid " \
+              "JOIN memberships ON memberships.uuid = user_memberships.membership_uuid " \
+              "WHERE %s ORDER BY users.username" % " AND ".join(conditions)
+
+        return self._build(BonitaUser, [(xml,) for (xml, username) in self._query(sql, params)])
+
+    def start(self, interval=None):
+        """ Refresh the snapshot every interval seconds in a background thread.
+        The first refresh is done at once if the snapshot is missing or older
+        than interval. Failed refreshes are logged, and the previous snapshot kept.
+
+        :param interval: seconds between two refreshes (default : DEFAULT_REFRESH_INTERVAL)
+        :type interval: float
+
+        """
+        interval = interval if interval is not None else DirectorySnapshot.DEFAULT_REFRESH_INTERVAL
+        if interval <= 0:
+            raise ValueError(u"interval must be positive")
+
+        self.stop()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='pybonita-snapshot')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, interval):
+        snapshot_time = self.snapshot_time
+        delay = 0.0 if snapshot_time is None else max(0.0, snapshot_time + interval - time.time())
+
+        while not self._stopped.wait(delay):
+            try:
+                self.refresh()
+            except Exception as exc:
+                logger.warning("refresh of the Bonita directory snapshot %s failed : %s" % (self.path, exc))
+            delay = interval
+
+    def stop(self):
+        """ Stop refreshing the snapshot in the background, waiting for the current refresh to end """
+        thread = self._thread
+        if thread is not None:
+            self._stopped.set()
+            thread.join()
+            self._thread = None
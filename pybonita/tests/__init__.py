@@ -1,11 +1,16 @@
 #-*- coding: utf-8 -*-
 from bs4 import BeautifulSoup
+import io
 from unittest import TestCase
 
+from pybonita.server import BonitaServer
+
 __all__ = ['TestWithBonitaServer','TestWithMockedServer',
     'build_dumb_bonita_error_body','build_bonita_user_xml',
     'build_bonita_group_xml','build_bonita_role_xml',
-    'build_bonita_membership_xml','build_xml_set','build_xml_list']
+    'build_bonita_membership_xml','build_membership','build_xml_set','build_xml_list',
+    'build_bonita_process_instance_xml',
+    'FakeResponse','FakeSession','build_configured_server']
 
 
 class TestWithBonitaServer(TestCase):
@@ -33,36 +38,29 @@ class _MetaBonitaMockedServer(type):
         return isinstance(inst, BonitaMockedServerImpl)
 
 
-class BonitaMockedServerImpl(object):
+class BonitaMockedServerImpl(BonitaServer._BonitaServerImpl):
 
     __metaclass__ = _MetaBonitaMockedServer
 
-    def __init__(self):
-        self._user = "john"
-        self._host = None
-        self._port = None
-        self._login = None
-        self._password = None
-        self._ready = False
-
-    def sendRESTRequest(self, url, user=None, data=dict()):
+    def sendRESTRequest(self, url, user=None, data=None, timeout=None, stream=False):
         """ Do not call a BonitaServer, but rather access the reponses list given prior to this method call.
 
         """
-        import re
-        from pybonita.exception import BonitaHTTPError
+        from pybonita.exception import build_http_error
+        from pybonita.parser import parse_error_body
 
         (status, content_type, data) = self.__class__.extract_response(url,'POST')
 
         if int(status)/100 != 2:
-            soup = BeautifulSoup(data,'xml')
-            if soup == None:
-                raise Exception('data : %s[%s] and can\'t build soup with that' % (str(data),type(data)))
-            soup_exception = soup.find(name=re.compile("Exception"))
-            bonita_exception = soup_exception.name if 'name' in dir(soup_exception) else unicode(soup_exception)
-            message = soup.detailmessage.string if soup.detailmessage is not None else ''
-            code = soup.errorCode
-            raise BonitaHTTPError(bonita_exception,code,message)
+            # Decode errors the same way the real server transport does
+            error = parse_error_body(data)
+            if error is None:
+                raise Exception('data : %s[%s] is not a Bonita error body' % (str(data),type(data)))
+            (bonita_exception, code, message) = error
+            raise build_http_error(bonita_exception,code,message)
+
+        if stream:
+            return io.BytesIO(data.encode('utf-8') if isinstance(data, unicode) else data)
 
         return data
 
@@ -251,6 +249,62 @@ def set_response_list(cls,response_list):
         response_list.add_or_augment_response_list(url,method,status,type,message)
 
 
+class FakeResponse(object):
+    """ Minimal stand-in for a requests.Response, used to test the real server transport """
+
+    def __init__(self, status_code=200, text=u''):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = {}
+        self.raw = io.BytesIO(self.content)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(object):
+    """ Stand-in for a requests.Session recording every call made by the server transport.
+
+    Responses are taken from the given list, the last one is replayed when the list is exhausted.
+    An entry of the list can also be an exception instance to raise.
+
+    """
+
+    def __init__(self, responses=None):
+        self.responses = list(responses) if responses is not None else [FakeResponse()]
+        self.calls = []
+        self.closed = False
+
+    def post(self, url, data=None, **kwargs):
+        self.calls.append({'url': url, 'data': data, 'kwargs': kwargs})
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+def build_configured_server(session=None, host='localhost', port=9090):
+    """ Build a ready to use server implementation, not bound to the BonitaServer singleton,
+    which sends its requests through the given (fake) session.
+
+    """
+    server = BonitaServer._BonitaServerImpl()
+    server.host = host
+    server.port = port
+    server.login = 'restuser'
+    server.password = 'restbpm'
+    server.charsets = []
+    server._session = session if session is not None else FakeSession()
+    server._ready = True
+
+    return server
+
+
 from pybonita.user import BonitaGroup, BonitaRole, BonitaMembership
 from pybonita.utils import xml_find
 
@@ -407,6 +461,53 @@ def build_bonita_process_definition_xml(uuid, name=None, version=None, label=Non
 
     return unicode(tag_process)
 
+def build_bonita_process_instance_xml(uuid, process_uuid, variables=None, state=u'STARTED',
+                                      is_archived=False, started_date=u'1361368042546',
+                                      last_update=u'1361368042546'):
+    """ Build XML for a Bonita process instance (a case) information """
+    soup = BeautifulSoup('','xml')
+
+    tag_instance = soup.new_tag('processinstance')
+
+    tag_process_uuid = soup.new_tag('processuuid')
+    tag_value = soup.new_tag('value')
+    tag_value.string = process_uuid
+    tag_process_uuid.append(tag_value)
+
+    tag_instance_uuid = soup.new_tag('instanceuuid')
+    tag_value = soup.new_tag('value')
+    tag_value.string = uuid
+    tag_instance_uuid.append(tag_value)
+
+    tag_variables = soup.new_tag('clientvariables')
+    for (key, value) in (variables or {}).items():
+        tag_entry = soup.new_tag('entry')
+        tag_key = soup.new_tag('string')
+        tag_key.string = key
+        tag_entry.append(tag_key)
+        if value is not None:
+            tag_value = soup.new_tag('string')
+            tag_value.string = value
+            tag_entry.append(tag_value)
+        tag_variables.append(tag_entry)
+
+    tag_state = soup.new_tag('state')
+    tag_state.string = state
+    tag_archived = soup.new_tag('isarchived')
+    tag_archived.string = u'true' if is_archived else u'false'
+    tag_started = soup.new_tag('starteddate')
+    tag_started.string = started_date
+    tag_last_update = soup.new_tag('lastupdate')
+    tag_last_update.string = last_update
+
+    instance_tags = [tag_process_uuid, tag_instance_uuid, tag_variables, tag_state,
+                     tag_archived, tag_started, tag_last_update]
+
+    for tag in instance_tags:
+        tag_instance.append(tag)
+
+    return unicode(tag_instance)
+
 def build_bonita_role_xml(uuid,name,description='',label='',dbid='',with_class=False):
     """ Build XML for a Bonita Role information """
     # Build XML body
@@ -435,6 +536,18 @@ def build_bonita_role_xml(uuid,name,description='',label='',dbid='',with_class=F
 
     return unicode(tag_role)
 
+def build_membership(uuid, role_uuid, group_uuid):
+    """ Build a BonitaMembership, with its role and group, named after their uuid """
+    role = BonitaRole(role_uuid, '', '')
+    role.uuid = role_uuid
+    group = BonitaGroup(group_uuid, '', '')
+    group.uuid = group_uuid
+    membership = BonitaMembership(role, group)
+    membership.uuid = uuid
+
+    return membership
+
+
 def build_bonita_membership_xml(uuid,role,group, dbid=''):
     """ Build XML for a Bonita Membership information """
     # Build XML body
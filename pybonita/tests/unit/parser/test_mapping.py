@@ -0,0 +1,93 @@
+#-*- coding: utf-8 -*-
+from datetime import datetime
+
+from nose.tools import raises
+
+from pybonita.exception import XMLSchemaParseError
+from pybonita.mapping import Mapping, Field, EntityField, to_text, to_boolean, to_timestamp, to_dict
+from pybonita.parser import parse_xml, set_backend
+from pybonita.user import BonitaRole
+from pybonita.utils import xml_find
+from pybonita.tests import TestCase, build_bonita_role_xml
+
+
+XML = u'<entity><uuid>1</uuid><Name>name</Name><uuid>2</uuid><archived>false</archived>' \
+      u'<date>1361368042546</date><roles>%s%s</roles>' \
+      u'<variables><entry><string>a</string><string>1</string></entry><entry><string>b</string></entry></variables>' \
+      u'</entity>' % (build_bonita_role_xml(u'r1', u'role1'), build_bonita_role_xml(u'r2', u'role2'))
+
+
+class TestMapping(TestCase):
+    """ Test the declarative reading of Bonita entities """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def tearDown(self):
+        set_backend('lxml')
+
+    def test_read(self):
+        """ Read fields with converters, paths and nested entities, with both backends """
+        mapping = Mapping([Field('uuid'), Field('name'), Field('archived', converter=to_boolean),
+                           Field('date', converter=to_timestamp), Field('variables', converter=to_dict),
+                           Field('uuid', attribute='uuids', converter=to_text, many=True),
+                           EntityField('roles/role', lambda: BonitaRole, attribute='roles', many=True),
+                           Field('label', required=False)])
+
+        for backend in ['bs4', 'lxml']:
+            set_backend(backend)
+            fields = mapping.read(xml_find(parse_xml(XML), 'entity'))
+
+            assert fields['uuid'] == u'1'
+            assert fields['uuids'] == [u'1', u'2']
+            assert fields['name'] == u'name'
+            assert fields['archived'] is False
+            assert fields['date'] == datetime.fromtimestamp(1361368042.546)
+            assert fields['variables'] == {u'a': u'1', u'b': None}
+            assert [role.name for role in fields['roles']] == [u'role1', u'role2']
+            assert 'label' not in fields
+
+    @raises(XMLSchemaParseError)
+    def test_required(self):
+        """ A required field not found raises an exception """
+        Mapping([Field('uuid'), Field('label')]).read(xml_find(parse_xml(XML), 'entity'))
+
+    def test_children_only(self):
+        """ Fields are only looked for among the children of the element """
+        fields = Mapping([Field('name', required=False)]).read(xml_find(parse_xml(XML), 'roles'))
+
+        assert fields == {}
+
+    def test_lazy(self):
+        """ Lazy fields can be left out, and read later """
+        mapping = Mapping([Field('uuid'), Field('variables', converter=to_dict, lazy=True)])
+        node = xml_find(parse_xml(XML), 'entity')
+
+        assert mapping.read(node, eager=False) == {'uuid': u'1'}
+        assert mapping.read_lazy(node) == {'variables': {u'a': u'1', u'b': None}}
+        assert sorted(mapping.read(node).keys()) == ['uuid', 'variables']
+
+    def test_detach_lazy(self):
+        """ Lazy fields are read from the XML of their own tags only, with both backends """
+        mapping = Mapping([Field('uuid'), Field('variables', converter=to_dict, lazy=True),
+                           EntityField('roles/role', lambda: BonitaRole, attribute='roles', many=True, lazy=True)])
+
+        for backend in ('lxml', 'bs4'):
+            set_backend(backend)
+            xml = mapping.detach_lazy(xml_find(parse_xml(XML), 'entity'))
+            fields = mapping.read_lazy(xml)
+
+            assert isinstance(xml, str)
+            assert 'archived' not in xml and 'uuid>1<' not in xml
+            assert fields['variables'] == {u'a': u'1', u'b': None}
+            assert [role.name for role in fields['roles']] == [u'role1', u'role2']
+
+    @raises(TypeError)
+    def test_bad_path(self):
+        """ The path of a field must be a string """
+        Field(None)
@@ -0,0 +1,172 @@
+#-*- coding: utf-8 -*-
+import io
+
+from bs4 import BeautifulSoup
+from lxml import etree
+from nose.tools import raises
+
+from pybonita.exception import XMLSchemaParseError
+from pybonita.parser import parse_xml, iter_children, parse_error_body, get_backend, set_backend
+from pybonita.user import BonitaUser, BonitaGroup
+from pybonita.utils import xml_find, xml_find_all, xml_string, xml_text, xml_tostring, tag_matcher
+from pybonita.tests import TestCase, build_bonita_user_xml, build_bonita_group_xml, build_dumb_bonita_error_body
+
+
+XML = u'<?xml version="1.0" encoding="UTF-8"?>' \
+      u'<set><User><uuid>1</uuid><dbid></dbid><processUUID><value>p</value></processUUID></User>' \
+      u'<user><uuid>2</uuid><name>J\xe9r\xf4me</name></user></set>'
+
+
+class TestParser(TestCase):
+    """ Test both XML parser backends """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def tearDown(self):
+        set_backend('lxml')
+
+    def check_document(self, soup):
+        users = xml_find_all(xml_find(soup, 'set'), 'user')
+
+        assert len(users) == 2
+        assert [xml_string(xml_find(user, 'uuid')) for user in users] == [u'1', u'2']
+        assert xml_string(xml_find(users[0], 'dbid')) is None
+        assert xml_string(xml_find(users[0], 'processUUID')) == u'p'
+        assert xml_text(xml_find(users[0], 'processUUID')) == u'p'
+        assert xml_find(users[0], 'name', raise_exception=False) is None
+        assert xml_string(xml_find(users[1], 'name')) == u'J\xe9r\xf4me'
+        assert xml_tostring(xml_find(users[1], 'name')) == u'<name>J\xe9r\xf4me</name>'
+
+    def test_lxml(self):
+        """ Parse and browse a document with the lxml backend """
+        assert get_backend() == 'lxml'
+        soup = parse_xml(XML)
+
+        assert isinstance(soup, etree._ElementTree)
+        self.check_document(soup)
+
+    def test_lxml_bytes_and_stream(self):
+        """ Parse a document from bytes or from a stream with the lxml backend """
+        self.check_document(parse_xml(XML.encode('utf-8')))
+        self.check_document(parse_xml(io.BytesIO(XML.encode('utf-8'))))
+
+    def test_bs4(self):
+        """ Parse and browse a document with the BeautifulSoup backend """
+        set_backend('bs4')
+        soup = parse_xml(XML)
+
+        assert isinstance(soup, BeautifulSoup)
+        self.check_document(soup)
+
+    def test_tag_matcher(self):
+        """ Tag matchers search the whole subtree or the children only, with both backends """
+        assert tag_matcher('uuid') is tag_matcher('uuid')
+        assert tag_matcher('uuid') is not tag_matcher('uuid', recursive=False)
+
+        for backend in ['bs4', 'lxml']:
+            set_backend(backend)
+            soup = parse_xml(XML)
+            root = xml_find(soup, 'set')
+
+            assert len(xml_find_all(root, 'uuid')) == 2
+            assert xml_find_all(root, 'uuid', recursive=False) == []
+            assert xml_find(root, 'value', raise_exception=False, recursive=False) is None
+            assert xml_string(xml_find(root, 'value')) == u'p'
+            assert len(tag_matcher('user', recursive=False).find_all(root)) == 2
+            assert xml_find(soup, 'set', recursive=False) is not None
+
+    def test_instanciate(self):
+        """ Both backends build the same objects """
+        parent = build_bonita_group_xml(u'parent uuid', u'platform', as_parent=True)
+        group_xml = build_bonita_group_xml(u'group uuid', u'group name', label=u'label', parent=parent)
+        user_xml = build_bonita_user_xml(u'user uuid', u'pass', u'jdoe', {'firstName': u'John'})
+
+        for backend in ['bs4', 'lxml']:
+            set_backend(backend)
+            group = BonitaGroup._instanciate_from_xml(group_xml)
+            user = BonitaUser._instanciate_from_xml(user_xml)
+
+            assert (group.uuid, group.name, group.label) == (u'group uuid', u'group name', u'label')
+            assert group.parent.name == u'platform'
+            assert (user.uuid, user.username, user.firstName) == (u'user uuid', u'jdoe', u'John')
+
+    def test_parse_error_body(self):
+        """ Decode the exception, code and message of a Bonita error body """
+        xml = build_dumb_bonita_error_body('UserNotFoundException', code='404', message=u'can\'t find "J\xe9r\xf4me"\nat all')
+
+        assert parse_error_body(xml) == (u'org.ow2.bonita.facade.exception.UserNotFoundException', 404,
+                                         u'can\'t find "J\xe9r\xf4me"\nat all')
+        assert parse_error_body(u'<java.lang.NullPointerException/>') == (u'java.lang.NullPointerException', 500, u'')
+        assert parse_error_body(u'Internal Server Error') is None
+
+    def test_parse_error_body_markup(self):
+        """ Character references and CDATA sections of the message are decoded, as by a tree parser """
+        body = u'<org.ow2.bonita.facade.exception.UserNotFoundException><errorCode>404</errorCode>' \
+               u'<detailMessage>J&#233;r&#xF4;me &amp;#233; <![CDATA[<b> & co]]> \u20ac</detailMessage>' \
+               u'</org.ow2.bonita.facade.exception.UserNotFoundException>'
+        message = parse_error_body(body)[2]
+
+        assert message == u'J\xe9r\xf4me &#233; <b> & co \u20ac'
+        for backend in ('lxml', 'bs4'):
+            set_backend(backend)
+            assert xml_text(xml_find(parse_xml(body), 'detailMessage')) == message
+
+    def test_iter_children(self):
+        """ Parse the items of a list incrementally, detaching them along the way """
+        xml = u'<set><user><uuid>1</uuid></user><User><uuid>2</uuid><user><uuid>nested</uuid></user></User>' \
+              u'<user><uuid>3</uuid></user></set>'
+        stream = io.BytesIO(xml.encode('utf-8'))
+        uuids = []
+
+        users = []
+        for user in iter_children(stream, 'user'):
+            uuids.append(xml_string(xml_find(user, 'uuid')))
+            # Items already consumed have been detached
+            assert user.getprevious() is None
+            users.append(user)
+
+        assert uuids == [u'1', u'2', u'3']
+        # Detached items can still be read
+        assert [xml_string(xml_find(user, 'uuid')) for user in users] == uuids
+        assert [user.getparent() for user in users] == [None, None, None]
+        assert stream.closed is True
+
+    def test_iter_children_bs4(self):
+        """ Parse the items of a list with the BeautifulSoup backend """
+        set_backend('bs4')
+        xml = u'<set><user><uuid>1</uuid></user><User><uuid>2</uuid><user><uuid>nested</uuid></user></User></set>'
+
+        uuids = [xml_string(xml_find(user, 'uuid')) for user in iter_children(io.BytesIO(xml.encode('utf-8')), 'user')]
+
+        assert uuids == [u'1', u'2']
+
+    def test_iter_children_closed(self):
+        """ The stream is closed when the generator is not consumed to the end """
+        stream = io.BytesIO(b'<set><user/><user/></set>')
+        users = iter_children(stream, 'user')
+
+        next(users)
+        users.close()
+
+        assert stream.closed is True
+
+    @raises(XMLSchemaParseError)
+    def test_lxml_empty(self):
+        """ The lxml backend fails on a document without any element """
+        parse_xml(u'')
+
+    @raises(ValueError)
+    def test_unknown_backend(self):
+        """ Try to use an unknown backend """
+        set_backend('minidom')
+
+    @raises(TypeError)
+    def test_find_invalid_soup(self):
+        """ Try to look for a tag in something else than a parsed document """
+        xml_find(u'<set/>', 'set')
@@ -0,0 +1,116 @@
+#-*- coding: utf-8 -*-
+from nose.tools import raises
+
+from pybonita import BonitaServer
+from pybonita.parser import parse_xml
+from pybonita.process import BonitaProcess
+from pybonita.record import UserRecord, GroupRecord, RoleRecord, CaseRecord, ProcessRecord
+from pybonita.user import BonitaUser, BonitaGroup, BonitaRole, BonitaMembership
+from pybonita.utils import xml_find
+from pybonita.tests import TestCase, TestWithMockedServer, build_bonita_user_xml, build_bonita_group_xml,\
+    build_bonita_process_definition_xml, build_bonita_process_instance_xml, build_xml_set
+
+
+def build_user_xml(uuid, username):
+    """ Build the XML of a user with two memberships sharing their role """
+    role = BonitaRole(u'myrole', u'', u'')
+    role.uuid = u'role uuid'
+    memberships = []
+    for group_uuid in [u'group 1', u'group 2']:
+        group = BonitaGroup(group_uuid, u'', u'')
+        group.uuid = group_uuid
+        membership = BonitaMembership(role, group)
+        membership.uuid = u'membership %s' % group_uuid
+        memberships.append(membership)
+
+    return build_bonita_user_xml(uuid, u'pass', username, {'firstName': u'John', 'memberships': memberships})
+
+
+class TestRecord(TestCase):
+    """ Test the compact, read-only records """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_user(self):
+        """ Build a user record, with its memberships, roles and groups """
+        user = UserRecord._instanciate_from_node(xml_find(parse_xml(build_user_xml(u'uuid', u'jdoe')), 'user'))
+
+        assert (user.uuid, user.username, user.firstName, user.lastName) == (u'uuid', u'jdoe', u'John', None)
+        assert isinstance(user.memberships, tuple)
+        assert len(user.memberships) == 2
+        assert [role.name for role in user.roles] == [u'myrole']
+        assert sorted(group.uuid for group in user.groups) == [u'group 1', u'group 2']
+        assert isinstance(user.roles[0], RoleRecord)
+        assert not hasattr(user, '__dict__')
+
+    def test_group_parent(self):
+        """ Build a group record with its parent """
+        parent_xml = build_bonita_group_xml(u'parent uuid', u'platform', as_parent=True)
+        xml = build_bonita_group_xml(u'group uuid', u'group name', parent=parent_xml)
+
+        group = GroupRecord._instanciate_from_node(xml_find(parse_xml(xml), 'group'))
+
+        assert group.name == u'group name'
+        assert isinstance(group.parent, GroupRecord)
+        assert group.parent.name == u'platform'
+        assert group.parent.parent is None
+
+    @raises(AttributeError)
+    def test_read_only(self):
+        """ Records can't be modified """
+        role = RoleRecord(uuid=u'1', name=u'role')
+        role.name = u'other'
+
+    @raises(TypeError)
+    def test_unknown_field(self):
+        """ Records only accept their fields """
+        RoleRecord(uuid=u'1', unknown=u'field')
+
+
+class TestCompactQueries(TestWithMockedServer):
+    """ Test the bulk queries returning records """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_find_all(self):
+        """ Retrieve all users as records, sharing their roles """
+        BonitaServer.use('localhost', 9090, 'restuser', 'restbpm')
+        xml = build_xml_set([build_user_xml(u'1', u'user1'), build_user_xml(u'2', u'user2')])
+        BonitaServer.set_response_list([['/identityAPI/getUsers', 200, xml]])
+
+        users = BonitaUser.find_all(compact=True)
+
+        assert [user.username for user in users] == [u'user1', u'user2']
+        assert isinstance(users[0], UserRecord)
+        assert users[0].roles[0] is users[1].roles[0]
+
+    def test_cases(self):
+        """ Retrieve the processes and cases of a process as records """
+        BonitaServer.use('localhost', 9090, 'restuser', 'restbpm')
+        processes_xml = build_xml_set([build_bonita_process_definition_xml(u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')])
+        cases_xml = build_xml_set([build_bonita_process_instance_xml(u'MonProcessus1--1.0--1', u'MonProcessus1--1.0',
+                                                                     variables={u'demandeur': u'julien'})])
+        BonitaServer.set_response_list([[u'/queryDefinitionAPI/getProcessesByProcessId/MonProcessus1', 200, processes_xml],
+                                        [u'/queryRuntimeAPI/getProcessInstances/MonProcessus1--1.0', 200, cases_xml]])
+
+        processes = BonitaProcess.get_processes(u'MonProcessus1', compact=True)
+        cases = BonitaProcess(u'MonProcessus1--1.0').get_cases(compact=True)
+
+        assert isinstance(processes[0], ProcessRecord)
+        assert processes[0].version == u'1.0'
+        assert isinstance(cases[0], CaseRecord)
+        assert (cases[0].uuid, cases[0].process_uuid) == (u'MonProcessus1--1.0--1', u'MonProcessus1--1.0')
+        assert cases[0].variables == {u'demandeur': u'julien'}
+        assert cases[0].is_archived is False
@@ -3,8 +3,8 @@ from nose.tools import raises
 
 from pybonita import BonitaServer
 from pybonita.tests import TestWithMockedServer, build_dumb_bonita_error_body,\
-    build_bonita_process_definition_xml
-from pybonita.process import BonitaProcess
+    build_bonita_process_definition_xml, build_bonita_process_instance_xml, build_xml_set
+from pybonita.process import BonitaProcess, BonitaCase
 
 
 class TestGetProcess(TestWithMockedServer):
@@ -45,4 +45,75 @@ class TestGetProcess(TestWithMockedServer):
         assert isinstance(process,BonitaProcess)
         assert process.uuid == u'MonProcessus1--1.0'
         assert process.name == u'MonProcessus1'
-        assert process.version == u'1.0'
\ No newline at end of file
+        assert process.version == u'1.0'
+
+class TestGetCases(TestWithMockedServer):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_get_cases(self):
+        """ Retrieve the cases of every version of a process """
+        BonitaServer.use('localhost', 9090, 'restuser', 'restbpm')
+        processes_xml = build_xml_set([build_bonita_process_definition_xml(uuid=u'MonProcessus1--1.0'),
+                                       build_bonita_process_definition_xml(uuid=u'MonProcessus1--2.0')])
+        cases_v1_xml = build_xml_set([build_bonita_process_instance_xml(u'MonProcessus1--1.0--1', u'MonProcessus1--1.0'),
+                                      build_bonita_process_instance_xml(u'MonProcessus1--1.0--2', u'MonProcessus1--1.0')])
+        cases_v2_xml = build_xml_set([build_bonita_process_instance_xml(u'MonProcessus1--2.0--1', u'MonProcessus1--2.0',
+                                                                        variables={u'demandeur': u'julien'})])
+        BonitaServer.set_response_list([[u'/queryDefinitionAPI/getProcessesByProcessId/MonProcessus1', 200, processes_xml],
+                                        [u'/queryRuntimeAPI/getProcessInstances/MonProcessus1--1.0', 200, cases_v1_xml],
+                                        [u'/queryRuntimeAPI/getProcessInstances/MonProcessus1--2.0', 200, cases_v2_xml]])
+
+        cases = BonitaCase.get_cases(u'MonProcessus1')
+
+        assert [case.uuid for case in cases] == [u'MonProcessus1--1.0--1', u'MonProcessus1--1.0--2', u'MonProcessus1--2.0--1']
+        assert cases[2].process.uuid == u'MonProcessus1--2.0'
+        assert cases[2].variables == {u'demandeur': u'julien'}
+        assert cases[0].state == u'STARTED'
+
+    def test_iter_cases(self):
+        """ Retrieve the cases of a process one at a time """
+        BonitaServer.use('localhost', 9090, 'restuser', 'restbpm')
+        cases_xml = build_xml_set([build_bonita_process_instance_xml(u'MonProcessus1--1.0--1', u'MonProcessus1--1.0'),
+                                   build_bonita_process_instance_xml(u'MonProcessus1--1.0--2', u'MonProcessus1--1.0')])
+        BonitaServer.set_response_list([[u'/queryRuntimeAPI/getProcessInstances/MonProcessus1--1.0', 200, cases_xml]])
+
+        cases = BonitaProcess(u'MonProcessus1--1.0').iter_cases()
+
+        assert next(cases).uuid == u'MonProcessus1--1.0--1'
+        assert next(cases).uuid == u'MonProcessus1--1.0--2'
+        assert next(cases, None) is None
+
+    def test_lazy_variables(self):
+        """ The variables of a case are read on first access only, even once the case list is consumed """
+        BonitaServer.use('localhost', 9090, 'restuser', 'restbpm')
+        cases_xml = build_xml_set([build_bonita_process_instance_xml(u'MonProcessus1--1.0--1', u'MonProcessus1--1.0',
+                                                                     variables={u'demandeur': u'julien'}),
+                                   build_bonita_process_instance_xml(u'MonProcessus1--1.0--2', u'MonProcessus1--1.0')])
+        BonitaServer.set_response_list([[u'/queryRuntimeAPI/getProcessInstances/MonProcessus1--1.0', 200, cases_xml]])
+
+        cases = list(BonitaProcess(u'MonProcessus1--1.0').iter_cases())
+
+        assert cases[0]._lazy_node is not None
+        assert cases[0].variables == {u'demandeur': u'julien'}
+        assert cases[0]._lazy_node is None
+        assert cases[1].variables == {}
+
+    def test_get_async(self):
+        """ Retrieve a process asynchronously """
+        BonitaServer.use('localhost', 9090, 'restuser', 'restbpm')
+        url = u'/queryDefinitionAPI/getProcess/MonProcessus1--1.0'
+        xml = build_bonita_process_definition_xml(uuid=u'MonProcessus1--1.0', name=u'MonProcessus1', version=u'1.0')
+        BonitaServer.set_response_list([[url,200,xml]])
+
+        result = BonitaProcess.get_async(u'MonProcessus1--1.0')
+        process = result.get(5)
+
+        assert isinstance(process,BonitaProcess)
+        assert process.version == u'1.0'
@@ -0,0 +1,159 @@
+#-*- coding: utf-8 -*-
+from nose.tools import raises
+
+from pybonita import BonitaServer
+from pybonita.process import BonitaProcess, BonitaCase
+from pybonita.registry import ProcessRegistry, build_registry
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server,\
+    build_bonita_process_definition_xml, build_bonita_process_instance_xml, build_xml_set
+
+
+def build_process(uuid, name=None, version=None):
+    """ Build a BonitaProcess with its definition """
+    process = BonitaProcess(uuid)
+    process._name = name
+    process._version = version
+
+    return process
+
+
+class TestProcessRegistry(TestCase):
+    """ Test the ProcessRegistry sharing process definitions """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_add(self):
+        """ Definitions are registered by uuid and by name and version, the first one is kept """
+        registry = ProcessRegistry()
+        process = build_process(u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')
+
+        assert registry.get(u'MonProcessus1--1.0') is None
+        assert registry.add(process) is process
+        assert registry.add(build_process(u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')) is process
+        assert registry.get(u'MonProcessus1--1.0') is process
+        assert registry.get_by_name(u'MonProcessus1', u'1.0') is process
+        assert registry.get_by_name(u'MonProcessus1', u'2.0') is None
+        assert len(registry) == 1
+
+        registry.clear()
+        assert registry.get(u'MonProcessus1--1.0') is None
+
+    def test_referenced(self):
+        """ A process referenced by its uuid only is completed once its definition is registered """
+        registry = ProcessRegistry()
+        stub = registry.get_or_build(u'MonProcessus1--1.0', lambda: BonitaProcess(u'MonProcessus1--1.0'))
+
+        assert registry.get_or_build(u'MonProcessus1--1.0', lambda: None) is stub
+        assert registry.get(u'MonProcessus1--1.0') is None
+
+        assert registry.add(build_process(u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')) is stub
+        assert (stub.name, stub.version) == (u'MonProcessus1', u'1.0')
+        assert registry.get(u'MonProcessus1--1.0') is stub
+
+    def test_versions_expiry(self):
+        """ The versions of a process id are loaded again once expired """
+        registry = ProcessRegistry(versions_ttl=10)
+        now = [1000.0]
+        registry._versions._clock = lambda: now[0]
+        loads = []
+
+        def load():
+            loads.append(1)
+            return [build_process(u'MonProcessus1--%d.0' % len(loads), u'MonProcessus1', u'%d.0' % len(loads))]
+
+        first = registry.get_processes(u'MonProcessus1', load)
+        assert registry.get_processes(u'MonProcessus1', load) == first
+        now[0] = 1010.0
+        second = registry.get_processes(u'MonProcessus1', load)
+
+        assert len(loads) == 2
+        assert second[0].uuid == u'MonProcessus1--2.0'
+        assert registry.get(u'MonProcessus1--1.0') is first[0]
+
+    def test_build_registry(self):
+        """ Build the registry of a server handle from the configure param """
+        registry = ProcessRegistry()
+
+        assert build_registry(False) is None
+        assert isinstance(build_registry(True), ProcessRegistry)
+        assert build_registry(registry) is registry
+
+    @raises(TypeError)
+    def test_build_registry_invalid(self):
+        """ The process_registry param must be a bool or a ProcessRegistry """
+        build_registry('process')
+
+
+class TestRegisteredProcesses(TestCase):
+    """ Test the processes and cases retrieved through the registry of the server handle """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def build_server(self):
+        """ Build a server handle answering the versions of MonProcessus1, then its cases twice """
+        processes_xml = build_xml_set([build_bonita_process_definition_xml(u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')])
+        cases_xml = build_xml_set([build_bonita_process_instance_xml(u'MonProcessus1--1.0--1', u'MonProcessus1--1.0'),
+                                   build_bonita_process_instance_xml(u'MonProcessus1--1.0--2', u'MonProcessus1--1.0')])
+        session = FakeSession([FakeResponse(200, processes_xml), FakeResponse(200, cases_xml),
+                               FakeResponse(200, cases_xml)])
+
+        return (build_configured_server(session), session)
+
+    def test_get_cases(self):
+        """ The versions of a process are retrieved once, and shared by all its cases """
+        (server, session) = self.build_server()
+
+        cases = BonitaCase.get_cases(u'MonProcessus1', server=server)
+        other_cases = BonitaCase.get_cases(u'MonProcessus1', server=server)
+
+        methods = [call['url'].split('/')[-2] for call in session.calls]
+        assert methods == ['getProcessesByProcessId', 'getProcessInstances', 'getProcessInstances']
+        assert cases[0].process is cases[1].process
+        assert other_cases[0].process is cases[0].process
+        assert cases[0].process.version == u'1.0'
+
+    def test_get(self):
+        """ A registered process is retrieved without reaching the server """
+        (server, session) = self.build_server()
+        process = BonitaProcess.get_processes(u'MonProcessus1', server=server)[0]
+
+        assert BonitaProcess.get(u'MonProcessus1--1.0', server=server) is process
+        assert server.process_registry.get_by_name(u'MonProcessus1', u'1.0') is process
+        assert len(session.calls) == 1
+
+    def test_cases_first(self):
+        """ Cases retrieved before their process share it, completed once its definition is retrieved """
+        xml = build_bonita_process_definition_xml(u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')
+        cases_xml = build_xml_set([build_bonita_process_instance_xml(u'MonProcessus1--1.0--1', u'MonProcessus1--1.0'),
+                                   build_bonita_process_instance_xml(u'MonProcessus1--1.0--2', u'MonProcessus1--1.0')])
+        server = build_configured_server(FakeSession([FakeResponse(200, cases_xml), FakeResponse(200, xml)]))
+
+        cases = BonitaProcess(u'MonProcessus1--1.0').get_cases(server=server)
+        process = BonitaProcess.get(u'MonProcessus1--1.0', server=server)
+
+        assert cases[0].process is cases[1].process
+        assert process is cases[0].process
+        assert process.name == u'MonProcessus1'
+
+    def test_disabled(self):
+        """ Without registry, each case builds its own process """
+        (server, session) = self.build_server()
+        server.process_registry = None
+
+        cases = BonitaCase.get_cases(u'MonProcessus1', server=server)
+
+        assert cases[0].process is not cases[1].process
+        assert cases[0].process.uuid == cases[1].process.uuid
+        assert BonitaServer.create('localhost', 9090, 'restuser', 'restbpm', process_registry=False).process_registry is None
@@ -0,0 +1,189 @@
+#-*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from nose.tools import raises
+
+from pybonita.backend import MemoryBackend, SocketBackend, CacheDaemon
+from pybonita.cache import LookupCache
+from pybonita.process import BonitaProcess
+from pybonita.user import BonitaUser, BonitaRole
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server,\
+    build_bonita_user_xml, build_bonita_role_xml, build_bonita_process_definition_xml, build_dumb_bonita_error_body
+
+
+def build_worker(backend, responses):
+    """ Build the server handle of a worker sharing the backend, answering with responses """
+    session = FakeSession(responses)
+    server = build_configured_server(session)
+    server.cache = LookupCache(backend=backend)
+
+    return (server, session)
+
+
+class TestMemoryBackend(TestCase):
+    """ Test the in memory cache backend """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_regions(self):
+        """ Values are held by region, each region being cleared on its own """
+        backend = MemoryBackend()
+        backend.put('role', 'key', 'role value', 60)
+        backend.put('group', 'key', 'group value', 60)
+
+        backend.clear('role')
+
+        assert backend.get('role', 'key') is None
+        assert backend.get('group', 'key') == 'group value'
+        assert backend.stats()['group']['hits'] == 1
+
+    def test_delete(self):
+        """ A single value is forgotten, the others of its region are kept """
+        backend = MemoryBackend()
+        backend.put('role', 'key', 'role value', 60)
+        backend.put('role', 'other', 'other value', 60)
+
+        backend.delete('role', 'key')
+
+        assert backend.get('role', 'key') is None
+        assert backend.get('role', 'other') == 'other value'
+
+    def test_shared(self):
+        """ Lookups of a server handle are answered from the backend filled by another one """
+        backend = MemoryBackend()
+        (server_1, session_1) = build_worker(backend, [FakeResponse(200, build_bonita_role_xml(u'role uuid', u'myrole'))])
+        (server_2, session_2) = build_worker(backend, [FakeResponse(500, u'')])
+
+        role_1 = BonitaRole.get_by_name(u'myrole', server=server_1)
+        role_2 = BonitaRole.get_by_name(u'myrole', server=server_2)
+
+        assert role_2 is not role_1
+        assert (role_2.uuid, role_2.name) == (u'role uuid', u'myrole')
+        assert role_2._server is server_2
+        assert BonitaRole.get_by_name(u'myrole', server=server_2) is role_2
+        assert (len(session_1.calls), len(session_2.calls)) == (1, 0)
+
+    def test_shared_not_found(self):
+        """ Lookups of entities which do not exist are shared too """
+        backend = MemoryBackend()
+        not_found = build_dumb_bonita_error_body('ProcessNotFoundException')
+        (server_1, session_1) = build_worker(backend, [FakeResponse(500, not_found)])
+        (server_2, session_2) = build_worker(backend, [FakeResponse(500, not_found)])
+
+        assert BonitaProcess.get(u'unknown--1.0', server=server_1) is None
+        assert BonitaProcess.get(u'unknown--1.0', server=server_2) is None
+        assert (len(session_1.calls), len(session_2.calls)) == (1, 0)
+
+    def test_users_not_mapped(self):
+        """ Users read from the backend are copies of their own, not shared through the identity map """
+        backend = MemoryBackend()
+        xml = build_bonita_user_xml(u'user uuid', u'pass', u'jdoe')
+        (server_1, session_1) = build_worker(backend, [FakeResponse(200, xml)])
+        (server_2, session_2) = build_worker(backend, [FakeResponse(500, u'')])
+        BonitaUser.get_by_username(u'jdoe', server=server_1)
+
+        user = BonitaUser.get_by_username(u'jdoe', server=server_2)
+
+        assert user.username == u'jdoe'
+        assert len(server_2.identity_map) == 0
+        assert BonitaUser.get_by_username(u'jdoe', server=server_2) is not user
+        assert len(session_2.calls) == 0
+
+    def test_invalidate(self):
+        """ Invalidating a region of a LookupCache clears it in the backend """
+        backend = MemoryBackend()
+        (server_1, session_1) = build_worker(backend, [FakeResponse(200, build_bonita_role_xml(u'role uuid', u'myrole'))])
+        (server_2, session_2) = build_worker(backend, [FakeResponse(200, build_bonita_role_xml(u'role uuid', u'myrole'))])
+        BonitaRole.get_by_name(u'myrole', server=server_1)
+
+        server_1.cache.invalidate('role')
+        BonitaRole.get_by_name(u'myrole', server=server_2)
+
+        assert len(session_2.calls) == 1
+
+
+class TestCacheDaemon(TestCase):
+    """ Test the cache daemon shared through a local socket """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.daemon = CacheDaemon(os.path.join(self.directory, 'cache.sock'), authkey='secret')
+        self.daemon.start()
+
+    def tearDown(self):
+        self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def test_shared(self):
+        """ Processes share their lookups through the daemon """
+        xml = build_bonita_process_definition_xml(u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')
+        (server_1, session_1) = build_worker(SocketBackend(self.daemon.address, authkey='secret'),
+                                             [FakeResponse(200, xml)])
+        (server_2, session_2) = build_worker(SocketBackend(self.daemon.address, authkey='secret'),
+                                             [FakeResponse(500, u'')])
+
+        process_1 = BonitaProcess.get(u'MonProcessus1--1.0', server=server_1)
+        process_2 = BonitaProcess.get(u'MonProcessus1--1.0', server=server_2)
+
+        assert (process_2.uuid, process_2.name, process_2.version) == (u'MonProcessus1--1.0', u'MonProcessus1', u'1.0')
+        assert (len(session_1.calls), len(session_2.calls)) == (1, 0)
+        assert server_2.cache.stats()['backend']['process']['hits'] == 1
+
+    def test_delete(self):
+        """ Values are forgotten one by one through the daemon """
+        backend = SocketBackend(self.daemon.address, authkey='secret')
+        backend.put('role', 'key', 'role value', 60)
+        backend.put('role', 'other', 'other value', 60)
+
+        backend.delete('role', 'key')
+
+        assert backend.get('role', 'key') is None
+        assert backend.get('role', 'other') == 'other value'
+
+    @raises(ValueError)
+    def test_tcp_without_authkey(self):
+        """ The daemon does not listen to a TCP port without authkey """
+        CacheDaemon(('127.0.0.1', 0))
+
+    @raises(ValueError)
+    def test_tcp_client_without_authkey(self):
+        """ Workers do not reach the daemon through TCP without authkey """
+        SocketBackend(('127.0.0.1', 6000))
+
+    def test_tcp(self):
+        """ The daemon listens to a TCP port with an authkey """
+        daemon = CacheDaemon(('127.0.0.1', 0), authkey='secret')
+        daemon.start()
+        try:
+            backend = SocketBackend(daemon.address, authkey='secret')
+            backend.put('role', 'key', 'role value', 60)
+
+            assert backend.get('role', 'key') == 'role value'
+        finally:
+            daemon.stop()
+
+    def test_unreachable(self):
+        """ Lookups go on without the daemon when it can't be reached """
+        backend = SocketBackend(os.path.join(self.directory, 'missing.sock'))
+        (server, session) = build_worker(backend, [FakeResponse(200, build_bonita_role_xml(u'role uuid', u'myrole'))])
+
+        role = BonitaRole.get_by_name(u'myrole', server=server)
+
+        assert role.name == u'myrole'
+        assert backend.errors == 2
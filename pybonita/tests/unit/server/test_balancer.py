@@ -0,0 +1,179 @@
+#-*- coding: utf-8 -*-
+from nose.tools import raises
+from requests.exceptions import ConnectionError
+
+from pybonita import BonitaServer
+from pybonita.balancer import BonitaEndpoint, RoundRobinBalancer, LeastOutstandingBalancer,\
+    LatencyWeightedBalancer, build_balancer, parse_endpoints
+from pybonita.exception import ServerNotReachableError
+from pybonita.retry import RetryPolicy
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server
+
+
+class TestParseEndpoints(TestCase):
+    """ Test the parse_endpoints function """
+
+    def test_single_host(self):
+        """ Parse a single host """
+        endpoints = parse_endpoints('localhost', 9090)
+
+        assert len(endpoints) == 1
+        assert endpoints[0].host == 'localhost'
+        assert endpoints[0].port == 9090
+        assert endpoints[0].base_url == 'http://localhost:9090/bonita-server-rest/API'
+
+    def test_list_of_hosts(self):
+        """ Parse a list of hosts given in every supported form """
+        endpoints = parse_endpoints(['node1', 'node2:8080', ('node3', 7070)], 9090)
+
+        assert [str(endpoint) for endpoint in endpoints] == ['node1:9090', 'node2:8080', 'node3:7070']
+
+    @raises(ValueError)
+    def test_empty_list(self):
+        """ Try to parse an empty list of hosts """
+        parse_endpoints([], 9090)
+
+    @raises(TypeError)
+    def test_invalid_host(self):
+        """ Try to parse a host which is not a string """
+        parse_endpoints([12], 9090)
+
+
+class TestBalancers(TestCase):
+    """ Test the balancing policies """
+
+    def build_endpoints(self):
+        return [BonitaEndpoint('node1', 9090), BonitaEndpoint('node2', 9090), BonitaEndpoint('node3', 9090)]
+
+    def test_round_robin(self):
+        """ Round robin sends requests to each endpoint in turn """
+        balancer = RoundRobinBalancer(self.build_endpoints())
+
+        hosts = [balancer.select().host for i in range(4)]
+
+        assert hosts == ['node1', 'node2', 'node3', 'node1']
+
+    def test_least_outstanding(self):
+        """ Least outstanding sends requests to the least busy endpoint """
+        endpoints = self.build_endpoints()
+        balancer = LeastOutstandingBalancer(endpoints)
+
+        balancer.acquire(endpoints[0])
+        balancer.acquire(endpoints[1])
+
+        assert balancer.select() is endpoints[2]
+
+        balancer.acquire(endpoints[2])
+        balancer.acquire(endpoints[2])
+        balancer.release(endpoints[0], 0.1, True)
+
+        assert balancer.select() is endpoints[0]
+
+    def test_latency_weighted(self):
+        """ Latency weighted favors the fastest endpoints """
+        endpoints = self.build_endpoints()
+        endpoints[0].latency = 1.0
+        endpoints[1].latency = 0.1
+        endpoints[2].latency = 1.0
+        balancer = LatencyWeightedBalancer(endpoints)
+
+        # Weights are 1, 10, 1 : the middle of the range falls on node2
+        balancer._random = lambda: 0.5
+        assert balancer.select() is endpoints[1]
+        balancer._random = lambda: 0.01
+        assert balancer.select() is endpoints[0]
+        balancer._random = lambda: 0.99
+        assert balancer.select() is endpoints[2]
+
+    def test_ejection_and_readmission(self):
+        """ An endpoint failing too many times is ejected, then re-admitted """
+        endpoints = self.build_endpoints()
+        balancer = RoundRobinBalancer(endpoints, max_failures=2, ejection_time=60)
+
+        for i in range(2):
+            balancer.acquire(endpoints[0])
+            balancer.release(endpoints[0], 0.1, False)
+
+        assert endpoints[0].is_available() is False
+        assert endpoints[0] not in [balancer.select() for i in range(6)]
+
+        # Ejection time is over
+        endpoints[0].ejected_until -= 61
+
+        assert endpoints[0] in [balancer.select() for i in range(3)]
+
+        balancer.acquire(endpoints[0])
+        balancer.release(endpoints[0], 0.1, True)
+
+        assert endpoints[0].failures == 0
+        assert endpoints[0].ejected_until is None
+
+    def test_all_ejected(self):
+        """ When all endpoints are ejected, the first one to be re-admitted is used """
+        endpoints = self.build_endpoints()
+        balancer = RoundRobinBalancer(endpoints)
+        endpoints[0].ejected_until = 2000000000
+        endpoints[1].ejected_until = 1900000000
+        endpoints[2].ejected_until = 2100000000
+
+        assert balancer.select() is endpoints[1]
+
+    def test_exclude(self):
+        """ Excluded endpoints are never selected, even as a fallback """
+        endpoints = self.build_endpoints()
+        balancer = RoundRobinBalancer(endpoints)
+        endpoints[1].ejected_until = 2000000000
+        endpoints[2].ejected_until = 1900000000
+
+        assert [balancer.select(exclude=[endpoints[0]]) for i in range(2)] == [endpoints[2]] * 2
+        assert balancer.select(exclude=endpoints) is None
+
+    @raises(ValueError)
+    def test_unknown_policy(self):
+        """ Try to build a balancer with an unknown policy """
+        build_balancer(self.build_endpoints(), 'random')
+
+
+class TestServerBalancing(TestCase):
+    """ Test the server transport with several endpoints """
+
+    def test_configure_several_hosts(self):
+        """ Configure a server handle with several hosts """
+        server = BonitaServer.create(['node1', 'node2:8080'], 9090, 'restuser', 'restbpm',
+                                     balancing='least_outstanding')
+
+        assert server.host == 'node1'
+        assert server.port == 9090
+        assert isinstance(server._get_balancer(), LeastOutstandingBalancer)
+        assert len(server._get_balancer().endpoints) == 2
+
+        server.close()
+
+    def test_requests_spread(self):
+        """ Requests are spread across the hosts """
+        session = FakeSession([FakeResponse(200, u'<list/>')])
+        server = build_configured_server(session)
+        server._balancer = build_balancer(parse_endpoints(['node1', 'node2'], 9090))
+
+        server.sendRESTRequest(url='/identityAPI/getUsers')
+        server.sendRESTRequest(url='/identityAPI/getUsers')
+
+        assert session.calls[0]['url'] == 'http://node1:9090/bonita-server-rest/API/identityAPI/getUsers'
+        assert session.calls[1]['url'] == 'http://node2:9090/bonita-server-rest/API/identityAPI/getUsers'
+        assert server._balancer.endpoints[0].outstanding == 0
+        assert server._balancer.endpoints[0].latency is not None
+
+    def test_unreachable_host_ejected(self):
+        """ A host which can't be reached is ejected """
+        session = FakeSession([ConnectionError()])
+        server = build_configured_server(session)
+        server._balancer = build_balancer(parse_endpoints(['node1', 'node2'], 9090), max_failures=1)
+        server.retry_policy = RetryPolicy(max_retries=0)
+
+        try:
+            server.sendRESTRequest(url='/identityAPI/getUsers')
+        except ServerNotReachableError:
+            pass
+
+        assert server._balancer.endpoints[0].is_available() is False
+        assert server._balancer.endpoints[0].outstanding == 0
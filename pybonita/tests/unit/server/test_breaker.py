@@ -0,0 +1,188 @@
+#-*- coding: utf-8 -*-
+import time
+
+from nose.tools import raises
+from requests.exceptions import ConnectionError
+
+from pybonita import BonitaServer
+from pybonita.balancer import build_balancer, parse_endpoints
+from pybonita.breaker import CircuitBreaker
+from pybonita.exception import CircuitOpenError, ServerNotReachableError
+from pybonita.retry import RetryPolicy
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server
+
+
+class TestCircuitBreaker(TestCase):
+    """ Test the CircuitBreaker state machine """
+
+    def build_breaker(self, half_open_probes=None):
+        breaker = CircuitBreaker('node1:9090', failure_rate=0.5, window_size=4, min_calls=4, cooldown=30,
+                                 half_open_probes=half_open_probes)
+        breaker.transitions = []
+        breaker.add_listener(lambda breaker, old, new: breaker.transitions.append((old, new)))
+        return breaker
+
+    def test_stays_closed(self):
+        """ The breaker stays closed below the failure rate """
+        breaker = self.build_breaker()
+
+        for outcome in [True, False, True, True, True, False]:
+            assert breaker.allow_request() is True
+            breaker.record_success() if outcome else breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.transitions == []
+
+    def test_opens(self):
+        """ The breaker opens at the failure rate, once enough requests are recorded """
+        breaker = self.build_breaker()
+
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow_request() is False
+        assert breaker.transitions == [(CircuitBreaker.CLOSED, CircuitBreaker.OPEN)]
+
+    def test_half_open_probe_success(self):
+        """ After the cooldown a probe is let through and closes the breaker on success """
+        breaker = self.build_breaker()
+        for i in range(4):
+            breaker.record_failure()
+        breaker.opened_at -= 31
+
+        assert breaker.allow_request() is True
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        # A single probe at a time
+        assert breaker.allow_request() is False
+
+        breaker.record_success()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.transitions == [(CircuitBreaker.CLOSED, CircuitBreaker.OPEN),
+                                       (CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN),
+                                       (CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED)]
+
+    def test_half_open_probes(self):
+        """ With several probes, the breaker closes once all of them succeeded """
+        breaker = self.build_breaker(half_open_probes=2)
+        for i in range(4):
+            breaker.record_failure()
+        breaker.opened_at -= 31
+
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+
+        breaker.record_success()
+
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request() is False
+
+        breaker.record_success()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_probe_failure(self):
+        """ A failing probe opens the breaker again """
+        breaker = self.build_breaker()
+        for i in range(4):
+            breaker.record_failure()
+        breaker.opened_at -= 31
+
+        assert breaker.allow_request() is True
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.is_open() is True
+
+
+class TestServerBreaker(TestCase):
+    """ Test the circuit breaker in the server transport """
+
+    def test_configure(self):
+        """ Configure the circuit breakers of a server handle """
+        transitions = []
+        server = BonitaServer.create(['node1', 'node2'], 9090, 'restuser', 'restbpm',
+                                     circuit_breaker={'min_calls': 2, 'cooldown': 5},
+                                     on_breaker_state_change=lambda breaker, old, new: transitions.append(new))
+
+        for endpoint in server._get_balancer().endpoints:
+            assert endpoint.breaker.min_calls == 2
+            assert endpoint.breaker.cooldown == 5
+            assert endpoint.breaker.name == str(endpoint)
+
+        server.close()
+
+    @raises(CircuitOpenError)
+    def test_fail_fast(self):
+        """ While the breaker is open, requests fail at once without being sent """
+        session = FakeSession([ConnectionError()])
+        server = build_configured_server(session)
+        server.retry_policy = RetryPolicy(max_retries=0)
+        breaker = server._get_balancer().endpoints[0].breaker
+        breaker.min_calls = 2
+
+        for i in range(2):
+            try:
+                server.sendRESTRequest(url='/identityAPI/getUsers')
+            except ServerNotReachableError:
+                pass
+
+        assert breaker.state == CircuitBreaker.OPEN
+        try:
+            server.sendRESTRequest(url='/identityAPI/getUsers')
+        finally:
+            assert len(session.calls) == 2
+
+    def test_half_open_endpoint_skipped(self):
+        """ Requests refused by a half open breaker whose probe is in flight go to another endpoint """
+        session = FakeSession([FakeResponse(200, u'<set/>')])
+        server = build_configured_server(session)
+        server._balancer = build_balancer(parse_endpoints(['node1', 'node2'], 9090))
+        breaker = server._balancer.endpoints[0].breaker
+        breaker.state = CircuitBreaker.OPEN
+        breaker.opened_at = time.time() - breaker.cooldown
+        # The probe of the half open breaker is in flight
+        assert breaker.allow_request()
+
+        for i in range(4):
+            server.sendRESTRequest(url='/identityAPI/getUsers/%s' % i)
+
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert [call['url'].split('/')[2] for call in session.calls] == ['node2:9090'] * 4
+
+    @raises(CircuitOpenError)
+    def test_all_endpoints_open(self):
+        """ Requests fail at once when the breakers of all the endpoints refuse them """
+        session = FakeSession([FakeResponse(200, u'<set/>')])
+        server = build_configured_server(session)
+        server._balancer = build_balancer(parse_endpoints(['node1', 'node2'], 9090))
+        for endpoint in server._balancer.endpoints:
+            endpoint.breaker.state = CircuitBreaker.OPEN
+            endpoint.breaker.opened_at = time.time()
+
+        try:
+            server.sendRESTRequest(url='/identityAPI/getUsers')
+        finally:
+            assert len(session.calls) == 0
+
+    def test_gateway_errors_recorded(self):
+        """ Gateway errors count as failures, other answers as successes """
+        session = FakeSession([FakeResponse(503), FakeResponse(200, u'<set/>')])
+        server = build_configured_server(session)
+        server.retry_policy = RetryPolicy(max_retries=0)
+        breaker = server._get_balancer().endpoints[0].breaker
+
+        try:
+            server.sendRESTRequest(url='/identityAPI/getUsers')
+        except ServerNotReachableError:
+            pass
+        server.sendRESTRequest(url='/identityAPI/getUsers')
+
+        assert list(breaker._outcomes) == [False, True]
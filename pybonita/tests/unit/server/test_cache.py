@@ -0,0 +1,287 @@
+#-*- coding: utf-8 -*-
+from nose.tools import raises
+
+from pybonita import BonitaServer
+from pybonita.cache import TTLCache, LookupCache, build_cache
+from pybonita.user import BonitaUser, BonitaRole
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server,\
+    build_bonita_user_xml, build_bonita_role_xml, build_dumb_bonita_error_body, build_membership
+
+
+class TestTTLCache(TestCase):
+    """ Test the bounded, expiring TTLCache """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_get(self):
+        """ Values are held and counted as hits, unknown keys as misses """
+        cache = TTLCache()
+        cache.put('key', 'value')
+
+        assert cache.get('key') == 'value'
+        assert cache.get('other', 'default') == 'default'
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+
+    def test_expiry(self):
+        """ Values expire ttl seconds after being put """
+        cache = TTLCache(ttl=10)
+        now = [1000.0]
+        cache._clock = lambda: now[0]
+        cache.put('key', 'value')
+
+        now[0] = 1009.0
+        assert cache.get('key') == 'value'
+        now[0] = 1010.0
+        assert cache.get('key') is None
+        assert len(cache) == 0
+
+    def test_lru(self):
+        """ The least recently used value is evicted when the cache is full """
+        cache = TTLCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        assert cache.get('b') is None
+        assert (cache.get('a'), cache.get('c')) == (1, 3)
+        assert cache.evictions == 1
+
+    @raises(ValueError)
+    def test_invalid_ttl(self):
+        """ ttl must be positive """
+        TTLCache(ttl=0)
+
+
+class TestLookupCache(TestCase):
+    """ Test the regions of the LookupCache """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_regions(self):
+        """ Regions are merged with the default ones, None disables a region """
+        cache = LookupCache({'role': {'ttl': 3600, 'max_size': 10}, 'user': None})
+
+        assert cache.regions['role'].ttl == 3600
+        assert cache.regions['group'].ttl == LookupCache.DEFAULT_REGIONS['group']['ttl']
+        assert 'user' not in cache.regions
+        assert cache.get_or_load('user', ('key',), lambda: 'loaded') == 'loaded'
+
+    def test_not_found(self):
+        """ Lookups of entities which do not exist are cached for negative_ttl seconds """
+        cache = LookupCache({'role': {'negative_ttl': 10}})
+        now = [1000.0]
+        cache.negative_regions['role']._clock = lambda: now[0]
+        loads = []
+
+        def load():
+            loads.append(1)
+            return None
+
+        assert cache.get_or_load('role', ('unknown',), load) is None
+        assert cache.get_or_load('role', ('unknown',), load) is None
+        assert len(loads) == 1
+        assert cache.stats()['role']['negative']['hits'] == 1
+
+        now[0] = 1010.0
+        cache.get_or_load('role', ('unknown',), load)
+        assert len(loads) == 2
+
+    def test_not_found_disabled(self):
+        """ Lookups of entities which do not exist are not cached without negative_ttl """
+        cache = LookupCache({'role': {'negative_ttl': None}})
+        loads = []
+
+        def load():
+            loads.append(1)
+            return None
+
+        cache.get_or_load('role', ('unknown',), load)
+        cache.get_or_load('role', ('unknown',), load)
+
+        assert len(loads) == 2
+        assert 'negative' not in cache.stats()['role']
+
+    def test_invalidate(self):
+        """ Invalidating a region clears the regions depending on it too """
+        cache = LookupCache()
+        for region in ['role', 'group', 'membership', 'user']:
+            cache.get_or_load(region, ('key',), lambda: 'entity')
+
+        cache.get_or_load('group', ('unknown',), lambda: None)
+        cache.invalidate('group')
+
+        stats = cache.stats()
+        assert stats['group']['negative']['size'] == 0
+        assert (stats['role']['size'], stats['group']['size']) == (1, 0)
+        assert (stats['membership']['size'], stats['user']['size']) == (0, 0)
+
+    def test_invalidate_entity(self):
+        """ Invalidating an entity forgets its own lookups only, and clears the regions depending on it """
+        cache = LookupCache()
+        role = BonitaRole(u'role', u'', u'')
+        role.uuid = u'1'
+        other = BonitaRole(u'other', u'', u'')
+        other.uuid = u'2'
+        cache.get_or_load('role', ('get_by_uuid', u'1'), lambda: role)
+        cache.get_or_load('role', ('get_by_name', u'former name'), lambda: role)
+        cache.get_or_load('role', ('get_by_name', u'other'), lambda: other)
+        cache.get_or_load('role', ('get_by_name', u'role'), lambda: None)
+        cache.get_or_load('membership', ('key',), lambda: 'entity')
+
+        cache.invalidate('role', keys=[('get_by_uuid', u'1'), ('get_by_name', u'role')], uuid=u'1')
+
+        stats = cache.stats()
+        assert (stats['role']['size'], stats['role']['negative']['size']) == (1, 0)
+        assert cache.get_or_load('role', ('get_by_name', u'other'), lambda: None) is other
+        assert stats['membership']['size'] == 0
+
+    def test_build_cache(self):
+        """ Build the cache of a server handle from the configure param """
+        cache = LookupCache()
+
+        assert build_cache(None) is None
+        assert build_cache(False) is None
+        assert isinstance(build_cache(True), LookupCache)
+        assert build_cache({'role': {'ttl': 5}}).regions['role'].ttl == 5
+        assert build_cache(cache) is cache
+
+    @raises(TypeError)
+    def test_build_cache_invalid(self):
+        """ The cache param must be a bool, a dict or a LookupCache """
+        build_cache('role')
+
+
+class TestCachedLookups(TestCase):
+    """ Test the lookups reading through the cache of the server handle """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_read_through(self):
+        """ A lookup only reaches the server once """
+        session = FakeSession([FakeResponse(200, build_bonita_role_xml(u'role uuid', u'myrole'))])
+        server = build_configured_server(session)
+        server.cache = LookupCache()
+
+        role = BonitaRole.get_by_name(u'myrole', server=server)
+
+        assert BonitaRole.get_by_name(u'myrole', server=server) is role
+        assert BonitaRole.get_by_name(name=u'myrole', server=server) is role
+        assert len(session.calls) == 1
+        assert server.cache.stats()['role']['hits'] == 2
+
+    def test_no_cache(self):
+        """ Without cache, each lookup reaches the server """
+        session = FakeSession([FakeResponse(200, build_bonita_role_xml(u'role uuid', u'myrole'))])
+        server = build_configured_server(session)
+
+        BonitaRole.get_by_name(u'myrole', server=server)
+        BonitaRole.get_by_name(u'myrole', server=server)
+
+        assert len(session.calls) == 2
+
+    def test_not_found(self):
+        """ Lookups of entities which do not exist only reach the server once """
+        session = FakeSession([FakeResponse(500, build_dumb_bonita_error_body('RoleNotFoundException'))])
+        server = build_configured_server(session)
+        server.cache = LookupCache()
+
+        assert BonitaRole.get_by_name(u'unknown', server=server) is None
+        assert BonitaRole.get_by_name(u'unknown', server=server) is None
+        assert len(session.calls) == 1
+
+    def test_users_copied(self):
+        """ Each lookup of a cached user returns its own copy, sharing the roles and groups """
+        xml = build_bonita_user_xml(u'user uuid', u'pass', u'jdoe',
+                                    {'memberships': [build_membership(u'm1', u'role', u'group 1')]})
+        session = FakeSession([FakeResponse(200, xml)])
+        server = build_configured_server(session)
+        server.cache = LookupCache()
+
+        user = BonitaUser.get_by_username(u'jdoe', server=server)
+        user.title = u'Dr'
+        other = BonitaUser.get_by_username(u'jdoe', server=server)
+
+        assert other is not user
+        assert getattr(other, 'title', None) != u'Dr'
+        assert not other.is_modified
+        assert other._server is server
+        assert other.memberships[0] is user.memberships[0]
+        assert BonitaUser.get_by_username(u'jdoe', server=server).memberships[0].role is user.roles[0]
+        assert len(session.calls) == 1
+
+    def test_create_invalidates(self):
+        """ Creating a user through the server handle makes it visible at once """
+        xml = build_bonita_user_xml(u'user uuid', u'pass', u'jdoe')
+        session = FakeSession([FakeResponse(500, build_dumb_bonita_error_body('UserNotFoundException')),
+                               FakeResponse(200, xml)])
+        server = build_configured_server(session)
+        server.cache = LookupCache()
+
+        assert BonitaUser.get_by_username(u'jdoe', server=server) is None
+        assert BonitaUser.get_by_username(u'jdoe', server=server) is None
+        BonitaUser(username=u'jdoe', password=u'pass').save(server=server)
+        user = BonitaUser.get_by_username(u'jdoe', server=server)
+
+        assert user.uuid == u'user uuid'
+        methods = [call['url'].split('/identityAPI/')[1].split('/')[0] for call in session.calls]
+        assert methods == ['getUser', 'addUser', 'getUser']
+
+    def test_save_invalidates(self):
+        """ Saving a user through the server handle clears the cached users """
+        xml = build_bonita_user_xml(u'user uuid', u'pass', u'jdoe')
+        session = FakeSession([FakeResponse(200, xml)])
+        server = build_configured_server(session)
+        server.cache = LookupCache()
+
+        user = BonitaUser.get_by_username(u'jdoe', server=server)
+        user.password = u'other pass'
+        user.save()
+        BonitaUser.get_by_username(u'jdoe', server=server)
+
+        methods = [call['url'].split('/identityAPI/')[1].split('/')[0] for call in session.calls]
+        assert methods == ['getUser', 'updateUserPassword', 'getUser']
+
+    def test_save_keeps_other_users(self):
+        """ Saving a user only forgets its own lookups """
+        session = FakeSession([FakeResponse(200, build_bonita_user_xml(u'user uuid', u'pass', u'jdoe')),
+                               FakeResponse(200, build_bonita_user_xml(u'other uuid', u'pass', u'msmith')),
+                               FakeResponse(200, build_bonita_user_xml(u'user uuid', u'other pass', u'jdoe'))])
+        server = build_configured_server(session)
+        server.cache = LookupCache()
+        BonitaUser.get_by_uuid(u'user uuid', server=server)
+        BonitaUser.get_by_username(u'msmith', server=server)
+
+        user = BonitaUser.get_by_username(u'jdoe', server=server)
+        user.password = u'other pass'
+        user.save()
+
+        assert BonitaUser.get_by_username(u'msmith', server=server).uuid == u'other uuid'
+        assert BonitaUser.get_by_uuid(u'user uuid', server=server).password == u'other pass'
+        methods = [call['url'].split('/identityAPI/')[1].split('/')[0] for call in session.calls]
+        assert methods == ['getUserByUUID', 'getUser', 'getUser', 'updateUserPassword', 'getUserByUUID']
+
+    def test_configure(self):
+        """ The cache is given to the configure method of a server handle """
+        server = BonitaServer.create('localhost', 9090, 'restuser', 'restbpm', cache={'role': {'ttl': 30}})
+
+        assert server.cache.regions['role'].ttl == 30
+        assert BonitaServer.create('localhost', 9090, 'restuser', 'restbpm').cache is None
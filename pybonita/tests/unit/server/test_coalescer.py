@@ -0,0 +1,193 @@
+#-*- coding: utf-8 -*-
+import threading
+import time
+
+from pybonita.coalescer import SingleFlight
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server
+
+
+class BlockingSession(FakeSession):
+    """ FakeSession whose requests wait for the release event to answer """
+
+    def __init__(self, responses=None):
+        super(BlockingSession, self).__init__(responses)
+        self.release = threading.Event()
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, **kwargs):
+        with self._lock:
+            self.waiting += 1
+        self.release.wait()
+        return super(BlockingSession, self).post(url, data, **kwargs)
+
+
+def wait_until(condition, timeout=10.0):
+    """ Wait for condition to be true, fail after timeout seconds """
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, u"condition not met after %s seconds" % timeout
+        time.sleep(0.001)
+
+
+def run_concurrently(target, count, release, ready):
+    """ Run target in count threads, set release once ready is true, and wait for them """
+    results = []
+    errors = []
+
+    def run():
+        try:
+            results.append(target())
+        except BaseException as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    try:
+        wait_until(ready)
+    finally:
+        release.set()
+    for thread in threads:
+        thread.join()
+
+    return (results, errors)
+
+
+class TestSingleFlight(TestCase):
+    """ Test the coalescing of concurrent calls """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_coalesce(self):
+        """ Concurrent calls with the same key share a single call """
+        single_flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            release.wait()
+            return u'result'
+
+        (results, errors) = run_concurrently(lambda: single_flight.do('key', function), 10, release,
+                                             lambda: len(calls) == 1 and single_flight.waiting() == 9)
+
+        assert errors == []
+        assert len(calls) == 1
+        assert results == [u'result'] * 10
+        assert single_flight.in_flight() == 0
+
+    def test_share_exception(self):
+        """ Every caller gets the exception raised by the shared call """
+        single_flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            release.wait()
+            raise ValueError(u'failed')
+
+        (results, errors) = run_concurrently(lambda: single_flight.do('key', function), 5, release,
+                                             lambda: len(calls) == 1 and single_flight.waiting() == 4)
+
+        assert results == []
+        assert len(errors) == 5
+        assert all(isinstance(error, ValueError) for error in errors)
+
+    def test_share_base_exception(self):
+        """ Every caller gets the exception raised by the shared call, even if not an Exception """
+        single_flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            release.wait()
+            raise SystemExit(1)
+
+        (results, errors) = run_concurrently(lambda: single_flight.do('key', function), 5, release,
+                                             lambda: len(calls) == 1 and single_flight.waiting() == 4)
+
+        assert results == []
+        assert len(errors) == 5
+        assert all(isinstance(error, SystemExit) for error in errors)
+
+    def test_sequential_calls(self):
+        """ Calls made one after the other are not coalesced """
+        single_flight = SingleFlight()
+        calls = []
+
+        single_flight.do('key', calls.append, 1)
+        single_flight.do('key', calls.append, 2)
+
+        assert calls == [1, 2]
+
+
+class TestServerCoalescing(TestCase):
+    """ Test the coalescing of read requests by the server transport """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_coalesce_reads(self):
+        """ Identical concurrent read requests are sent once """
+        session = BlockingSession([FakeResponse(200, u'<Group/>')])
+        server = build_configured_server(session)
+
+        send = lambda: server.sendRESTRequest(url='/identityAPI/getGroupUsingPath', data={'groupPath': '/platform'})
+        (results, errors) = run_concurrently(send, 10, session.release,
+                                             lambda: session.waiting == 1 and server._single_flight.waiting() == 9)
+
+        assert errors == []
+        assert len(session.calls) == 1
+        assert results == [u'<Group/>'] * 10
+
+    def test_distinct_requests(self):
+        """ Requests with other data or another user are sent separately """
+        session = BlockingSession([FakeResponse(200, u'<Group/>')])
+        server = build_configured_server(session)
+        requests = [lambda: server.sendRESTRequest(url='/identityAPI/getGroupUsingPath', data={'groupPath': '/platform'}),
+                    lambda: server.sendRESTRequest(url='/identityAPI/getGroupUsingPath', data={'groupPath': '/other'}),
+                    lambda: server.sendRESTRequest(url='/identityAPI/getGroupUsingPath', data={'groupPath': '/platform'},
+                                                   user='admin')]
+        (results, errors) = run_concurrently(lambda: requests.pop()(), 3, session.release,
+                                             lambda: session.waiting == 3)
+
+        assert errors == []
+        assert len(session.calls) == 3
+
+    def test_writes_not_coalesced(self):
+        """ Write requests are always sent """
+        session = BlockingSession([FakeResponse(200, u'<user/>')])
+        server = build_configured_server(session)
+
+        send = lambda: server.sendRESTRequest(url='/identityAPI/addUser', data={'username': 'jdoe'})
+        (results, errors) = run_concurrently(send, 3, session.release, lambda: session.waiting == 3)
+
+        assert errors == []
+        assert len(session.calls) == 3
+
+    def test_disabled(self):
+        """ Coalescing can be turned off """
+        session = BlockingSession([FakeResponse(200, u'<Group/>')])
+        server = build_configured_server(session)
+        server.coalesce_reads = False
+
+        send = lambda: server.sendRESTRequest(url='/identityAPI/getGroupUsingPath', data={'groupPath': '/platform'})
+        (results, errors) = run_concurrently(send, 3, session.release, lambda: session.waiting == 3)
+
+        assert errors == []
+        assert len(session.calls) == 3
@@ -0,0 +1,86 @@
+#-*- coding: utf-8 -*-
+import threading
+import time
+
+from nose.tools import raises
+
+from pybonita.executor import BonitaExecutor, gather
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server
+
+
+class TestExecutor(TestCase):
+    """ Test the BonitaExecutor """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @raises(TypeError)
+    def test_invalid_workers(self):
+        """ Try to build an executor without worker """
+        BonitaExecutor(0)
+
+    def test_submit(self):
+        """ Submit a call and retrieve its result """
+        executor = BonitaExecutor(2)
+
+        result = executor.submit(lambda a, b=0: a + b, 1, b=2)
+
+        assert result.get(5) == 3
+        executor.close()
+
+    def test_calls_in_flight(self):
+        """ More calls than workers can be in flight, they are queued """
+        executor = BonitaExecutor(4)
+        running = []
+        lock = threading.Lock()
+
+        def call(value):
+            with lock:
+                running.append(threading.current_thread())
+            time.sleep(0.01)
+            return value * 2
+
+        results = [executor.submit(call, value) for value in range(40)]
+
+        assert gather(results, 5) == [value * 2 for value in range(40)]
+        assert len(set(running)) <= 4
+        executor.close()
+
+    @raises(ValueError)
+    def test_gather_raises(self):
+        """ gather raises the exception of a failed call """
+        executor = BonitaExecutor(2)
+
+        def fail():
+            raise ValueError('failed')
+
+        try:
+            gather([executor.submit(fail)], 5)
+        finally:
+            executor.close()
+
+    def test_map_from_worker(self):
+        """ map called from a worker runs in the worker, without waiting for other workers """
+        executor = BonitaExecutor(1)
+
+        result = executor.submit(executor.map, lambda value: value + 1, [1, 2, 3])
+
+        assert result.get(5) == [2, 3, 4]
+        executor.close()
+
+    def test_send_request_async(self):
+        """ Send a REST request asynchronously """
+        session = FakeSession([FakeResponse(200, u'<set/>')])
+        server = build_configured_server(session)
+
+        # Distinct requests, which are never coalesced
+        results = [server.sendRESTRequestAsync('/identityAPI/getUsers', data={'index': str(i)}) for i in range(10)]
+
+        assert gather(results, 5) == [u'<set/>'] * 10
+        assert len(session.calls) == 10
+        server.executor.close()
@@ -0,0 +1,136 @@
+#-*- coding: utf-8 -*-
+from pybonita import BonitaServer
+from pybonita.identity import IdentityMap
+from pybonita.user import BonitaUser, BonitaGroup, BonitaRole
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server, build_bonita_user_xml,\
+    build_bonita_role_xml, build_membership
+
+
+class TestIdentityMap(TestCase):
+    """ Test the IdentityMap sharing objects by uuid """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_add(self):
+        """ The first object added for a class and a uuid is kept """
+        identity_map = IdentityMap()
+        role = BonitaRole('role', '', '')
+        role.uuid = u'1'
+        other = BonitaRole('other', '', '')
+        other.uuid = u'1'
+        group = BonitaGroup('group', '', '')
+        group.uuid = u'1'
+
+        assert identity_map.get(BonitaRole, u'1') is None
+        assert identity_map.add(role) is role
+        assert identity_map.add(other) is role
+        assert identity_map.add(group) is group
+        assert identity_map.get(BonitaRole, u'1') is role
+        assert identity_map.get(BonitaGroup, u'1') is group
+        assert len(identity_map) == 2
+
+        identity_map.clear()
+
+        assert identity_map.get(BonitaRole, u'1') is None
+
+    def test_without_uuid(self):
+        """ Objects without uuid are not mapped """
+        identity_map = IdentityMap()
+        role = BonitaRole('role', '', '')
+        role.uuid = None
+
+        assert identity_map.add(role) is role
+        assert identity_map.get(BonitaRole, None) is None
+        assert len(identity_map) == 0
+
+    def test_weak(self):
+        """ Objects nobody uses anymore are forgotten """
+        identity_map = IdentityMap()
+        role = BonitaRole('role', '', '')
+        role.uuid = u'1'
+        identity_map.add(role)
+
+        del role
+
+        assert identity_map.get(BonitaRole, u'1') is None
+        assert len(identity_map) == 0
+
+
+class TestSharedEntities(TestCase):
+    """ Test the sharing of the entities retrieved through a server handle """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def build_users(self, server):
+        xml_1 = build_bonita_user_xml(u'user 1', u'pass', u'user1',
+                                      {'memberships': [build_membership(u'm1', u'role', u'group 1'),
+                                                       build_membership(u'm2', u'role', u'group 2')]})
+        xml_2 = build_bonita_user_xml(u'user 2', u'pass', u'user2',
+                                      {'memberships': [build_membership(u'm1', u'role', u'group 1')]})
+
+        return (BonitaUser._instanciate_from_xml(xml_1, server=server),
+                BonitaUser._instanciate_from_xml(xml_2, server=server))
+
+    def test_shared(self):
+        """ Users retrieved through the same handle share their memberships, roles and groups """
+        server = build_configured_server()
+        (user_1, user_2) = self.build_users(server)
+
+        assert user_1.memberships[0] is user_2.memberships[0]
+        assert user_1.memberships[0].role is user_1.memberships[1].role
+        assert user_2.groups[0] in user_1.groups
+        assert len(user_1.roles) == 1
+
+    def test_refreshed(self):
+        """ A shared entity retrieved again is refreshed with the answer of the server """
+        session = FakeSession([FakeResponse(200, build_bonita_role_xml(u'r1', u'role', description=u'old')),
+                               FakeResponse(200, build_bonita_role_xml(u'r1', u'role', description=u'new'))])
+        server = build_configured_server(session)
+
+        role = BonitaRole.get_by_uuid(u'r1', server=server)
+        role.description = u'local edit'
+        other = BonitaRole.get_by_uuid(u'r1', server=server)
+
+        assert len(session.calls) == 2
+        assert other is role
+        assert role.description == u'new'
+
+    def test_refreshed_nested(self):
+        """ Refreshing a shared membership keeps its role and group """
+        server = build_configured_server()
+        (user_1, user_2) = self.build_users(server)
+        membership = user_1.memberships[0]
+        group = membership.group
+        membership.dbid = u'local edit'
+
+        assert user_2.memberships[0] is membership
+        assert membership.group is group
+        assert membership.dbid != u'local edit'
+
+    def test_several_handles(self):
+        """ Entities are not shared across server handles """
+        (user_1, user_2) = self.build_users(build_configured_server())
+        (user_3, user_4) = self.build_users(build_configured_server())
+
+        assert user_1.memberships[0] is not user_3.memberships[0]
+
+    def test_disabled(self):
+        """ Entities are not shared when the identity map of the handle is turned off """
+        server = BonitaServer.create('localhost', 9090, 'restuser', 'restbpm', identity_map=False)
+        (user_1, user_2) = self.build_users(server)
+
+        assert server.identity_map is None
+        assert user_1.memberships[0] is not user_2.memberships[0]
+        assert user_1.memberships[0].uuid == user_2.memberships[0].uuid
@@ -0,0 +1,146 @@
+#-*- coding: utf-8 -*-
+from nose.tools import raises
+from requests.exceptions import ConnectionError, Timeout
+
+from pybonita.exception import ServerNotReachableError
+from pybonita.retry import RetryPolicy, RetryBudget, is_idempotent
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server
+
+
+def build_retry_policy(max_retries=3, budget=None):
+    """ Build a RetryPolicy which records its delays instead of sleeping """
+    policy = RetryPolicy(max_retries=max_retries, budget=budget)
+    policy.delays = []
+    policy._sleep = policy.delays.append
+    return policy
+
+
+class TestIsIdempotent(TestCase):
+    """ Test the is_idempotent function """
+
+    def test_read_only_methods(self):
+        """ Query and get methods are idempotent """
+        assert is_idempotent('/queryRuntimeAPI/getProcessInstances/MonProcessus1--1.0') is True
+        assert is_idempotent('/queryDefinitionAPI/getProcess/MonProcessus1--1.0') is True
+        assert is_idempotent('/identityAPI/getUsers') is True
+
+    def test_write_methods(self):
+        """ Other methods are not idempotent """
+        assert is_idempotent('/identityAPI/addUser') is False
+        assert is_idempotent('/runtimeAPI/instantiateProcess/MonProcessus1--1.0') is False
+
+
+class TestRetryBudget(TestCase):
+    """ Test the RetryBudget """
+
+    def test_drain(self):
+        """ Retries drain the budget """
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2)
+
+        assert budget.withdraw() is True
+        assert budget.withdraw() is True
+        assert budget.withdraw() is False
+
+        budget.deposit()
+        budget.deposit()
+
+        assert budget.withdraw() is True
+        assert budget.withdraw() is False
+
+
+class TestRetryPolicy(TestCase):
+    """ Test the RetryPolicy """
+
+    def test_should_retry(self):
+        """ Only idempotent requests are retried, at most max_retries times """
+        policy = build_retry_policy(max_retries=2)
+
+        assert policy.should_retry('/identityAPI/getUsers', 0) is True
+        assert policy.should_retry('/identityAPI/getUsers', 1) is True
+        assert policy.should_retry('/identityAPI/getUsers', 2) is False
+        assert policy.should_retry('/identityAPI/addUser', 0) is False
+
+    def test_backoff(self):
+        """ Backoff delays grow exponentially, with jitter, up to backoff_max """
+        policy = build_retry_policy()
+        policy.backoff_base = 0.1
+        policy.backoff_max = 0.5
+        policy._random = lambda low, high: high
+
+        for retries in range(5):
+            policy.backoff(retries)
+
+        assert policy.delays == [0.1, 0.2, 0.4, 0.5, 0.5]
+
+        policy._random = lambda low, high: low
+        policy.backoff(3)
+
+        assert policy.delays[-1] == 0
+
+
+class TestServerRetry(TestCase):
+    """ Test timeouts and retries in the server transport """
+
+    def test_default_timeout(self):
+        """ Requests are sent with the server timeouts """
+        session = FakeSession()
+        server = build_configured_server(session)
+        server.connect_timeout = 2.0
+        server.read_timeout = 30.0
+
+        server.sendRESTRequest(url='/identityAPI/getUsers')
+        server.sendRESTRequest(url='/identityAPI/getUsers', timeout=5)
+
+        assert session.calls[0]['kwargs']['timeout'] == (2.0, 30.0)
+        assert session.calls[1]['kwargs']['timeout'] == 5
+
+    def test_retry_read_request(self):
+        """ A read only request is retried until it reaches the server """
+        session = FakeSession([ConnectionError(), Timeout(), FakeResponse(503), FakeResponse(200, u'<set/>')])
+        server = build_configured_server(session)
+        server.retry_policy = build_retry_policy()
+
+        response = server.sendRESTRequest(url='/identityAPI/getUsers')
+
+        assert response == u'<set/>'
+        assert len(session.calls) == 4
+        assert len(server.retry_policy.delays) == 3
+
+    @raises(ServerNotReachableError)
+    def test_no_retry_write_request(self):
+        """ A write request is not retried """
+        session = FakeSession([ConnectionError(), FakeResponse(200, u'<uuid>1</uuid>')])
+        server = build_configured_server(session)
+        server.retry_policy = build_retry_policy()
+
+        try:
+            server.sendRESTRequest(url='/identityAPI/addUser')
+        finally:
+            assert len(session.calls) == 1
+
+    @raises(ServerNotReachableError)
+    def test_retries_exhausted(self):
+        """ A request is not retried more than max_retries times """
+        session = FakeSession([Timeout()])
+        server = build_configured_server(session)
+        server.retry_policy = build_retry_policy(max_retries=2)
+
+        try:
+            server.sendRESTRequest(url='/identityAPI/getUsers')
+        finally:
+            assert len(session.calls) == 3
+
+    def test_budget_exhausted(self):
+        """ Once the budget is drained, failing requests are not retried anymore """
+        session = FakeSession([ConnectionError()])
+        server = build_configured_server(session)
+        server.retry_policy = build_retry_policy(budget=RetryBudget(ratio=0, min_per_second=0, max_tokens=2))
+
+        for i in range(3):
+            try:
+                server.sendRESTRequest(url='/identityAPI/getUsers')
+            except ServerNotReachableError:
+                pass
+
+        # 2 retries allowed by the budget, then a single call for each request
+        assert len(session.calls) == 3 + 2
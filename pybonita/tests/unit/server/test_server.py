@@ -0,0 +1,317 @@
+#-*- coding: utf-8 -*-
+import gzip
+import io
+
+from nose.tools import raises
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.response import HTTPResponse
+
+from pybonita import BonitaServer
+from pybonita.parser import iter_children
+from pybonita.server import _DecodedStream
+from pybonita.user import BonitaUser
+from pybonita.utils import xml_find, xml_text
+from pybonita.exception import BonitaHTTPError, BonitaNotFoundError, UserNotFoundError, UnexpectedResponseError
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server,\
+    build_dumb_bonita_error_body, build_bonita_user_xml, build_xml_set
+
+
+class TestSession(TestCase):
+    """ Test the persistent HTTP session of the server transport """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_setup_session_pool_sizes(self):
+        """ Setup a session with custom pool sizes """
+        server = build_configured_server()
+        server._setup_session(pool_connections=3, pool_maxsize=20)
+
+        adapter = server._session.get_adapter('http://localhost:9090/')
+
+        assert isinstance(adapter, HTTPAdapter)
+        assert adapter._pool_connections == 3
+        assert adapter._pool_maxsize == 20
+        assert server._session.auth.username == 'restuser'
+        assert server._session.auth.password == 'restbpm'
+
+    def test_setup_session_default_pool_sizes(self):
+        """ Setup a session with default pool sizes """
+        server = build_configured_server()
+        server._setup_session()
+
+        adapter = server._session.get_adapter('http://localhost:9090/')
+
+        assert adapter._pool_connections == BonitaServer.DEFAULT_POOL_CONNECTIONS
+        assert adapter._pool_maxsize == BonitaServer.DEFAULT_POOL_MAXSIZE
+
+    @raises(TypeError)
+    def test_setup_session_invalid_pool_size(self):
+        """ Try to setup a session with an invalid pool size """
+        server = build_configured_server()
+        server._setup_session(pool_maxsize=0)
+
+    def test_setup_session_closes_previous(self):
+        """ Setting up a new session closes the previous one """
+        session = FakeSession()
+        server = build_configured_server(session)
+        server._setup_session()
+
+        assert session.closed is True
+        assert server._session is not session
+
+    def test_session_reused(self):
+        """ Several requests go through the same session """
+        session = FakeSession([FakeResponse(200, u'<uuid>1</uuid>')])
+        server = build_configured_server(session)
+
+        server.sendRESTRequest(url='/identityAPI/getUsers')
+        server.sendRESTRequest(url='/identityAPI/getRoles')
+
+        assert len(session.calls) == 2
+        assert session.calls[0]['url'] == 'http://localhost:9090/bonita-server-rest/API/identityAPI/getUsers'
+        assert session.calls[1]['url'] == 'http://localhost:9090/bonita-server-rest/API/identityAPI/getRoles'
+        assert session.calls[0]['data']['options'] == u'user:john'
+
+    def test_close(self):
+        """ Close the session of the server """
+        session = FakeSession()
+        server = build_configured_server(session)
+        server.close()
+
+        assert session.closed is True
+        assert server._session is None
+
+
+class TestStream(TestCase):
+    """ Test the compressed and streamed responses """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_accept_compression(self):
+        """ The session asks for compressed responses """
+        server = build_configured_server()
+        server._setup_session()
+
+        assert server._session.headers['accept-encoding'] == 'gzip, deflate'
+
+    def test_stream(self):
+        """ In stream mode, the body is returned as a stream without being read """
+        response = FakeResponse(200, u'<set><user/></set>')
+        session = FakeSession([response])
+        server = build_configured_server(session)
+
+        stream = server.sendRESTRequest(url='/identityAPI/getUsers', stream=True)
+
+        assert response.raw.tell() == 0
+        assert stream.read() == '<set><user/></set>'
+        assert stream.encoding == 'utf-8'
+        assert session.calls[0]['kwargs']['stream'] is True
+
+    def test_stream_gzip(self):
+        """ A gzip compressed body is uncompressed while read from the stream """
+        body = io.BytesIO()
+        gzip_file = gzip.GzipFile(fileobj=body, mode='wb')
+        gzip_file.write('<set><user/></set>')
+        gzip_file.close()
+        response = FakeResponse(200)
+        response.raw = HTTPResponse(io.BytesIO(body.getvalue()), headers={'content-encoding': 'gzip'},
+                                    preload_content=False, decode_content=False)
+        server = build_configured_server(FakeSession([response]))
+
+        stream = server.sendRESTRequest(url='/identityAPI/getUsers', stream=True)
+
+        assert stream.read() == '<set><user/></set>'
+
+    def test_stream_retried(self):
+        """ A streamed response to be retried is closed """
+        unavailable = FakeResponse(503)
+        server = build_configured_server(FakeSession([unavailable, FakeResponse(200, u'<set/>')]))
+        server.retry_policy._sleep = lambda delay: None
+
+        stream = server.sendRESTRequest(url='/identityAPI/getUsers', stream=True)
+
+        assert unavailable.closed is True
+        assert stream.read() == '<set/>'
+
+
+class TestDecode(TestCase):
+    """ Test the decoding of the responses """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_encoding_learnt(self):
+        """ The charset of the first response is kept on the endpoint """
+        response = FakeResponse(200, u'<?xml version="1.0" encoding="UTF-8"?><name>Jérôme</name>')
+        server = build_configured_server(FakeSession([response]))
+
+        xml = server.sendRESTRequest(url='/identityAPI/getUsers')
+
+        assert u'Jérôme' in xml
+        assert server._get_balancer().endpoints[0].encoding == 'utf-8'
+
+    def test_encoding_used(self):
+        """ The charset kept on the endpoint is used to decode the next responses """
+        response = FakeResponse(200)
+        response.content = u'<name>Jérôme</name>'.encode('utf-16-le')
+        server = build_configured_server(FakeSession([response]))
+        server._get_balancer().endpoints[0].encoding = 'utf-16-le'
+
+        assert server.sendRESTRequest(url='/identityAPI/getUsers') == u'<name>Jérôme</name>'
+
+    def test_encoding_changed(self):
+        """ The charset is guessed again when a response fails to decode with the one kept """
+        response = FakeResponse(200)
+        response.content = u'<name>Jérôme</name>'.encode('iso-8859-1')
+        server = build_configured_server(FakeSession([response]))
+        server.charsets = ['iso-8859-1']
+        endpoint = server._get_balancer().endpoints[0]
+        endpoint.encoding = 'utf-8'
+
+        assert server.sendRESTRequest(url='/identityAPI/getUsers') == u'<name>Jérôme</name>'
+        assert endpoint.encoding == 'iso-8859-1'
+
+    def test_encoding_guessed_not_kept(self):
+        """ A single-byte charset reached by guessing is not kept, the next UTF-8 responses are read as such """
+        latin = FakeResponse(200)
+        latin.content = u'<name>J\xe9r\xf4me \u201c</name>'.encode('windows-1252')
+        utf8 = FakeResponse(200)
+        utf8.content = u'<a>\xe9t\xe9</a>'.encode('utf-8')
+        server = build_configured_server(FakeSession([latin, utf8]))
+        endpoint = server._get_balancer().endpoints[0]
+
+        assert server.sendRESTRequest(url='/identityAPI/getUsers') == u'<name>J\xe9r\xf4me \u201c</name>'
+        assert endpoint.encoding is None
+        assert server.sendRESTRequest(url='/identityAPI/getUsers') == u'<a>\xe9t\xe9</a>'
+        assert endpoint.encoding == 'utf-8'
+
+    def test_stream_encoding(self):
+        """ A streamed body is decoded with the charsets of the server handle, and given UTF-8 encoded to the parser """
+        response = FakeResponse(200)
+        response.raw = io.BytesIO(build_xml_set([build_bonita_user_xml(u'user uuid', u'pass', u'j\xe9r\xf4me')]).encode('iso-8859-1'))
+        server = build_configured_server(FakeSession([response]))
+        server.charsets = ['iso-8859-1']
+
+        users = BonitaUser.find_all(server=server)
+
+        assert users[0].username == u'j\xe9r\xf4me'
+        assert server._get_balancer().endpoints[0].encoding == 'iso8859-1'
+
+    def test_stream_encoding_guessed(self):
+        """ The charset of a streamed body is guessed again from the chunk which fails to decode """
+        body = u'<set>' + u'<user><username>jdoe</username></user>' * 10 + u'<user><username>j\xe9r\xf4me</username></user></set>'
+        endpoint = build_configured_server()._get_balancer().endpoints[0]
+        stream = _DecodedStream(io.BytesIO(body.encode('iso-8859-1')), endpoint, [])
+        stream.CHUNK_SIZE = 7
+
+        assert [xml_text(xml_find(user, 'username')) for user in iter_children(stream, 'user')][-1] == u'j\xe9r\xf4me'
+        assert stream.current_encoding == 'cp1252'
+        assert endpoint.encoding is None
+
+    def test_stream_encoding_not_kept(self):
+        """ A single-byte charset a streamed body fell back to is not kept, the next UTF-8 responses are read as such """
+        streamed = FakeResponse(200)
+        # A single invalid byte in an otherwise UTF-8 body
+        body = build_xml_set([u'<user><username>j\xe9r\xf4me</username></user>']).encode('utf-8').replace('me<', 'me\xff<')
+        streamed.raw = io.BytesIO(body)
+        response = FakeResponse(200)
+        response.content = u'<a>\xe9t\xe9</a>'.encode('utf-8')
+        server = build_configured_server(FakeSession([streamed, response]))
+
+        server.sendRESTRequest(url='/identityAPI/getUsers', stream=True).read()
+
+        assert server._get_balancer().endpoints[0].encoding is None
+        assert server.sendRESTRequest(url='/identityAPI/getUsers') == u'<a>\xe9t\xe9</a>'
+
+
+class TestErrors(TestCase):
+    """ Test the errors raised from the error bodies of Bonita server """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def send(self, body):
+        server = build_configured_server(FakeSession([FakeResponse(500, body)]))
+        server.sendRESTRequest(url='/identityAPI/getUser/unknown')
+
+    def test_not_found(self):
+        """ A *NotFoundException raises its typed BonitaNotFoundError """
+        try:
+            self.send(build_dumb_bonita_error_body('UserNotFoundException', code='404', message=u'unknown'))
+        except UserNotFoundError as err:
+            assert (err.code, err.message) == (404, u'unknown')
+            assert err.bonita_exception == u'org.ow2.bonita.facade.exception.UserNotFoundException'
+        else:
+            assert False, 'UserNotFoundError not raised'
+
+    @raises(BonitaNotFoundError)
+    def test_other_not_found(self):
+        """ Any other *NotFoundException raises a BonitaNotFoundError """
+        self.send(build_dumb_bonita_error_body('org.ow2.bonita.facade.exception.ActivityNotFoundException'))
+
+    def test_error(self):
+        """ Other exceptions raise a BonitaHTTPError """
+        try:
+            self.send(build_dumb_bonita_error_body('java.lang.IllegalArgumentException', message=u'bad'))
+        except BonitaHTTPError as err:
+            assert not isinstance(err, BonitaNotFoundError)
+            assert (err.code, err.message) == (500, u'bad')
+        else:
+            assert False, 'BonitaHTTPError not raised'
+
+    @raises(UnexpectedResponseError)
+    def test_unexpected(self):
+        """ A body without XML is unexpected """
+        self.send(u'Internal Server Error')
+
+
+class TestCreate(TestCase):
+    """ Test the creation of independent server handles """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_create(self):
+        """ Create two independent server handles """
+        prod = BonitaServer.create('prod', 9090, 'restuser', 'restbpm', pool_maxsize=4)
+        preprod = BonitaServer.create('preprod', 8080, 'otheruser', 'otherbpm')
+
+        assert isinstance(prod, BonitaServer)
+        assert prod is not preprod
+        assert prod is not BonitaServer.get_instance()
+        assert prod.host == 'prod'
+        assert preprod.port == 8080
+        assert prod._session is not preprod._session
+        assert preprod._session.auth.username == 'otheruser'
+        assert prod._session.get_adapter('http://prod:9090/')._pool_maxsize == 4
+        assert prod._ready is True
+
+        prod.close()
+        preprod.close()
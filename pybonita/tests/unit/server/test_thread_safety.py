@@ -0,0 +1,112 @@
+#-*- coding: utf-8 -*-
+import threading
+
+from pybonita import BonitaServer
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server
+
+
+class RecordingSession(FakeSession):
+    """ FakeSession recording the thread each call is made from """
+
+    def post(self, url, data=None, **kwargs):
+        kwargs['thread'] = threading.current_thread().name
+        return super(RecordingSession, self).post(url, data, **kwargs)
+
+
+def run_threads(target, count):
+    """ Start count threads running target at the same time, and wait for them """
+    start = threading.Event()
+    errors = []
+
+    def run():
+        start.wait()
+        try:
+            target()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run, name='worker-%s' % i) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+
+    return errors
+
+
+class TestThreadSafety(TestCase):
+    """ Hammer the server transport from many threads """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_get_instance(self):
+        """ The singleton is created only once, even when first requested from many threads """
+        saved = BonitaServer.get_instance()
+        del BonitaServer._instance
+        instances = []
+
+        try:
+            errors = run_threads(lambda: instances.append(BonitaServer.get_instance()), 50)
+        finally:
+            BonitaServer._instance = saved
+
+        assert errors == []
+        assert len(instances) == 50
+        assert len(set(id(instance) for instance in instances)) == 1
+
+    def test_send_requests(self):
+        """ Send requests on behalf of different users from many threads, with a shared data dict """
+        session = RecordingSession([FakeResponse(200, u'<uuid>1</uuid>')])
+        server = build_configured_server(session)
+        shared_data = {'hierarchy': ['platform']}
+
+        def send():
+            for i in range(40):
+                server.sendRESTRequest(url='/identityAPI/getGroupUsingPath',
+                                       user=threading.current_thread().name, data=shared_data)
+
+        errors = run_threads(send, 50)
+
+        assert errors == []
+        assert shared_data == {'hierarchy': ['platform']}
+        assert len(session.calls) == 50 * 40
+        for call in session.calls:
+            assert call['data']['options'] == u'user:%s' % call['kwargs']['thread']
+        assert server._get_balancer().endpoints[0].outstanding == 0
+
+    def test_thread_sessions(self):
+        """ With the thread session scope, each thread uses its own session """
+        server = build_configured_server()
+        server._setup_session(session_scope='thread')
+        # Coalesced requests would be sent through the session of another thread
+        server.coalesce_reads = False
+        sessions = []
+
+        def build_session():
+            session = RecordingSession([FakeResponse(200, u'<uuid>1</uuid>')])
+            sessions.append(session)
+            return session
+        server._build_session = build_session
+
+        def send():
+            for i in range(10):
+                server.sendRESTRequest(url='/identityAPI/getUsers')
+
+        errors = run_threads(send, 20)
+
+        assert errors == []
+        assert len(sessions) == 20
+        for session in sessions:
+            assert len(session.calls) == 10
+            assert len(set(call['kwargs']['thread'] for call in session.calls)) == 1
+
+        server.close()
+
+        assert all(session.closed for session in sessions)
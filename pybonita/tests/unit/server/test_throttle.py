@@ -0,0 +1,145 @@
+#-*- coding: utf-8 -*-
+import threading
+import time
+
+from nose.tools import raises
+
+from pybonita import BonitaServer
+from pybonita.throttle import TokenBucket, Throttle, UNLIMITED, api_family
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server
+
+
+class ConcurrencySession(FakeSession):
+    """ FakeSession recording the highest number of requests in flight at once """
+
+    def __init__(self, responses=None):
+        super(ConcurrencySession, self).__init__(responses)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, data=None, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return super(ConcurrencySession, self).post(url, data, **kwargs)
+
+
+class TestTokenBucket(TestCase):
+    """ Test the TokenBucket rate limiter """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_burst(self):
+        """ Requests within the burst are not delayed, the next ones wait in order """
+        bucket = TokenBucket(rate=10, burst=3)
+        delays = []
+        bucket._sleep = delays.append
+
+        for i in range(5):
+            bucket.acquire()
+
+        assert len(delays) == 2
+        assert 0.09 < delays[0] <= 0.1
+        assert 0.19 < delays[1] <= 0.2
+
+    @raises(ValueError)
+    def test_invalid_rate(self):
+        """ The rate must be positive """
+        TokenBucket(rate=0)
+
+
+class TestThrottle(TestCase):
+    """ Test the Throttle """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_api_family(self):
+        """ Get the REST API of a URL """
+        assert api_family('/identityAPI/getUsers') == 'identityAPI'
+        assert api_family('/queryRuntimeAPI/getProcessInstances/x') == 'queryRuntimeAPI'
+
+    def test_unlimited(self):
+        """ A Throttle without limits never waits """
+        with UNLIMITED:
+            with UNLIMITED:
+                pass
+
+        assert UNLIMITED.bucket is None
+
+    @raises(ValueError)
+    def test_invalid_concurrency(self):
+        """ max_concurrency must be a positive integer """
+        Throttle(max_concurrency=0)
+
+
+class TestServerThrottle(TestCase):
+    """ Test the limits of the server transport """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def test_configure(self):
+        """ Configure the limits of the endpoints and REST APIs """
+        server = BonitaServer.create(['node1', 'node2'], 9090, 'restuser', 'restbpm',
+                                     endpoint_limits={'rate': 50, 'max_concurrency': 8},
+                                     api_limits={'identityAPI': {'max_concurrency': 2}})
+
+        endpoints = server._get_balancer().endpoints
+        assert endpoints[0].throttle is not endpoints[1].throttle
+        assert endpoints[0].throttle.max_concurrency == 8
+        assert endpoints[0].throttle.bucket.rate == 50
+        assert server._api_throttles['identityAPI'].max_concurrency == 2
+
+        server.close()
+
+    def send_concurrently(self, server, url, count):
+        threads = [threading.Thread(target=server.sendRESTRequest, kwargs={'url': url, 'data': {'uuid': str(i)}})
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_api_concurrency(self):
+        """ Requests to a REST API wait when its maximum concurrency is reached """
+        session = ConcurrencySession([FakeResponse(200, u'<user/>')])
+        server = build_configured_server(session)
+        server._api_throttles = {'identityAPI': Throttle(max_concurrency=2)}
+
+        self.send_concurrently(server, '/identityAPI/addUser', 10)
+
+        assert len(session.calls) == 10
+        assert session.max_in_flight <= 2
+
+    def test_endpoint_concurrency(self):
+        """ Requests to an endpoint wait when its maximum concurrency is reached """
+        session = ConcurrencySession([FakeResponse(200, u'<user/>')])
+        server = build_configured_server(session)
+        server._get_balancer().endpoints[0].throttle = Throttle(max_concurrency=1)
+
+        self.send_concurrently(server, '/runtimeAPI/instantiateProcess/x', 5)
+
+        assert len(session.calls) == 5
+        assert session.max_in_flight == 1
+        assert server._get_balancer().endpoints[0].outstanding == 0
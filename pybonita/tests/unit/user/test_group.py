@@ -58,6 +58,22 @@ class TestInstanciateFromXML(TestCase):
         assert group.parent.uuid == u'parent uuid'
         assert group.parent.parent is None
 
+    def test_lazy_parent(self):
+        """ The parent of a group is built on first access only, unless set before """
+        parent_xml = build_bonita_group_xml('parent uuid', 'parent name', as_parent=True)
+        xml = build_bonita_group_xml('group uuid', 'group name', parent=parent_xml)
+
+        group = BonitaGroup._instanciate_from_xml(xml)
+
+        assert group._lazy_node is not None
+        assert group.parent.uuid == u'parent uuid'
+        assert group._lazy_node is None
+
+        group = BonitaGroup._instanciate_from_xml(xml)
+        group.parent = None
+
+        assert group.parent is None
+
     def test_group_with_several_parents(self):
         """ Instanciate a Boinita group with a hierarchy of parents """
         # Build up parents and child XML
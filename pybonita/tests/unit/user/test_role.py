@@ -5,7 +5,7 @@ from nose.tools import raises
 from pybonita import BonitaServer
 from pybonita.exception import XMLSchemaParseError
 from pybonita.tests import TestCase, TestWithMockedServer, build_dumb_bonita_error_body,\
-    build_bonita_role_xml
+    build_bonita_role_xml, FakeResponse, FakeSession, build_configured_server
 from pybonita.user import BonitaRole
 
 
@@ -163,3 +163,20 @@ class TestGetRoleByUUID(TestWithMockedServer):
 
         assert isinstance(role,BonitaRole)
         assert role.uuid == '996633'
+
+
+class TestGetRoleWithServerHandle(TestCase):
+    """ Test retrieving a role through an independent server handle """
+
+    def test_get_by_name_with_server(self):
+        """ Retrieve a role by name with an explicit server handle """
+        xml = build_bonita_role_xml('role uuid','user',description='a role desc',label='User')
+        session = FakeSession([FakeResponse(200, xml)])
+        server = build_configured_server(session, host='preprod')
+
+        role = BonitaRole.get(name='user', server=server)
+
+        assert isinstance(role,BonitaRole)
+        assert role.uuid == u'role uuid'
+        assert role._get_server() is server
+        assert session.calls[0]['url'] == 'http://preprod:9090/bonita-server-rest/API/identityAPI/getRole/user'
@@ -0,0 +1,165 @@
+#-*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+
+from nose.tools import raises
+
+from pybonita.snapshot import DirectorySnapshot
+from pybonita.user import BonitaUser, BonitaGroup, BonitaRole, BonitaMembership
+from pybonita.tests import TestCase, FakeResponse, FakeSession, build_configured_server, build_xml_set,\
+    build_bonita_user_xml, build_bonita_group_xml, build_bonita_membership_xml,\
+    build_dumb_bonita_error_body
+
+
+def build_directory_xml():
+    """ Build the XML of a directory of 3 users : 2 members of /platform/team, 1 without membership """
+    parent_xml = build_bonita_group_xml(u'platform uuid', u'platform', as_parent=True)
+    group_xml = build_bonita_group_xml(u'team uuid', u'team', parent=parent_xml, with_class=True)
+    role = BonitaRole(u'member', u'', u'')
+    role.uuid = u'member uuid'
+    other_role = BonitaRole(u'manager', u'', u'')
+    other_role.uuid = u'manager uuid'
+
+    users_xml = []
+    for (username, user_role) in [(u'jdoe', role), (u'msmith', other_role)]:
+        membership_xml = build_bonita_membership_xml(u'membership %s' % user_role.name, user_role, group_xml)
+        user_xml = build_bonita_user_xml(u'%s uuid' % username, u'pass', username, {'firstName': u'John'})
+        # Insert the membership in the user
+        users_xml.append(user_xml.replace(u'</user>', u'<memberships>%s</memberships></user>' % membership_xml))
+    users_xml.append(build_bonita_user_xml(u'alone uuid', u'pass', u'alone'))
+
+    return build_xml_set(users_xml)
+
+
+class TestDirectorySnapshot(TestCase):
+    """ Test the SQLite snapshot of the Bonita identity directory """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'bonita.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def build_snapshot(self, responses=None):
+        session = FakeSession(responses or [FakeResponse(200, build_directory_xml())])
+        return (DirectorySnapshot(self.path, server=build_configured_server(session)), session)
+
+    def test_refresh(self):
+        """ Take a snapshot of the directory, stamped with its time """
+        (snapshot, session) = self.build_snapshot()
+
+        assert snapshot.snapshot_time is None
+        assert snapshot.refresh() == 3
+        assert snapshot.snapshot_time is not None
+        assert [call['url'].split('/identityAPI/')[1] for call in session.calls] == ['getUsers']
+
+    def test_get(self):
+        """ Retrieve the entities of the snapshot as entities of the server handle """
+        (snapshot, session) = self.build_snapshot()
+        snapshot.refresh()
+
+        user = snapshot.get_user(username=u'jdoe')
+        group = snapshot.get_group(path=u'/platform/team')
+        role = snapshot.get_role(name=u'member')
+
+        assert isinstance(user, BonitaUser)
+        assert (user.uuid, user.firstName) == (u'jdoe uuid', u'John')
+        assert user._server.server is snapshot.server
+        assert user.memberships[0].group is group
+        assert user.roles == [role]
+        assert group.parent.name == u'platform'
+        assert snapshot.get_group(path=u'platform').uuid == u'platform uuid'
+        assert snapshot.get_user(uuid=u'msmith uuid').username == u'msmith'
+        assert snapshot.get_membership(role_uuid=u'member uuid', group_uuid=u'team uuid').uuid == u'membership member'
+        assert isinstance(snapshot.get_membership(uuid=u'membership manager'), BonitaMembership)
+        assert snapshot.get_role(name=u'unknown') is None
+        assert len(session.calls) == 1
+
+    def test_not_shared_live(self):
+        """ Entities of the snapshot are not shared with the live retrievals through the server handle """
+        group_xml = build_bonita_group_xml(u'team uuid', u'team', description=u'live')
+        (snapshot, session) = self.build_snapshot([FakeResponse(200, build_directory_xml()), FakeResponse(200, group_xml)])
+        snapshot.refresh()
+
+        group = snapshot.get_group(path=u'/platform/team')
+        live_group = BonitaGroup.get_by_uuid(u'team uuid', server=snapshot.server)
+
+        assert live_group is not group
+        assert live_group.description == u'live'
+        assert snapshot.get_group(uuid=u'team uuid') is group
+
+    @raises(TypeError)
+    def test_get_unknown_param(self):
+        """ Entities are retrieved by their known params only """
+        (snapshot, session) = self.build_snapshot()
+        snapshot.get_role(label=u'member')
+
+    def test_find_users(self):
+        """ Retrieve all the users of the snapshot, or those of a role or a group """
+        (snapshot, session) = self.build_snapshot()
+        snapshot.refresh()
+        group = snapshot.get_group(path=u'/platform/team')
+        role = snapshot.get_role(name=u'manager')
+
+        assert [user.username for user in snapshot.find_users()] == [u'alone', u'jdoe', u'msmith']
+        assert [user.username for user in snapshot.find_users(group=group)] == [u'jdoe', u'msmith']
+        assert [user.username for user in snapshot.find_users(role=role, group=group)] == [u'msmith']
+
+    def test_persistent(self):
+        """ The snapshot is read back from disk, without reaching the server """
+        (snapshot, session) = self.build_snapshot()
+        snapshot.refresh()
+
+        (other, other_session) = self.build_snapshot()
+
+        assert other.snapshot_time == snapshot.snapshot_time
+        assert other.get_user(username=u'alone').uuid == u'alone uuid'
+        assert other_session.calls == []
+
+    def test_refresh_failed(self):
+        """ The previous snapshot is kept when the directory can't be retrieved """
+        (snapshot, session) = self.build_snapshot([FakeResponse(200, build_directory_xml()),
+                                                   FakeResponse(500, build_dumb_bonita_error_body('java.lang.Exception'))])
+        snapshot.refresh()
+        snapshot_time = snapshot.snapshot_time
+
+        try:
+            snapshot.refresh()
+        except Exception:
+            pass
+
+        assert snapshot.snapshot_time == snapshot_time
+        assert len(snapshot.find_users()) == 3
+
+    def test_start(self):
+        """ The snapshot is taken in the background when missing """
+        (snapshot, session) = self.build_snapshot()
+
+        snapshot.start(interval=3600)
+        deadline = time.time() + 5
+        while snapshot.snapshot_time is None and time.time() < deadline:
+            time.sleep(0.01)
+        snapshot.stop()
+
+        assert len(snapshot.find_users()) == 3
+
+    def test_start_fresh(self):
+        """ A fresh snapshot is not taken again when starting """
+        (snapshot, session) = self.build_snapshot()
+        snapshot.refresh()
+
+        snapshot.start(interval=3600)
+        snapshot.stop()
+
+        assert len(session.calls) == 1
@@ -1,12 +1,17 @@
 #-*- coding: utf-8 -*-
+import types
+
 from lxml.etree import XMLSchemaParseError
 from nose.tools import raises, assert_raises
 
+import pybonita.user
 from pybonita import BonitaServer
 from pybonita.exception import BonitaException
 from pybonita.tests import TestCase, TestWithMockedServer, build_dumb_bonita_error_body,\
     build_bonita_user_xml, build_xml_set, build_xml_list
+from pybonita.parser import parse_xml
 from pybonita.user import BonitaUser, BonitaRole, BonitaGroup, BonitaMembership
+from pybonita.utils import xml_find
 
 
 class TestConstructor(TestCase):
@@ -149,6 +154,53 @@ class TestInstanciateFromXML(TestCase):
         assert u'mygroup1' in group_names
         assert u'mygroup2' in group_names
 
+    def test_parsed_once(self):
+        """ The XML of a user, with its memberships, roles and groups, is parsed only once """
+        role = BonitaRole('myrole', '', '')
+        role.uuid = '1234'
+        group = BonitaGroup('mygroup', '', '')
+        group.uuid = '2345'
+        membership = BonitaMembership(role, group)
+        membership.uuid = 'uuid-12'
+        xml = build_bonita_user_xml('user uuid', 'user pass', 'user name', {'memberships': [membership]})
+
+        parse_xml = pybonita.user.parse_xml
+        parsed = []
+        pybonita.user.parse_xml = lambda xml: parsed.append(xml) or parse_xml(xml)
+
+        try:
+            user = BonitaUser._instanciate_from_xml(xml)
+        finally:
+            pybonita.user.parse_xml = parse_xml
+
+        assert len(parsed) == 1
+        assert user.memberships[0].group.name == u'mygroup'
+        assert user.memberships[0].role.name == u'myrole'
+
+    def test_lazy_memberships(self):
+        """ Memberships, roles and groups of a user are built on first access only """
+        role = BonitaRole('myrole', '', '')
+        role.uuid = '1234'
+        group = BonitaGroup('mygroup', '', '')
+        group.uuid = '2345'
+        membership = BonitaMembership(role, group)
+        membership.uuid = 'uuid-12'
+        xml = build_bonita_user_xml('user uuid', 'user pass', 'user name', {'memberships': [membership]})
+        node = xml_find(parse_xml(xml), 'user')
+
+        user = BonitaUser._instanciate_from_node(node)
+
+        assert isinstance(user._lazy_node, str)
+        assert [group.name for group in user.groups] == [u'mygroup']
+        assert user._lazy_node is None
+        assert [role.name for role in user.roles] == [u'myrole']
+        assert user.is_unchanged is True
+
+        user = BonitaUser._instanciate_from_node(node, lazy=False)
+
+        assert user._lazy_node is None
+        assert len(user._memberships) == 1
+
 # IMPROVE: check personal_infos
 # IMPROVE: check professional_infos
 
@@ -342,6 +394,19 @@ class TestFindAll(TestWithMockedServer):
         assert sorted_users[0].uuid == u'112345'
         assert sorted_users[1].uuid == u'996633'
 
+    def test_iter_all(self):
+        """ Retrieve all users one at a time """
+        BonitaServer.use('localhost', 9090, 'restuser', 'restbpm')
+        url = '/identityAPI/getUsers'
+        user1_xml = build_bonita_user_xml(uuid='996633', password='', username='user1')
+        user2_xml = build_bonita_user_xml(uuid='112345', password='', username='user2')
+        BonitaServer.set_response_list([[url, 200, build_xml_set([user1_xml, user2_xml])]])
+
+        users = BonitaUser.iter_all()
+
+        assert isinstance(users, types.GeneratorType)
+        assert [user.username for user in users] == [u'user1', u'user2']
+
 
 class TestFindByRole(TestWithMockedServer):
 
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+__all__ = ['TokenBucket', 'Throttle', 'api_family']
+
+
+def api_family(url):
+    """ Name of the REST API a method belongs to, for example identityAPI for /identityAPI/getUsers """
+    return url.lstrip('/').split('/', 1)[0]
+
+
+class TokenBucket(object):
+    """ Limit the rate of requests, while allowing short bursts.
+
+    The bucket holds up to burst tokens and is refilled with rate tokens per
+    second. Each request takes a token. When the bucket is empty, requests
+    wait for their token in arrival order instead of being rejected.
+
+    """
+
+    def __init__(self, rate, burst=None):
+        """ Build up a new TokenBucket
+
+        :param rate: requests allowed per second
+        :type rate: float
+        :param burst: requests which can be sent at once (default : rate, at least 1)
+        :type burst: float
+        :raise ValueError: if rate is not positive
+
+        """
+        if rate <= 0:
+            raise ValueError(u"rate must be positive")
+
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        self.tokens = self.burst
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+        self._sleep = time.sleep
+
+    def acquire(self):
+        """ Take a token, waiting for it if the bucket is empty
+
+        :return: float -- seconds waited
+
+        """
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            # The token is reserved now, so that waiting requests are served in order
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if delay > 0:
+            self._sleep(delay)
+
+        return delay
+
+
+class Throttle(object):
+    """ Bound the rate and the concurrency of the requests sent through it.
+
+    A Throttle is used as a context manager around the sending of a request :
+    it waits for a free slot when max_concurrency requests are already in
+    flight, then for a token of the TokenBucket when rate is given. A Throttle
+    without rate nor max_concurrency never waits.
+
+    """
+
+    def __init__(self, rate=None, burst=None, max_concurrency=None):
+        """ Build up a new Throttle
+
+        :param rate: requests allowed per second (default : unlimited)
+        :type rate: float
+        :param burst: requests which can be sent at once (default : see TokenBucket)
+        :type burst: float
+        :param max_concurrency: requests allowed in flight at the same time (default : unlimited)
+        :type max_concurrency: int
+        :raise ValueError: if max_concurrency is not a positive integer
+
+        """
+        if max_concurrency is not None and (type(max_concurrency) != int or max_concurrency < 1):
+            raise ValueError(u"max_concurrency must be a positive integer")
+
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency is not None else None
+
+    def __enter__(self):
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+        return False
+
+
+# Throttle of the endpoints and REST APIs without limits
+UNLIMITED = Throttle()
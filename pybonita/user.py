@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from bs4 import BeautifulSoup
 from lxml.etree import XMLSchemaParseError
 
-from . import BonitaServer
-from .exception import BonitaHTTPError, BonitaXMLError, BonitaException
-from .object import BonitaObject
-from .utils import set_if_available, xml_find, xml_find_all,\
+from .exception import BonitaXMLError, BonitaException, UserNotFoundError, GroupNotFoundError,\
+    RoleNotFoundError, MembershipNotFoundError
+from .cache import cached_lookup
+from .mapping import Mapping, Field, EntityField
+from .object import BonitaObject, async_method
+from .parser import parse_xml, iter_children
+from .record import UserRecord
+from .utils import xml_find, xml_find_all, xml_text,\
     TrackableList, TrackableObject, TrackableDict
 
 __all__ = ['BonitaUser', 'BonitaGroup', 'BonitaRole', 'BonitaMembership']
@@ -19,6 +22,21 @@ class BonitaUser(BonitaObject, TrackableObject):
     # Optional properties for a BonitaUser
     USER_PROPERTIES = ['firstName', 'lastName', 'title', 'jobTitle']
 
+    # Region of the LookupCache holding the lookups of users
+    CACHE_REGION = 'user'
+
+    # Cached lookups of a user, see BonitaObject._invalidate_cache
+    CACHE_KEYS = [('get_by_uuid', 'uuid'), ('get_by_username', 'username')]
+
+    # Users are modified by the callers retrieving them : each one gets its own
+    SHARED = False
+
+    # How a BonitaUser is read from its XML element, memberships on first access
+    MAPPING = Mapping([Field('username'), Field('password'), Field('uuid')] +
+                      [Field(name, required=False) for name in USER_PROPERTIES] +
+                      [EntityField('memberships/membership', lambda: BonitaMembership, attribute='memberships',
+                                   many=True, lazy=True)])
+
     def __init__(self, username, password, **kwargs):
         """ Build up a new BonitaUser
 
@@ -59,6 +77,7 @@ class BonitaUser(BonitaObject, TrackableObject):
 
     def _get_memberships(self):
         """ Retrieve the memberships for a BonitaUser """
+        self._load_lazy_fields()
         return self._memberships
 
     memberships = property(_get_memberships, None, None)
@@ -69,6 +88,7 @@ class BonitaUser(BonitaObject, TrackableObject):
         :return: list(BonitaRole)
 
         """
+        self._load_lazy_fields()
         return list(self._roles)
 
     roles = property(_get_roles, None, None)
@@ -79,6 +99,7 @@ class BonitaUser(BonitaObject, TrackableObject):
         :return: list(BonitaGroup)
 
         """
+        self._load_lazy_fields()
         return list(self._groups)
 
     groups = property(_get_groups, None, None)
@@ -101,11 +122,13 @@ class BonitaUser(BonitaObject, TrackableObject):
         super(BonitaUser, self).clear(attribute)
 
     @classmethod
-    def _instanciate_from_xml(cls, xml):
+    def _instanciate_from_xml(cls, xml, server=None):
         """ Instanciate a BonitaUser from XML
 
         :param xml: the XML description of a user
         :type xml: unicode
+        :param server: server handle the user is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: BonitaUser
         :raise lxml.etree.XMLSchemaParseError: given XML does not belong to
             Bonita XML schema for User
@@ -114,34 +137,42 @@ class BonitaUser(BonitaObject, TrackableObject):
         if not isinstance(xml, (str, unicode)):
             raise TypeError('xml must be a string or unicode not %s' % (type(xml)))
 
-        soup = BeautifulSoup(xml, 'xml')
+        soup = parse_xml(xml)
+
+        return cls._instanciate_from_node(xml_find(soup, 'user'), server=server)
+
+    @classmethod
+    def _instanciate_from_node(cls, user_soup, server=None, lazy=True):
+        """ Instanciate a BonitaUser from its already parsed XML element
+
+        :param user_soup: the User element, as found in a document built by pybonita.parser.parse_xml
+        :type user_soup: lxml.etree._Element or bs4.element.Tag
+        :param server: server handle the user is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :param lazy: build the memberships, with their roles and groups, on first access only ?
+        :type lazy: bool (default : True)
+        :return: BonitaUser
+        :raise lxml.etree.XMLSchemaParseError: given element does not belong to
+            Bonita XML schema for User
 
+        """
         try:
+            fields = cls.MAPPING.read(user_soup, server=server, eager=not lazy)
+
             # First thing first : instanciate a new BonitaUser with username and password
-            user_soup = xml_find(soup, 'user')
-            username = xml_find(user_soup, 'username').string
-            password = xml_find(user_soup, 'password').string
-            user = BonitaUser(username, password)
+            user = BonitaUser(fields['username'], fields['password'])
+            user._bind_server(server)
 
             # Main properties now
-            user._uuid = xml_find(user_soup, 'uuid').string
+            user._uuid = fields['uuid']
 
             # Other properties then
-            set_if_available(user, user_soup, cls.USER_PROPERTIES)
+            for name in cls.USER_PROPERTIES:
+                if name in fields:
+                    setattr(user, name, fields[name])
 
             # Memberships
-            tag_memberships = xml_find_all(user_soup, 'membership')
-            for tag_membership in tag_memberships:
-                membership = BonitaMembership._instanciate_from_xml(unicode(tag_membership))
-                # Add membership and also try to extend sets of roles and groups
-                print 'membership : %s, role.name : %s, group.name: %s' % (membership, membership.role.name, membership.group.name)
-                user._memberships.append(membership)
-                user._roles.add(membership.role)
-                user._groups.add(membership.group)
-                print 'roles : %s' % (user._roles)
-                print 'groups : %s' % (user._groups)
-            # Clean the state of user._memberships
-            user._memberships.clear_state()
+            user._init_lazy_fields(user_soup, fields, lazy)
 
         except XMLSchemaParseError:
             raise
@@ -151,6 +182,24 @@ class BonitaUser(BonitaObject, TrackableObject):
 
         return user
 
+    def _set_lazy_fields(self, fields):
+        """ Set the memberships read by MAPPING, with their roles and groups """
+        memberships = TrackableList()
+        roles = set()
+        groups = set()
+        for membership in fields['memberships']:
+            # Add membership and also try to extend sets of roles and groups
+            memberships.append(membership)
+            roles.add(membership.role)
+            groups.add(membership.group)
+        # Clean the state of memberships
+        memberships.clear_state()
+
+        # Reading the memberships does not modify the user
+        object.__setattr__(self, '_memberships', memberships)
+        object.__setattr__(self, '_roles', roles)
+        object.__setattr__(self, '_groups', groups)
+
 #<User>
 #  <dbid>0</dbid>
 # <uuid>8d3b69f2-2835-43c9-b3bc-e261b6ed9372</uuid>
@@ -287,21 +336,32 @@ class BonitaUser(BonitaObject, TrackableObject):
 #  </memberships>
 #</User>
 
-    def save(self, user=None, variables=None):
+    def save(self, user=None, variables=None, server=None):
         """ Save a BonitaUser : sends data to create a BonitaUser on the server.
         It also create all associated resources, like BonitaMembership.
 
+        :param server: server handle to save the user to (default : the one the user is bound to)
+        :type server: BonitaServer
+
         """
+        # Bind to the given server handle, if any
+        self._get_server(server)
+
         # If nothing modified, nothing to do
         if self.is_unchanged:
             return
 
-        # Is this a new user ?
-        if self.uuid is None:
-            self._create_user(user=user)
+        try:
+            # Is this a new user ?
+            if self.uuid is None:
+                self._create(user=user)
+
+            # Now we can deal with all other attributes
+            self._update(user=user)
+        finally:
+            self._invalidate_cache()
 
-        # Now we can deal with all other attributes
-        self._update(user=user)
+    save_async = async_method('save')
 
     def _create(self, user=None):
         """ Create a new BonitaUser.
@@ -316,14 +376,14 @@ class BonitaUser(BonitaObject, TrackableObject):
         data['password'] = self.password
 
         # Call the BonitaServer
-        xml = BonitaServer.get_instance().sendRESTRequest(url=url, user=user, data=data)
+        xml = self._get_server().sendRESTRequest(url=url, user=user, data=data)
 
         # Extract UUID of newly created object
-        soup = BeautifulSoup(xml, 'xml')
-        instances = soup.findAll("uuid")
+        soup = parse_xml(xml)
+        instances = xml_find_all(soup, 'uuid')
         if len(instances) != 1:
             raise Exception  # fixme: raise clear Exception
-        self._uuid = instances[0].text
+        self._uuid = xml_text(instances[0])
 
         # Mark as cleared of any modification
         self.clear()
@@ -398,7 +458,7 @@ class BonitaUser(BonitaObject, TrackableObject):
         data['room'] = self.professional_infos.get('room', '')
 
         # Call the BonitaServer
-        BonitaServer.get_instance().sendRESTRequest(url=url, user=user, data=data)
+        self._get_server().sendRESTRequest(url=url, user=user, data=data)
 
         # Mark as cleared of any modification
         self.professional_infos.clear_state()
@@ -436,7 +496,7 @@ class BonitaUser(BonitaObject, TrackableObject):
         data['room'] = self.personal_infos.get('room', '')
 
         # Call the BonitaServer
-        BonitaServer.get_instance().sendRESTRequest(url=url, user=user, data=data)
+        self._get_server().sendRESTRequest(url=url, user=user, data=data)
 
         # Mark as cleared of any modification
         self.personal_infos.clear_state()
@@ -461,7 +521,7 @@ class BonitaUser(BonitaObject, TrackableObject):
         data['password'] = self.password
 
         # Call the BonitaServer
-        BonitaServer.get_instance().sendRESTRequest(url=url, user=user, data=data)
+        self._get_server().sendRESTRequest(url=url, user=user, data=data)
 
         # Mark as cleared of any modification
         self.clear('password')
@@ -495,53 +555,53 @@ class BonitaUser(BonitaObject, TrackableObject):
         data['jobTitle'] = getattr(self, 'job_title', '')
 
         # Call the BonitaServer
-        BonitaServer.get_instance().sendRESTRequest(url=url, user=user, data=data)
+        self._get_server().sendRESTRequest(url=url, user=user, data=data)
 
         # Mark as cleared of any modification
         for attribute in self.BASE_ATTRIBUTES:
             self.clear(attribute)
 
     @classmethod
-    def get_by_username(cls, username):
+    @cached_lookup()
+    def get_by_username(cls, username, server=None):
         """ Retrieve a User with the username
 
         :param username: the username of the user to retrieve
         :type username: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getUser/' + username
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            if 'UserNotFoundException'.lower() in err.bonita_exception.lower():
-                return None
-            else:
-                raise
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except UserNotFoundError:
+            return None
 
-        user = cls._instanciate_from_xml(xml)
+        user = cls._instanciate_from_xml(xml, server=server)
 
         return user
 
     @classmethod
-    def get_by_uuid(cls, uuid):
+    @cached_lookup()
+    def get_by_uuid(cls, uuid, server=None):
         """ Retrieve a User with the UUID
 
         :param uuid: the UUID of the user to retrieve
         :type uuid: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getUserByUUID/' + uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            if 'UserNotFoundException'.lower() in err.bonita_exception.lower():
-                return None
-            else:
-                raise
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except UserNotFoundError:
+            return None
 
-        user = cls._instanciate_from_xml(xml)
+        user = cls._instanciate_from_xml(xml, server=server)
 
         return user
 
@@ -554,17 +614,23 @@ class BonitaUser(BonitaObject, TrackableObject):
         - username
         - uuid
 
+        A server handle can also be given with the server parameter.
+
         :raise TypeError: if call with unknown parameter
         :return: BonitaUser instance or None if not found
 
         """
+        server = kwargs.get('server')
+
         if 'username' in kwargs:
-            return cls.get_by_username(username=kwargs['username'])
+            return cls.get_by_username(username=kwargs['username'], server=server)
         if 'uuid' in kwargs:
-            return cls.get_by_uuid(uuid=kwargs['uuid'])
+            return cls.get_by_uuid(uuid=kwargs['uuid'], server=server)
 
         raise TypeError('called get_user with unknown param : %s' % (kwargs.keys()))
 
+    get_async = async_method('get')
+
     @classmethod
     def find(cls, **kwargs):
         """ Retrieve a list of User with given parameter
@@ -576,60 +642,72 @@ class BonitaUser(BonitaObject, TrackableObject):
         - role : BonitaRole
         - group : BonitaGroup
 
+        A server handle can also be given with the server parameter.
+
         :return: list of BonitaUser, possibly a void list
         :raise TypeError: if call with unknown parameter
 
         """
+        kwargs = dict(kwargs)
+        server = kwargs.pop('server', None)
+
         if len(kwargs) == 0:
             # Get all Users
-            return cls.find_all()
+            return cls.find_all(server=server)
         elif 'role' in kwargs and 'group' in kwargs:
-            return cls.find_by_role_and_group(role=kwargs['role'], group=kwargs['group'])
+            return cls.find_by_role_and_group(role=kwargs['role'], group=kwargs['group'], server=server)
         elif 'role' in kwargs:
-            return cls.find_by_role(kwargs['role'])
+            return cls.find_by_role(kwargs['role'], server=server)
         elif 'group' in kwargs:
-            return cls.find_by_group(kwargs['group'])
+            return cls.find_by_group(kwargs['group'], server=server)
         else:
             raise TypeError('some param(s) not supported : %s' % (kwargs.keys()))
 
+    find_async = async_method('find')
+
     @classmethod
-    def find_all(cls):
+    def find_all(cls, server=None, compact=False):
         """ Retrieve all Users.
 
-        :return: list of BonitaUser
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :param compact: retrieve compact, read-only users (see pybonita.record) ?
+        :type compact: bool (default : False)
+        :return: list of BonitaUser, or of UserRecord if compact
 
         """
-        url = "/identityAPI/getUsers"
-
-        try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except Exception:
-            raise
+        return list(cls.iter_all(server=server, compact=compact))
 
-        # Decode the XML response
-        soup = BeautifulSoup(xml, 'xml')
+    @classmethod
+    def iter_all(cls, server=None, compact=False):
+        """ Retrieve all Users one at a time.
+        The response is parsed while the users are consumed, so that memory
+        stays flat whatever the number of users.
 
-        users = []
-        try:
-            # Get the set of Users
-            set_soup = xml_find(soup, 'set')
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :param compact: retrieve compact, read-only users (see pybonita.record) ?
+        :type compact: bool (default : False)
+        :return: generator of BonitaUser, or of UserRecord if compact
 
-            users_tag = xml_find_all(set_soup, 'user')
-            for user_tag in users_tag:
-                user = BonitaUser._instanciate_from_xml(unicode(user_tag))
-                users.append(user)
+        """
+        url = "/identityAPI/getUsers"
 
-        except XMLSchemaParseError:
-            raise
+        # The list of users can be huge : let the parser read it from the connexion
+        stream = cls._resolve_server(server).sendRESTRequest(url=url, stream=True)
+        entity = UserRecord if compact else BonitaUser
 
-        return users
+        for user_tag in iter_children(stream, 'user'):
+            yield entity._instanciate_from_node(user_tag, server=server)
 
     @classmethod
-    def find_by_role(cls, role):
+    def find_by_role(cls, role, server=None):
         """ Retrieve all Users bound to a Role
 
         :param role: role the users must be bound to
         :type role: BonitaRole
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: list of BonitaUser
         :raise TypeError: if role not an instance of BonitaRole
 
@@ -640,21 +718,21 @@ class BonitaUser(BonitaObject, TrackableObject):
         url = "/identityAPI/getAllUsersInRole/" + role.uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
         except Exception:
             raise
 
         # Decode the XML response
-        soup = BeautifulSoup(xml, 'xml')
+        soup = parse_xml(xml)
 
         users = []
         try:
             # Get the list of Users
             list_soup = xml_find(soup, 'list')
 
-            users_tag = xml_find_all(list_soup, 'user')
+            users_tag = xml_find_all(list_soup, 'user', recursive=False)
             for user_tag in users_tag:
-                user = BonitaUser._instanciate_from_xml(unicode(user_tag))
+                user = BonitaUser._instanciate_from_node(user_tag, server=server)
                 users.append(user)
 
         except XMLSchemaParseError:
@@ -663,11 +741,13 @@ class BonitaUser(BonitaObject, TrackableObject):
         return users
 
     @classmethod
-    def find_by_group(cls, group):
+    def find_by_group(cls, group, server=None):
         """ Retrieve all Users bound to a Group
 
         :param group: group the users must be bound to
         :type group: BonitaGroup
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: list of BonitaUser
         :raise TypeError: if group not an instance of BonitaRole
 
@@ -678,21 +758,21 @@ class BonitaUser(BonitaObject, TrackableObject):
         url = "/identityAPI/getAllUsersInGroup/" + group.uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
         except Exception:
             raise
 
         # Decode the XML response
-        soup = BeautifulSoup(xml, 'xml')
+        soup = parse_xml(xml)
 
         users = []
         try:
             # Get the list of Users
             list_soup = xml_find(soup, 'list')
 
-            users_tag = xml_find_all(list_soup, 'user')
+            users_tag = xml_find_all(list_soup, 'user', recursive=False)
             for user_tag in users_tag:
-                user = BonitaUser._instanciate_from_xml(unicode(user_tag))
+                user = BonitaUser._instanciate_from_node(user_tag, server=server)
                 users.append(user)
 
         except XMLSchemaParseError:
@@ -701,13 +781,15 @@ class BonitaUser(BonitaObject, TrackableObject):
         return users
 
     @classmethod
-    def find_by_role_and_group(cls, role, group):
+    def find_by_role_and_group(cls, role, group, server=None):
         """ Retrieve all Users bound to a Role and a Group
 
         :param role: role the users must be bound to
         :type role: BonitaRole
         :param group: group the users must be bound to
         :type group: BonitaGroup
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: list of BonitaUser
         :raise TypeError: if group/role not an instance of BonitaGroup/BonitaRole
 
@@ -720,21 +802,21 @@ class BonitaUser(BonitaObject, TrackableObject):
         url = "/identityAPI/getAllUsersInRoleAndGroup/" + role.uuid + "/" + group.uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
         except Exception:
             raise
 
         # Decode the XML response
-        soup = BeautifulSoup(xml, 'xml')
+        soup = parse_xml(xml)
 
         users = []
         try:
             # Get the list of Users
             list_soup = xml_find(soup, 'list')
 
-            users_tag = xml_find_all(list_soup, 'user')
+            users_tag = xml_find_all(list_soup, 'user', recursive=False)
             for user_tag in users_tag:
-                user = BonitaUser._instanciate_from_xml(unicode(user_tag))
+                user = BonitaUser._instanciate_from_node(user_tag, server=server)
                 users.append(user)
 
         except XMLSchemaParseError:
@@ -765,26 +847,54 @@ class BonitaGroup(BonitaObject):
         self.label = label
         self.description = description
 
-        if parent is not None and not isinstance(parent, BonitaGroup):
+        self.parent = parent
+
+    # Region of the LookupCache holding the lookups of groups
+    CACHE_REGION = 'group'
+
+    # Cached lookups of a group, see BonitaObject._invalidate_cache
+    CACHE_KEYS = [('get_by_uuid', 'uuid')]
+
+    # How a BonitaGroup is read from its XML element, its parents on first access
+    MAPPING = Mapping([Field('description'), Field('name'), Field('label'), Field('uuid'),
+                       Field('dbid', required=False),
+                       EntityField('parentGroup', lambda: BonitaGroup, attribute='parent', required=False, lazy=True)])
+
+    def _get_parent(self):
+        self._load_lazy_fields()
+        return self._parent
+
+    def _set_parent(self, value):
+        if value is not None and not isinstance(value, BonitaGroup):
             raise TypeError('parent must be None or a BonitaGroup')
 
-        self.parent = parent
+        # The parent read on first access must not override the given one
+        self._load_lazy_fields()
+        self._parent = value
+
+    parent = property(_get_parent, _set_parent, None, u"parent BonitaGroup, None for the root group")
+
+    def _set_lazy_fields(self, fields):
+        """ Set the parent read by MAPPING """
+        self._parent = fields.get('parent')
 
     @classmethod
-    def _instanciate_from_xml(cls, xml, is_parent=False):
+    def _instanciate_from_xml(cls, xml, is_parent=False, server=None):
         """ Instanciate a BonitaGroup from XML
 
         :param xml: the XML description of a group
         :type xml: unicode
         :param is_parent: State that the XML provided describe a parent Group (default False)
         :type is_parent: bool
+        :param server: server handle the group is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: BonitaGroup
 
         """
         if not isinstance(xml, (str, unicode)):
             raise TypeError('xml must be a string or unicode not %s' % (type(xml)))
 
-        soup = BeautifulSoup(xml, 'xml')
+        soup = parse_xml(xml)
 
         try:
             # First thing first : instanciate a new BonitaGroup
@@ -792,34 +902,56 @@ class BonitaGroup(BonitaObject):
         except XMLSchemaParseError:
                 raise BonitaXMLError('xml does not seem to be for a Group')
 
+        return cls._instanciate_from_node(group_soup, server=server)
+
+    @classmethod
+    def _instanciate_from_node(cls, group_soup, server=None, lazy=True):
+        """ Instanciate a BonitaGroup, and its parents, from its already parsed XML element
+
+        :param group_soup: the Group (or parentGroup) element, as found in a document
+            built by pybonita.parser.parse_xml
+        :type group_soup: lxml.etree._Element or bs4.element.Tag
+        :param server: server handle the group is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :param lazy: build the parents on first access only ?
+        :type lazy: bool (default : True)
+        :return: BonitaGroup, shared with the other groups with the same uuid
+            retrieved through the server handle
+
+        """
+        new_group = cls._get_mapped(group_soup, server)
+        if new_group is not None:
+            if not lazy:
+                new_group._load_lazy_fields()
+            return new_group
+
         try:
-            description = xml_find(group_soup, 'description').string
-            name = xml_find(group_soup, 'name').string
-            label = xml_find(group_soup, 'label').string
+            fields = cls.MAPPING.read(group_soup, server=server, eager=not lazy)
 
-            new_group = BonitaGroup(name, label, description)
+            new_group = BonitaGroup(fields['name'], fields['label'], fields['description'])
+            new_group._bind_server(server)
+            new_group._init_lazy_fields(group_soup, fields, lazy)
 
             # Main properties now
-            new_group.uuid = xml_find(group_soup, 'uuid').string
+            new_group.uuid = fields['uuid']
 
             # Other properties then
-            set_if_available(new_group, group_soup, ['dbid'])
-
-            # Parent hierarchy
-            parent_soup = xml_find(group_soup, 'parentGroup', raise_exception=False)
-            if parent_soup is not None:
-                new_group.parent = cls._instanciate_from_xml(unicode(parent_soup), is_parent=True)
+            if 'dbid' in fields:
+                new_group.dbid = fields['dbid']
         except XMLSchemaParseError:
             raise
 
-        return new_group
+        return new_group._map(server)
 
     @classmethod
-    def get_by_path(cls, path):
+    @cached_lookup()
+    def get_by_path(cls, path, server=None):
         """ Retrieve a Group with the path
 
         :param path: the path of the group to retrieve
         :type path: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getGroupUsingPath'
@@ -833,36 +965,33 @@ class BonitaGroup(BonitaObject):
             data['hierarchy'].append(part_path)
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url, data=data)
-        except BonitaHTTPError as err:
-            if 'GroupNotFoundException'.lower() in err.bonita_exception.lower():
-                return None
-            else:
-                raise
+            xml = cls._resolve_server(server).sendRESTRequest(url=url, data=data)
+        except GroupNotFoundError:
+            return None
 
-        group = cls._instanciate_from_xml(xml)
+        group = cls._instanciate_from_xml(xml, server=server)
 
         return group
 
     @classmethod
-    def get_by_uuid(cls, uuid):
+    @cached_lookup()
+    def get_by_uuid(cls, uuid, server=None):
         """ Retrieve a Group with the UUID
 
         :param uuid: the UUID of the group to retrieve
         :type uuid: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getGroupByUUID/' + uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            if 'GroupNotFoundException'.lower() in err.bonita_exception.lower():
-                return None
-            else:
-                raise
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except GroupNotFoundError:
+            return None
 
-        group = cls._instanciate_from_xml(xml)
+        group = cls._instanciate_from_xml(xml, server=server)
 
         return group
 
@@ -875,24 +1004,32 @@ class BonitaGroup(BonitaObject):
         - path
         - uuid
 
+        A server handle can also be given with the server parameter.
+
         :raise TypeError: if call with unknown parameter
         :return: BonitaGroup instance or None if not found
 
         """
+        server = kwargs.get('server')
+
         if 'path' in kwargs:
-            return cls.get_by_path(path=kwargs['path'])
+            return cls.get_by_path(path=kwargs['path'], server=server)
         if 'uuid' in kwargs:
-            return cls.get_by_uuid(uuid=kwargs['uuid'])
+            return cls.get_by_uuid(uuid=kwargs['uuid'], server=server)
 
         raise TypeError('called get with unknown param : %s' % (kwargs.keys()))
 
+    get_async = async_method('get')
+
     @classmethod
-    def get_default_root(cls):
+    def get_default_root(cls, server=None):
         """ Retrieve BonitaGroup which is the root, currently the /platform group.
 
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: BonitaGroup for /platform
         """
-        return cls.get_by_path('/platform')
+        return cls.get_by_path('/platform', server=server)
 
 
 class BonitaRole(BonitaObject):
@@ -915,83 +1052,110 @@ class BonitaRole(BonitaObject):
         self.label = label
         self.description = description
 
+    # Region of the LookupCache holding the lookups of roles
+    CACHE_REGION = 'role'
+
+    # Cached lookups of a role, see BonitaObject._invalidate_cache
+    CACHE_KEYS = [('get_by_uuid', 'uuid'), ('get_by_name', 'name')]
+
+    # How a BonitaRole is read from its XML element
+    MAPPING = Mapping([Field('description'), Field('name'), Field('label'), Field('uuid'),
+                       Field('dbid', required=False)])
+
     @classmethod
-    def _instanciate_from_xml(cls, xml):
+    def _instanciate_from_xml(cls, xml, server=None):
         """ Instanciate a BonitaRole from XML
 
         :param xml: the XML description of a rpme
         :type xml: unicode
+        :param server: server handle the role is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: BonitaRole
 
         """
         if not isinstance(xml, (str, unicode)):
             raise TypeError('xml must be a string or unicode not %s' % (type(xml)))
 
-        soup = BeautifulSoup(xml, 'xml')
+        soup = parse_xml(xml)
 
-        try:
-            # First thing first : instanciate a new BonitaRole
-            role_soup = xml_find(soup, 'role')
+        return cls._instanciate_from_node(xml_find(soup, 'role'), server=server)
+
+    @classmethod
+    def _instanciate_from_node(cls, role_soup, server=None):
+        """ Instanciate a BonitaRole from its already parsed XML element
+
+        :param role_soup: the Role element, as found in a document built by pybonita.parser.parse_xml
+        :type role_soup: lxml.etree._Element or bs4.element.Tag
+        :param server: server handle the role is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :return: BonitaRole, shared with the other roles with the same uuid
+            retrieved through the server handle
+
+        """
+        new_role = cls._get_mapped(role_soup, server)
+        if new_role is not None:
+            return new_role
 
-            description = xml_find(role_soup, 'description').string
-            name = xml_find(role_soup, 'name').string
-            label = xml_find(role_soup, 'label').string
+        try:
+            fields = cls.MAPPING.read(role_soup, server=server)
 
-            new_role = BonitaRole(name, label, description)
+            # First thing first : instanciate a new BonitaRole
+            new_role = BonitaRole(fields['name'], fields['label'], fields['description'])
+            new_role._bind_server(server)
 
             # Main properties now
-            new_role.uuid = xml_find(role_soup, 'uuid').string
-            print 'creating new role with uuid : %s' % (new_role.uuid)
+            new_role.uuid = fields['uuid']
 
             # Other properties then
-            set_if_available(new_role, role_soup, ['dbid'])
+            if 'dbid' in fields:
+                new_role.dbid = fields['dbid']
 
         except XMLSchemaParseError:
             raise
 
-        return new_role
+        return new_role._map(server)
 
     @classmethod
-    def get_by_name(cls, name):
+    @cached_lookup()
+    def get_by_name(cls, name, server=None):
         """ Retrieve a Role with the name
 
         :param path: the name of the role to retrieve
         :type path: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getRole/' + name
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            if 'RoleNotFoundException'.lower() in err.bonita_exception.lower():
-                return None
-            else:
-                raise
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except RoleNotFoundError:
+            return None
 
-        role = cls._instanciate_from_xml(xml)
+        role = cls._instanciate_from_xml(xml, server=server)
 
         return role
 
     @classmethod
-    def get_by_uuid(cls, uuid):
+    @cached_lookup()
+    def get_by_uuid(cls, uuid, server=None):
         """ Retrieve a Role with the UUID
 
         :param uuid: the UUID of the role to retrieve
         :type uuid: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getRoleByUUID/' + uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            if 'RoleNotFoundException'.lower() in err.bonita_exception.lower():
-                return None
-            else:
-                raise
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except RoleNotFoundError:
+            return None
 
-        role = cls._instanciate_from_xml(xml)
+        role = cls._instanciate_from_xml(xml, server=server)
 
         return role
 
@@ -1004,17 +1168,23 @@ class BonitaRole(BonitaObject):
         - name
         - uuid
 
+        A server handle can also be given with the server parameter.
+
         :raise TypeError: if call with unknown parameter
         :return: BonitaRole instance or None if not found
 
         """
+        server = kwargs.get('server')
+
         if 'name' in kwargs:
-            return cls.get_by_name(name=kwargs['name'])
+            return cls.get_by_name(name=kwargs['name'], server=server)
         if 'uuid' in kwargs:
-            return cls.get_by_uuid(uuid=kwargs['uuid'])
+            return cls.get_by_uuid(uuid=kwargs['uuid'], server=server)
 
         raise TypeError('called get with unknown param : %s' % (kwargs.keys()))
 
+    get_async = async_method('get')
+
 
 #    def _generate_save_url(self,variables):
 #        url = "/identityAPI/addRole/"+self.name
@@ -1053,12 +1223,24 @@ class BonitaMembership(BonitaObject):
         self.role = role
         self.group = group
 
+    # Region of the LookupCache holding the lookups of memberships
+    CACHE_REGION = 'membership'
+
+    # Cached lookups of a membership, see BonitaObject._invalidate_cache
+    CACHE_KEYS = [('get_by_uuid', 'uuid')]
+
+    # How a BonitaMembership is read from its XML element, with its role and group
+    MAPPING = Mapping([EntityField('group', lambda: BonitaGroup), EntityField('role', lambda: BonitaRole),
+                       Field('uuid'), Field('dbid', required=False)])
+
     @classmethod
-    def _instanciate_from_xml(cls, xml):
+    def _instanciate_from_xml(cls, xml, server=None):
         """ Instanciate a BonitaMembership from XML
 
         :param xml: the XML description of a rpme
         :type xml: unicode
+        :param server: server handle the membership is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
         :return: BonitaMembership
         :raise BonitaException: if group or role can't be instanciate from XML
 
@@ -1066,35 +1248,44 @@ class BonitaMembership(BonitaObject):
         if not isinstance(xml, (str, unicode)):
             raise TypeError('xml must be a string or unicode not %s' % (type(xml)))
 
-        soup = BeautifulSoup(xml, 'xml')
+        soup = parse_xml(xml)
 
-        try:
-            membership_soup = xml_find(soup, 'membership')
+        return cls._instanciate_from_node(xml_find(soup, 'membership'), server=server)
+
+    @classmethod
+    def _instanciate_from_node(cls, membership_soup, server=None):
+        """ Instanciate a BonitaMembership, with its role and group, from its already parsed XML element
+
+        :param membership_soup: the Membership element, as found in a document built by pybonita.parser.parse_xml
+        :type membership_soup: lxml.etree._Element or bs4.element.Tag
+        :param server: server handle the membership is retrieved from (default : BonitaServer singleton)
+        :type server: BonitaServer
+        :return: BonitaMembership, shared with the other memberships with the same
+            uuid retrieved through the server handle
+        :raise BonitaException: if group or role can't be instanciate from XML
 
-            # First try to decode Role and Group
-            try:
-                group_soup = xml_find(membership_soup, 'group')
-                group = BonitaGroup._instanciate_from_xml(unicode(group_soup))
-            except XMLSchemaParseError:
-                raise BonitaXMLError('can\'t properly creat a group from XML')
+        """
+        new_membership = cls._get_mapped(membership_soup, server)
+        if new_membership is not None:
+            return new_membership
 
-            try:
-                role_soup = xml_find(membership_soup, 'role')
-                role = BonitaRole._instanciate_from_xml(unicode(role_soup))
-            except XMLSchemaParseError:
-                raise BonitaXMLError('can\'t properly creat a role from XML')
+        try:
+            # Role and Group are decoded first
+            fields = cls.MAPPING.read(membership_soup, server=server)
+        except XMLSchemaParseError as exc:
+            raise BonitaXMLError('can\'t properly create a membership from XML : %s' % (exc))
 
-            new_membership = BonitaMembership(role, group)
+        new_membership = BonitaMembership(fields['role'], fields['group'])
+        new_membership._bind_server(server)
 
-            # Main properties now
-            new_membership.uuid = xml_find(membership_soup, 'uuid').string
+        # Main properties now
+        new_membership.uuid = fields['uuid']
 
-            # Other properties then
-            set_if_available(new_membership, membership_soup, ['dbid'])
-        except:
-            raise
+        # Other properties then
+        if 'dbid' in fields:
+            new_membership.dbid = fields['dbid']
 
-        return new_membership
+        return new_membership._map(server)
 
 #<Membership>
 #  <dbid>0</dbid>
@@ -1123,7 +1314,8 @@ class BonitaMembership(BonitaObject):
 #</Membership>
 
     @classmethod
-    def get_by_role_and_group_uuid(cls, role_uuid, group_uuid):
+    @cached_lookup()
+    def get_by_role_and_group_uuid(cls, role_uuid, group_uuid, server=None):
         """ Retrieve a Membership with the role and group UUID.
         If membership does not exists but role and group exist, the membership will be created
 
@@ -1131,27 +1323,24 @@ class BonitaMembership(BonitaObject):
         :type role_uuid: str or unicode
         :param group_uuid: UUID of the group bound to the membership
         :type group_uuid: str or unicode
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getMembershipForRoleAndGroup/' + role_uuid + '/' + group_uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            err_string = err.bonita_exception.lower()
-            rnf_exc_string = 'RoleNotFoundException'.lower()
-            gnf_exc_string = 'GroupNotFoundException'.lower()
-            if (rnf_exc_string in err_string or gnf_exc_string in err_string):
-                return None
-            else:
-                raise
-
-        membership = cls._instanciate_from_xml(xml)
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except (RoleNotFoundError, GroupNotFoundError):
+            return None
+
+        membership = cls._instanciate_from_xml(xml, server=server)
 
         return membership
 
     @classmethod
-    def get_by_role_and_group(cls, role, group):
+    @cached_lookup(key=lambda role, group: (role.uuid, group.uuid))
+    def get_by_role_and_group(cls, role, group, server=None):
         """ Retrieve a Membership with the role and group.
         If membership does not exists but role and group exist, the membership will be created
 
@@ -1159,6 +1348,8 @@ class BonitaMembership(BonitaObject):
         :type role: BonitaRole
         :param group: group bound to the membership
         :type group: BonitaGroup
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         if not isinstance(role, BonitaRole):
@@ -1169,39 +1360,33 @@ class BonitaMembership(BonitaObject):
         url = '/identityAPI/getMembershipForRoleAndGroup/' + role.uuid + '/' + group.uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            err_string = err.bonita_exception.lower()
-            rnf_exc_string = 'RoleNotFoundException'.lower()
-            gnf_exc_string = 'GroupNotFoundException'.lower()
-            if (rnf_exc_string in err_string or gnf_exc_string in err_string):
-                return None
-            else:
-                raise
-
-        membership = cls._instanciate_from_xml(xml)
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except (RoleNotFoundError, GroupNotFoundError):
+            return None
+
+        membership = cls._instanciate_from_xml(xml, server=server)
 
         return membership
 
     @classmethod
-    def get_by_uuid(cls, uuid):
+    @cached_lookup()
+    def get_by_uuid(cls, uuid, server=None):
         """ Retrieve a Membership with the UUID
 
         :param uuid: the UUID of the membership to retrieve
         :type uuid: str
+        :param server: server handle to use (default : BonitaServer singleton)
+        :type server: BonitaServer
 
         """
         url = '/identityAPI/getMembershipByUUID/' + uuid
 
         try:
-            xml = BonitaServer.get_instance().sendRESTRequest(url=url)
-        except BonitaHTTPError as err:
-            if 'MembershipNotFoundException'.lower() in err.bonita_exception.lower():
-                return None
-            else:
-                raise
+            xml = cls._resolve_server(server).sendRESTRequest(url=url)
+        except MembershipNotFoundError:
+            return None
 
-        membership = cls._instanciate_from_xml(xml)
+        membership = cls._instanciate_from_xml(xml, server=server)
 
         return membership
 
@@ -1215,15 +1400,21 @@ class BonitaMembership(BonitaObject):
         - role_uuid and group_uuid
         - uuid
 
+        A server handle can also be given with the server parameter.
+
         :raise TypeError: if call with unknown parameter
         :return: BonitaMembership instance or None if not found
 
         """
+        server = kwargs.get('server')
+
         if 'role' in kwargs and 'group' in kwargs:
-                return cls.get_by_role_and_group(role=kwargs['role'], group=kwargs['group'])
+                return cls.get_by_role_and_group(role=kwargs['role'], group=kwargs['group'], server=server)
         if 'role_uuid' in kwargs and 'group_uuid' in kwargs:
-                return cls.get_by_role_and_group_uuid(role_uuid=kwargs['role_uuid'], group_uuid=kwargs['group_uuid'])
+                return cls.get_by_role_and_group_uuid(role_uuid=kwargs['role_uuid'], group_uuid=kwargs['group_uuid'], server=server)
         if 'uuid' in kwargs:
-            return cls.get_by_uuid(uuid=kwargs['uuid'])
+            return cls.get_by_uuid(uuid=kwargs['uuid'], server=server)
 
         raise TypeError('called get with unknown param : %s' % (kwargs.keys()))
+
+    get_async = async_method('get')
@@ -2,11 +2,16 @@
 from bs4.element import Tag
 from xml.dom.minidom import Document
 
+from lxml import etree
 from lxml.etree import XMLSchemaParseError
 
 __all__ = ['dictToMapString', 'set_if_available', 'xml_find', 'xml_find_all',
+           'xml_string', 'xml_text', 'xml_tostring', 'TagMatcher', 'tag_matcher',
            'TrackableList', 'TrackableObject', 'TrackableDict']
 
+# Nodes built by the lxml backend of pybonita.parser
+LXML_NODES = (etree._Element, etree._ElementTree)
+
 
 def dictToMapString(data_dict):
 
@@ -29,83 +34,202 @@ def dictToMapString(data_dict):
     return doc.toxml()
 
 
-def set_if_available(bonita_object, soup, tags, raise_exception=False):
+def set_if_available(bonita_object, soup, tags, raise_exception=False, recursive=True):
     """ Sets up properties of a BonitaObject from the given list of tags if available in soup.
 
     :param bonita_object: Object where to put the new properties
     :type bonita_object: BonitaObject, but all python object can be used
     :param soup: xml soup where to extract the tags
-    :type soup: bs4.element.Tag instance
+    :type soup: bs4.element.Tag or lxml.etree._Element instance
     :param tags: list of the tags to add if available
     :type tags: list[unicode or str]
     :param raise_exception: should we raise an exception if the tag is not found ?
     :type raise_exception: bool (default : False)
+    :param recursive: look for the tags in the whole soup, or only among its children ?
+    :type recursive: bool (default : True)
     :raise XMLSchemaParseError: if soup does not contain the tag with the given name and raise_exception is true
 
     """
     for tag in tags:
         try:
-            attr = xml_find(soup, tag)
-            setattr(bonita_object, tag, attr.string)
+            attr = tag_matcher(tag, recursive).find(soup)
+            setattr(bonita_object, tag, xml_string(attr))
         except XMLSchemaParseError:
             if raise_exception:
                 raise
 
 
-def xml_find(soup, name, raise_exception=True):
-    """ Extends the bs4.find method to look for name in soup in a first-letter case insensitive manner.
+class TagMatcher(object):
+    """ Look for a tag name in a first-letter case insensitive manner.
     Yes, Bonita has the great feature (!!) to return either upper or lower case tag (inside/ouside of XML-like contains)
 
-    :param soup: the soup to look into
-    :type soup: bs4.element.Tag
+    Both spellings of the name are prepared once, so that a lookup only
+    dispatches on the parser backend of the soup : lxml nodes are searched
+    with the tag filtering iterators of lxml (faster than a compiled XPath
+    on the small elements of Bonita), bs4 tags with a list of names.
+    A non recursive matcher only looks among the children of the soup (or
+    at the root element of a whole document), which is much cheaper than
+    searching the whole subtree when Bonita schema tells where the tag is.
+
+    Matchers are shared, get them with tag_matcher.
+
+    """
+
+    def __init__(self, name, recursive=True):
+        if not isinstance(name, (str, unicode)):
+            raise TypeError('name muse be a string or unicode')
+
+        self.name = name
+        self.names = (name, name[0].upper() + name[1:])
+        self.recursive = recursive
+        self._bs4_names = list(self.names)
+
+    def _iter_lxml(self, soup):
+        # Elements first : they are by far the most searched
+        if type(soup) is etree._Element:
+            if self.recursive:
+                return soup.iterdescendants(*self.names)
+            return soup.iterchildren(*self.names)
+
+        if isinstance(soup, etree._ElementTree):
+            if self.recursive:
+                # As with bs4, a document is searched from its root element included
+                return soup.iter(*self.names)
+            root = soup.getroot()
+            return iter([root] if root.tag in self.names else [])
+
+        if self.recursive:
+            return soup.iterdescendants(*self.names)
+        return soup.iterchildren(*self.names)
+
+    def find(self, soup, raise_exception=True):
+        """ First tag with the name in soup, see xml_find """
+        if type(soup) is etree._Element or isinstance(soup, LXML_NODES):
+            tag = next(self._iter_lxml(soup), None)
+        elif isinstance(soup, Tag):
+            tag = soup.find(self._bs4_names, recursive=self.recursive)
+        else:
+            raise TypeError('soup must be a bs4.element.Tag or lxml node instance : %s' % (type(soup)))
+
+        if raise_exception and tag is None:
+            raise XMLSchemaParseError('tag %s not found' % (self.name))
+
+        return tag
+
+    def find_all(self, soup):
+        """ All the tags with the name in soup, see xml_find_all """
+        if type(soup) is etree._Element or isinstance(soup, LXML_NODES):
+            return list(self._iter_lxml(soup))
+        elif isinstance(soup, Tag):
+            return soup.find_all(self._bs4_names, recursive=self.recursive)
+
+        raise TypeError('soup must be a bs4.element.Tag or lxml node instance : %s' % (type(soup)))
+
+
+_matchers = {}
+
+
+def tag_matcher(name, recursive=True):
+    """ Shared TagMatcher for the name
+
     :param name: tag name to look for
     :type name: str or unicode
-    :param raise_exception: should we raise an exception if the tag is not found ?
-    :type raise_exception: bool (default : True)
-    :return: None or bs4.element.Tag
-    :raise TypeError: if soup is not a bs4.element.Tag instance
-    :raise XMLSchemaParseError: if soup does not contain the tag with the given name and raise_exception is true
+    :param recursive: look in the whole soup, or only among its children ?
+    :type recursive: bool (default : True)
+    :return: TagMatcher
+    :raise TypeError: if name is not a string
 
     """
-    if not isinstance(soup, Tag):
-        raise TypeError('soup must be a bs4.element.Tag instance : %s' % (type(soup)))
-    if not isinstance(name, (str, unicode)):
-        raise TypeError('name muse be a string or unicode')
+    try:
+        return _matchers[(name, recursive)]
+    except KeyError:
+        matcher = _matchers[(name, recursive)] = TagMatcher(name, recursive)
+        return matcher
 
-    base_name = name
-    capitalize_name = base_name[0].upper() + base_name[1:]
 
-    tag = soup.find({base_name: True, capitalize_name: True})
+def xml_find(soup, name, raise_exception=True, recursive=True):
+    """ Extends the bs4.find method to look for name in soup in a first-letter case insensitive manner.
+    Yes, Bonita has the great feature (!!) to return either upper or lower case tag (inside/ouside of XML-like contains)
 
-    if raise_exception and tag is None:
-        raise XMLSchemaParseError('tag %s not found' % (name))
+    :param soup: the soup to look into, as built by pybonita.parser.parse_xml
+    :type soup: bs4.element.Tag or lxml.etree._Element
+    :param name: tag name to look for
+    :type name: str or unicode
+    :param raise_exception: should we raise an exception if the tag is not found ?
+    :type raise_exception: bool (default : True)
+    :param recursive: look in the whole soup, or only among its children ?
+    :type recursive: bool (default : True)
+    :return: None or bs4.element.Tag or lxml.etree._Element
+    :raise TypeError: if soup is not a bs4.element.Tag or lxml node instance
+    :raise XMLSchemaParseError: if soup does not contain the tag with the given name and raise_exception is true
 
-    return(tag)
+    """
+    return tag_matcher(name, recursive).find(soup, raise_exception)
 
 
-def xml_find_all(soup, name):
+def xml_find_all(soup, name, recursive=True):
     """ Extends the bs4.find_all method to look for name in soup in a first-letter case insensitive manner.
     Yes, Bonita has the great feature (!!) to return either upper or lower case tag (inside/ouside of XML-like contains)
 
-    :param soup: the soup to look into
-    :type soup: bs4.element.Tag
+    :param soup: the soup to look into, as built by pybonita.parser.parse_xml
+    :type soup: bs4.element.Tag or lxml.etree._Element
     :param name: tag name to look for
     :type name: str or unicode
-    :return: list of bs4.element.Tag, possibly void list
-    :raise TypeError: if soup is not a bs4.element.Tag instance
+    :param recursive: look in the whole soup, or only among its children ?
+    :type recursive: bool (default : True)
+    :return: list of bs4.element.Tag or lxml.etree._Element, possibly void list
+    :raise TypeError: if soup is not a bs4.element.Tag or lxml node instance
 
     """
-    if not isinstance(soup, Tag):
-        raise TypeError('soup must be a bs4.element.Tag instance : %s' % (type(soup)))
-    if not isinstance(name, (str, unicode)):
-        raise TypeError('name muse be a string or unicode')
+    return tag_matcher(name, recursive).find_all(soup)
+
+
+def xml_string(tag):
+    """ Same as bs4 Tag.string, for both parser backends : the text of a tag
+    holding a single string (or a single tag holding a single string), else None.
+
+    :param tag: the tag to read
+    :type tag: bs4.element.Tag or lxml.etree._Element
+    :return: None or unicode
+
+    """
+    if not isinstance(tag, etree._Element):
+        return tag.string
+
+    while len(tag) == 1 and not tag.text and not tag[0].tail:
+        tag = tag[0]
+    if len(tag) > 0 or tag.text is None:
+        return None
 
-    base_name = name
-    capitalize_name = base_name[0].upper() + base_name[1:]
+    return unicode(tag.text)
 
-    tags = soup.find_all({base_name: True, capitalize_name: True})
 
-    return(tags)
+def xml_text(tag):
+    """ Same as bs4 Tag.text, for both parser backends : all the text inside the tag.
+
+    :param tag: the tag to read
+    :type tag: bs4.element.Tag or lxml.etree._Element
+    :return: unicode
+
+    """
+    if not isinstance(tag, etree._Element):
+        return tag.text
+
+    return u''.join(tag.itertext())
+
+
+def xml_tostring(tag):
+    """ Serialize a tag back to XML, for both parser backends
+
+    :param tag: the tag to serialize
+    :type tag: bs4.element.Tag or lxml.etree._Element
+    :return: unicode
+
+    """
+    if not isinstance(tag, etree._Element):
+        return unicode(tag)
+
+    return etree.tostring(tag, encoding=unicode, with_tail=False)
 
 
 class TrackableMixin(object):